@@ -0,0 +1,468 @@
+# Импортируем необходимые библиотеки
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import re
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+# Импортируем классы из файла exercise_generator
+from exercise_generator import (models, TextToDataFrame, SQLiteCache, CachedTranslator, YandexDictionaryClient,
+                                DictionaryCreator, SentenceParser, DistractorEngine, ExerciseGenerator,
+                                exercises_to_df)
+
+# Слоги для синтетических слов
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tas', 'vor', 'dul', 'pen', 'sir', 'gam', 'bet', 'nol', 'fi', 'zor', 'ux']
+
+# Окончания форм глагола для синтетических глаголов
+VERB_SUFFIXES = ['', 's', 'ed', 'ing']
+
+
+class SyntheticVocabulary:
+    def __init__(self, size, seed=0):
+        """
+        Конструктор класса SyntheticVocabulary - словаря синтетических слов с известными частями речи.
+
+        Аргументы:
+        size - количество слов каждой части речи.
+        seed - начальное значение генератора случайных чисел.
+        """
+        rng = random.Random(seed)
+        words = set()
+
+        def new_word():
+            # Составляем новое слово из 2-4 слогов
+            while True:
+                word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                if word not in words:
+                    words.add(word)
+                    return word
+
+        self.nouns = [new_word() for _ in range(size)]
+        self.adjectives = [new_word() for _ in range(size)]
+        self.verbs = [new_word() for _ in range(size)]
+
+        # Части речи всех форм слов для упрощенной разметки
+        self.pos = {'a': 'DET', 'an': 'DET', 'the': 'DET'}
+        self.pos.update({word: 'NOUN' for word in self.nouns})
+        self.pos.update({word: 'ADJ' for word in self.adjectives})
+        self.pos.update({verb + suffix: 'VERB' for verb in self.verbs for suffix in VERB_SUFFIXES})
+
+    def sentences(self, count, seed=0):
+        """
+        Метод для генерации синтетических предложений.
+
+        Аргументы:
+        count - количество предложений.
+        seed - начальное значение генератора случайных чисел.
+
+        Возвращает:
+        Список предложений.
+        """
+        rng = random.Random(seed)
+        sentences = []
+        for _ in range(count):
+            words = [rng.choice(['a', 'the']), rng.choice(self.adjectives), rng.choice(self.nouns),
+                     rng.choice(self.verbs) + rng.choice(VERB_SUFFIXES), rng.choice(['a', 'an', 'the']),
+                     rng.choice(self.nouns)]
+            sentences.append(' '.join(words).capitalize() + '.')
+        return sentences
+
+
+class FakeTranslateBackend:
+    def __init__(self, latency=0.0):
+        """
+        Конструктор класса FakeTranslateBackend - заменителя Google Translate без обращения к сети.
+
+        Аргументы:
+        latency - искусственная задержка одного запроса в секундах.
+        """
+        self.latency = latency
+        self.calls = 0
+        self.words = 0
+
+    def translate_many(self, words, src, dest):
+        """
+        Метод для "перевода" списка слов: к слову добавляется приставка ru.
+
+        Аргументы:
+        words - список слов.
+        src - язык исходных слов.
+        dest - язык перевода.
+
+        Возвращает:
+        Словарь, где ключи - слова, а значения - их переводы.
+        """
+        self.calls += 1
+        self.words += len(words)
+        time.sleep(self.latency)
+        return {word: f'ru{word.lower()}' for word in words}
+
+
+class FakeDictionaryServer:
+    def __init__(self, latency=0.0, errors=(), invalid_responses=0):
+        """
+        Конструктор класса FakeDictionaryServer - локального HTTP-сервера, который отвечает
+        как метод lookup сервиса Yandex Dictionary.
+
+        Аргументы:
+        latency - искусственная задержка одного ответа в секундах.
+        errors - коды ошибок, которые по очереди возвращаются на первые запросы
+        (после них сервер отвечает как обычно).
+        invalid_responses - количество следующих запросов, на которые сервер отвечает с кодом 200
+        страницей HTML вместо JSON.
+        """
+        # Общее количество запросов, а также количество одновременных запросов сейчас и наибольшее с запуска
+        self.requests = 0
+        self.active_requests = 0
+        self.peak_active_requests = 0
+        self._errors = collections.deque(errors)
+        self._invalid_responses = invalid_responses
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Соединения не закрываются после ответа, как у настоящего сервиса
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server.active_requests += 1
+                    server.peak_active_requests = max(server.peak_active_requests, server.active_requests)
+                    status = server._errors.popleft() if server._errors else None
+                    invalid = status is None and server._invalid_responses > 0
+                    if invalid:
+                        server._invalid_responses -= 1
+                try:
+                    self._respond(status, invalid)
+                finally:
+                    with server._lock:
+                        server.active_requests -= 1
+
+            def _respond(self, status, invalid):
+                time.sleep(latency)
+                if status is not None:
+                    self.send_response(status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                word = parse_qs(urlparse(self.path).query)['text'][0]
+                if invalid:
+                    body, content_type = b'<html><body>Service unavailable</body></html>', 'text/html'
+                else:
+                    body = json.dumps({'def': [{'text': word, 'ts': f'{word}-ts'}]}).encode()
+                    content_type = 'application/json'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._httpd.server_port}/lookup'
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        """
+        Метод для остановки сервера.
+        """
+        self._httpd.shutdown()
+
+
+def build_keyed_vectors(vocabulary, dimension=50, seed=0):
+    """
+    Функция для создания небольшой модели word2vec со случайными векторами
+    для переводов синтетических существительных и прилагательных.
+
+    Аргументы:
+    vocabulary - объект SyntheticVocabulary.
+    dimension - размерность векторов.
+    seed - начальное значение генератора случайных чисел.
+
+    Возвращает:
+    Объект KeyedVectors.
+    """
+    from gensim.models import KeyedVectors
+
+    keys = ([f'ru{word}_NOUN' for word in vocabulary.nouns] + [f'ru{word}_ADJ' for word in vocabulary.adjectives] +
+            [f'ru{word}_VERB' for word in vocabulary.verbs] + [f'ru{word}::x_NOUN' for word in vocabulary.nouns[:100]])
+    model = KeyedVectors(dimension)
+    model.add_vectors(keys, np.random.default_rng(seed).standard_normal((len(keys), dimension)).astype(np.float32))
+    return model
+
+
+def install_offline_nlp(vocabulary):
+    """
+    Функция для замены spacy, токенизатора nltk и word_forms простыми заменителями,
+    которые знают части речи синтетических слов.
+
+    Аргументы:
+    vocabulary - объект SyntheticVocabulary.
+    """
+    import spacy
+    from spacy.language import Language
+
+    @Language.component('benchmark_tagger')
+    def benchmark_tagger(doc):
+        # Размечаем части речи по словарю синтетических слов, леммой считаем само слово
+        for token in doc:
+            token.pos_ = vocabulary.pos.get(token.lower_, 'PUNCT' if token.is_punct else 'X')
+            token.lemma_ = token.lower_
+        return doc
+
+    nlp = spacy.blank('en')
+    nlp.add_pipe('benchmark_tagger')
+    models.set('nlp', nlp)
+    models.set('sent_tokenize', lambda text: re.split(r'(?<=[.!?])\s+', text.strip()))
+
+    def get_word_forms(word):
+        # Формы синтетического глагола получаются добавлением окончаний к основе
+        stem = re.sub(r'(s|ed|ing)$', '', word)
+        return {'v': {stem + suffix for suffix in VERB_SUFFIXES}}
+
+    models.set('get_word_forms', get_word_forms)
+
+
+def load_corpus(path, count):
+    """
+    Функция для получения нужного количества предложений из реального текста
+    (если предложений не хватает, текст повторяется).
+
+    Аргументы:
+    path - путь к текстовому файлу.
+    count - количество предложений.
+
+    Возвращает:
+    Список предложений.
+    """
+    with open(path, encoding='utf-8') as file:
+        sentences = list(TextToDataFrame(file.read()).iter_sentences())
+    return [sentences[i % len(sentences)] for i in range(count)]
+
+
+def summarize(name, sentences, latencies, total, peak):
+    # Пропускная способность, процентили задержек частей и пик памяти этапа
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.array([total * 1000])
+    return {
+        'stage': name,
+        'seconds': round(total, 4),
+        'sentences_per_second': round(sentences / total, 1) if total > 0 else None,
+        'latency_ms': {'p50': round(float(np.percentile(latencies_ms, 50)), 2),
+                       'p95': round(float(np.percentile(latencies_ms, 95)), 2),
+                       'p99': round(float(np.percentile(latencies_ms, 99)), 2)},
+        'peak_python_mb': round(peak / 2 ** 20, 1) if peak is not None else None,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_stage(name, sentences, function, chunks, trace_memory):
+    """
+    Функция для замера одного этапа обработки.
+
+    Аргументы:
+    name - название этапа.
+    sentences - количество предложений.
+    function - функция, которая обрабатывает одну часть данных и возвращает результат.
+    chunks - список частей данных.
+    trace_memory - замерять ли пик памяти Python с помощью tracemalloc.
+
+    Возвращает:
+    Кортеж из списка результатов по частям и словаря с показателями этапа.
+    """
+    if trace_memory:
+        tracemalloc.start()
+
+    results = []
+    latencies = []
+    start = time.perf_counter()
+    for chunk in chunks:
+        chunk_start = time.perf_counter()
+        results.append(function(chunk))
+        latencies.append(time.perf_counter() - chunk_start)
+    total = time.perf_counter() - start
+
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return results, summarize(name, sentences, latencies, total, peak)
+
+
+def run_benchmark(sentences, args, vocabulary):
+    """
+    Функция для замера всех этапов обработки текста.
+
+    Аргументы:
+    sentences - список предложений.
+    args - аргументы командной строки.
+    vocabulary - объект SyntheticVocabulary.
+
+    Возвращает:
+    Словарь с показателями этапов и количеством внешних вызовов.
+    """
+    cache_dir = tempfile.mkdtemp(prefix='exercise_benchmark_')
+    backend = FakeTranslateBackend(args.translate_latency)
+    server = FakeDictionaryServer(args.dictionary_latency)
+    translator = CachedTranslator(backend, cache=SQLiteCache(os.path.join(cache_dir, 'translations.sqlite3')))
+    client = YandexDictionaryClient('benchmark', base_url=server.url, requests_per_second=None,
+                                    cache=SQLiteCache(os.path.join(cache_dir, 'dictionary.sqlite3')))
+    parser = SentenceParser(batch_size=args.batch_size)
+    generator = ExerciseGenerator(parser=parser, translator=translator,
+                                  distractors=DistractorEngine(build_keyed_vectors(vocabulary)))
+    rng = random.Random(args.seed)
+
+    text = ' '.join(sentences)
+    chunks = [sentences[i:i + args.chunk_size] for i in range(0, len(sentences), args.chunk_size)]
+    stages = []
+
+    try:
+        # Разбиение текста на предложения
+        [split], stage = run_stage('split', len(sentences), lambda text: TextToDataFrame(text).txt_to_df(),
+                                   [text], args.trace_memory)
+        stages.append(stage)
+
+        # Разбор предложений spacy
+        docs, stage = run_stage('parse', len(sentences), parser.parse_sentences, chunks, args.trace_memory)
+        stages.append(stage)
+
+        # Составление словаря
+        _, stage = run_stage('dictionary', len(sentences),
+                             lambda df: DictionaryCreator('benchmark', translator, client, parser=parser)
+                             .create_dictionary_df(df, max_entries=args.max_entries),
+                             [split], args.trace_memory)
+        stages.append(stage)
+
+        # Составление упражнений по уже разобранным предложениям
+        exercises, stage = run_stage('exercises', len(sentences),
+                                     lambda pair: generator.generate_exercises(pair[0], docs=pair[1], rng=rng),
+                                     list(zip(chunks, docs)), args.trace_memory)
+        stages.append(stage)
+
+        # Сборка датафрейма с упражнениями
+        records = [exercise for chunk in exercises for exercise in chunk if exercise is not None]
+        [frame], stage = run_stage('assemble', len(sentences), exercises_to_df, [records], args.trace_memory)
+        stages.append(stage)
+    finally:
+        server.close()
+
+    return {
+        'sentences': len(sentences),
+        'exercises': len(frame),
+        'stages': stages,
+        'external_calls': {'translate_requests': backend.calls, 'translated_words': backend.words,
+                           'dictionary_requests': server.requests},
+    }
+
+
+def compare(results, baseline_path):
+    """
+    Функция для вывода сравнения с результатами предыдущего запуска.
+
+    Аргументы:
+    results - результаты текущего запуска.
+    baseline_path - путь к файлу с результатами предыдущего запуска.
+    """
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    previous = {(run['corpus'], run['sentences'], stage['stage']): stage['seconds']
+                for run in baseline['runs'] for stage in run['stages']}
+
+    print(f"\nСравнение с {baseline_path} (время текущего запуска / время предыдущего):")
+    for run in results['runs']:
+        for stage in run['stages']:
+            before = previous.get((run['corpus'], run['sentences'], stage['stage']))
+            if before:
+                print(f"  {run['corpus']:>10} {run['sentences']:>7} {stage['stage']:>10}: "
+                      f"{stage['seconds'] / before:.2f}x")
+
+
+def main():
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк генерации упражнений с локальными заменителями "
+                                                 "Google Translate, Yandex Dictionary и word2vec")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="количество предложений в корпусах")
+    parser.add_argument("--corpus", action="append", default=[],
+                        help="путь к реальному тексту (можно указать несколько раз)")
+    parser.add_argument("--no-synthetic", action="store_true", help="не замерять синтетический корпус")
+    parser.add_argument("--vocabulary-size", type=int, default=2000,
+                        help="количество синтетических слов каждой части речи")
+    parser.add_argument("--offline-nlp", action="store_true",
+                        help="заменить spacy, nltk и word_forms простыми заменителями")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="количество предложений в одной части")
+    parser.add_argument("--batch-size", type=int, default=256, help="размер пакета nlp.pipe")
+    parser.add_argument("--translate-latency", type=float, default=0.0,
+                        help="задержка одного запроса к заменителю Google Translate в секундах")
+    parser.add_argument("--dictionary-latency", type=float, default=0.0,
+                        help="задержка одного запроса к заменителю Yandex Dictionary в секундах")
+    parser.add_argument("--max-entries", type=int, help="максимальное количество слов в словаре")
+    parser.add_argument("--seed", type=int, default=0, help="начальное значение генерации упражнений")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="замерять пик памяти Python на каждом этапе (замедляет работу)")
+    parser.add_argument("--output", default="bench_results.json", help="файл для сохранения результатов")
+    parser.add_argument("--compare", help="файл с результатами предыдущего запуска для сравнения")
+    args = parser.parse_args()
+
+    vocabulary = SyntheticVocabulary(args.vocabulary_size)
+    if args.offline_nlp:
+        install_offline_nlp(vocabulary)
+
+    # Собираем корпуса всех размеров
+    corpora = []
+    for size in args.sizes:
+        if not args.no_synthetic:
+            corpora.append(('synthetic', vocabulary.sentences(size)))
+        for path in args.corpus:
+            corpora.append((os.path.basename(path), load_corpus(path, size)))
+
+    results = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args),
+        'runs': [],
+    }
+
+    for name, sentences in corpora:
+        run = run_benchmark(sentences, args, vocabulary)
+        run['corpus'] = name
+        results['runs'].append(run)
+
+        print(f"{name}: {run['sentences']} предложений, {run['exercises']} упражнений, "
+              f"внешние вызовы {run['external_calls']}")
+        for stage in run['stages']:
+            print(f"  {stage['stage']:>10}: {stage['seconds']:8.3f} с, "
+                  f"{stage['sentences_per_second']} предл./с, p50/p95/p99 "
+                  f"{stage['latency_ms']['p50']}/{stage['latency_ms']['p95']}/{stage['latency_ms']['p99']} мс, "
+                  f"max RSS {stage['max_rss_mb']} МБ")
+
+    # Сохраняем результаты для сравнения запусков
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
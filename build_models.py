@@ -0,0 +1,132 @@
+# Импортируем необходимые библиотеки
+import argparse
+import random
+import time
+
+# Импортируем функции подготовки моделей из файла exercise_generator
+from exercise_generator import (WORD2VEC_PATH, WORD2VEC_SUBSET_PATH, VERB_FORMS_PATH, CompactVectors,
+                                DistractorEngine, VerbFormIndex, convert_word2vec, load_full_word2vec)
+
+
+def build_vectors(args):
+    """
+    Функция для преобразования модели word2vec в формат, который открывается через отображение в память.
+
+    Аргументы:
+    args - аргументы командной строки.
+    """
+    start = time.perf_counter()
+    path = convert_word2vec(args.output)
+    print(f"Модель word2vec сохранена в {path} за {time.perf_counter() - start:.1f} с")
+
+
+def build_verb_forms(args):
+    """
+    Функция для построения индекса форм глаголов по WordNet.
+
+    Аргументы:
+    args - аргументы командной строки.
+    """
+    start = time.perf_counter()
+    index = VerbFormIndex.build()
+    index.save(args.output)
+    print(f"Индекс форм глаголов ({len(index)} слов, {len(index.groups)} наборов форм) "
+          f"сохранен в {args.output} за {time.perf_counter() - start:.1f} с")
+
+
+def compare_neighbours(full_engine, subset_engine, keys, topn=3):
+    """
+    Функция для сравнения похожих слов, которые находят полная и сокращенная модели.
+
+    Аргументы:
+    full_engine - объект DistractorEngine для полной модели.
+    subset_engine - объект DistractorEngine для сокращенной модели.
+    keys - список ключей для проверки.
+    topn - количество похожих слов для каждого ключа.
+
+    Возвращает:
+    Кортеж из доли ключей, у которых список похожих слов отличается, и средней доли совпадающих слов.
+    """
+    full = full_engine.most_similar_batch(keys, topn)
+    subset = subset_engine.most_similar_batch(keys, topn)
+
+    changed = 0
+    overlap = 0
+    for key in keys:
+        full_words = [word for word, similarity in full.get(key, [])]
+        subset_words = [word for word, similarity in subset.get(key, [])]
+        changed += full_words != subset_words
+        overlap += len(set(full_words) & set(subset_words)) / max(len(full_words), 1)
+
+    return changed / max(len(keys), 1), overlap / max(len(keys), 1)
+
+
+def build_subset(args):
+    """
+    Функция для построения сокращенной модели word2vec только с нужными для упражнений частями речи
+    и проверки ее качества по сравнению с полной моделью.
+
+    Аргументы:
+    args - аргументы командной строки.
+    """
+    # Загружаем полную модель и готовим поиск похожих слов по ней
+    start = time.perf_counter()
+    model = load_full_word2vec()
+    full_engine = DistractorEngine(model)
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subset = CompactVectors.from_model(model, pos_tags=args.pos, dtype=args.dtype)
+    subset.save(args.output)
+    print(f"Сокращенная модель ({len(subset)} из {len(model.index_to_key)} слов, {args.dtype}) "
+          f"сохранена в {args.output} за {time.perf_counter() - start:.1f} с")
+
+    # Загружаем сохраненную модель так же, как при генерации упражнений
+    start = time.perf_counter()
+    subset_engine = DistractorEngine(CompactVectors.load(args.output), pos_tags=args.pos)
+    subset_seconds = time.perf_counter() - start
+
+    # Сравниваем похожие слова для случайной выборки ключей
+    keys = random.Random(0).sample(subset.index_to_key, min(args.sample, len(subset)))
+    changed, overlap = compare_neighbours(full_engine, subset_engine, keys, args.topn)
+
+    full_bytes = model.vectors.nbytes
+    print(f"Память: {full_bytes / 2 ** 20:.1f} МБ -> {subset.nbytes / 2 ** 20:.1f} МБ")
+    print(f"Загрузка: {full_seconds:.2f} с -> {subset_seconds:.2f} с")
+    print(f"Top-{args.topn} похожих слов отличается для {changed:.1%} из {len(keys)} ключей, "
+          f"среднее совпадение {overlap:.1%}")
+
+
+def main():
+    """
+    Функция для запуска подготовки моделей из командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Подготовка моделей для English exercise generator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Команда для преобразования модели word2vec
+    vectors_parser = subparsers.add_parser("vectors", help="преобразовать модель word2vec для отображения в память")
+    vectors_parser.add_argument("--output", default=WORD2VEC_PATH, help="путь для сохранения модели")
+    vectors_parser.set_defaults(func=build_vectors)
+
+    # Команда для построения индекса форм глаголов
+    verb_forms_parser = subparsers.add_parser("verb-forms", help="построить индекс форм глаголов")
+    verb_forms_parser.add_argument("--output", default=VERB_FORMS_PATH, help="путь для сохранения индекса")
+    verb_forms_parser.set_defaults(func=build_verb_forms)
+
+    # Команда для построения сокращенной модели word2vec
+    subset_parser = subparsers.add_parser("subset", help="построить сокращенную модель word2vec для неверных вариантов")
+    subset_parser.add_argument("--output", default=WORD2VEC_SUBSET_PATH, help="путь для сохранения модели")
+    subset_parser.add_argument("--dtype", choices=CompactVectors.DTYPES, default="float16",
+                               help="тип хранения векторов (int8 - с потерями точности)")
+    subset_parser.add_argument("--pos", nargs="+", default=["NOUN", "ADJ"], help="сохраняемые части речи")
+    subset_parser.add_argument("--sample", type=int, default=1000, help="количество ключей для проверки качества")
+    subset_parser.add_argument("--topn", type=int, default=3, help="количество похожих слов при проверке качества")
+    subset_parser.set_defaults(func=build_subset)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,421 +1,3510 @@
+import numpy as np
 import pandas as pd
-import spacy
 import string
-import nltk
-nltk.download('punkt')
-nltk.download('wordnet')
 
-from nltk.tokenize import sent_tokenize
-from googletrans import Translator
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+import itertools
+import functools
+import collections
+import math
+import gzip
+import codecs
+import queue
+import shutil
+import hashlib
+import importlib.metadata
+import multiprocessing
+import asyncio
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Журнал модуля (например, для некорректных ответов внешних сервисов)
+logger = logging.getLogger(__name__)
+
+# Тяжелые модели (spacy, word2vec, данные nltk) загружаются не при импорте модуля,
+# а при первом использовании через реестр моделей models (см. ниже)
+
+# Название модели word2vec c gensim
+WORD2VEC_MODEL_NAME = "word2vec-ruscorpora-300"
+
+# Компоненты конвейера spacy, которые не нужны генераторам упражнений:
+# для упражнений достаточно токенизации и частей речи
+DISABLED_PIPES = ['parser', 'ner']
+
+# Адрес API сервиса Yandex Dictionary
+YANDEX_DICTIONARY_URL = 'https://dictionary.yandex.net/api/v1/dicservice.json/lookup'
+
+# Каталог для постоянных кэшей (переводы, ответы словаря и т.д.)
+CACHE_DIR = os.environ.get('EXERCISE_GENERATOR_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'english_exercise_generator'))
+
+# Путь к модели word2vec в родном формате gensim (векторы хранятся рядом в отдельном файле .npy),
+# которую все процессы открывают через отображение в память и делят одну копию в кэше страниц
+WORD2VEC_PATH = os.environ.get('EXERCISE_GENERATOR_WORD2VEC',
+                               os.path.join(CACHE_DIR, f'{WORD2VEC_MODEL_NAME}.kv'))
+
+# Путь к сокращенной модели word2vec только с существительными и прилагательными (см. CompactVectors):
+# если она построена, она используется вместо полной модели
+WORD2VEC_SUBSET_PATH = os.environ.get('EXERCISE_GENERATOR_WORD2VEC_SUBSET',
+                                      os.path.join(CACHE_DIR, f'{WORD2VEC_MODEL_NAME}.subset'))
+
+# Версия алгоритма генерации: увеличивается при изменениях, после которых
+# сохраненные результаты генерации больше не подходят
+PIPELINE_VERSION = 3
+
+# Путь к общему частотному списку английских слов, по которому отбираются слова для словаря
+WORD_FREQUENCY_PATH = os.environ.get('EXERCISE_GENERATOR_WORD_FREQUENCY',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  'english_frequency.txt'))
+
+# Путь к заранее построенному индексу форм глаголов (см. VerbFormIndex.build)
+VERB_FORMS_PATH = os.environ.get('EXERCISE_GENERATOR_VERB_FORMS',
+                                 os.path.join(CACHE_DIR, 'verb_forms.json.gz'))
+
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Конструктор класса ModelRegistry - реестра моделей, которые загружаются
+        при первом обращении и не больше одного раза за время работы процесса.
+        """
+        self._loaders = {}
+        self._models = {}
+        self._load_times = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        Метод для регистрации функции загрузки модели.
+
+        Аргументы:
+        name - название модели.
+        loader - функция без аргументов, которая загружает и возвращает модель.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """
+        Метод для получения модели (модель загружается при первом обращении).
+
+        Аргументы:
+        name - название модели.
+
+        Возвращает:
+        Загруженную модель.
+        """
+        # Быстрый путь: модель уже загружена
+        if name in self._models:
+            return self._models[name]
+
+        # Каждая модель загружается под своей блокировкой, чтобы разные модели
+        # можно было загружать параллельно, а одну и ту же - только один раз
+        with self._locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self._load_times[name] = time.perf_counter() - start
+
+        return self._models[name]
+
+    def set(self, name, model):
+        """
+        Метод для подмены модели уже загруженным объектом (например, в тестах или бенчмарках).
+
+        Аргументы:
+        name - название модели.
+        model - объект модели.
+        """
+        with self._lock:
+            self._locks.setdefault(name, threading.Lock())
+            self._models[name] = model
+            self._load_times[name] = 0.0
+
+    def is_loaded(self, name):
+        """
+        Метод для проверки, загружена ли модель.
+
+        Аргументы:
+        name - название модели.
+
+        Возвращает:
+        True, если модель уже загружена, иначе False.
+        """
+        return name in self._models
+
+    def warmup(self, names=None):
+        """
+        Метод для заблаговременной загрузки моделей.
+
+        Аргументы:
+        names - список названий моделей (по умолчанию все зарегистрированные модели).
+        """
+        for name in (names if names is not None else list(self._loaders)):
+            self.get(name)
+
+    def status(self):
+        """
+        Метод для получения состояния моделей.
+
+        Возвращает:
+        Словарь, где ключи - названия моделей, а значения - словари с признаком загрузки
+        и временем загрузки в секундах.
+        """
+        return {name: {'loaded': name in self._models, 'load_time': self._load_times.get(name)}
+                for name in self._locks}
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Конструктор класса Metrics - легковесного сбора времени и счетчиков по этапам обработки.
+        """
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+
+        # Дополнительные объекты Metrics, в которые попадают значения, собранные в текущем потоке
+        self._local = threading.local()
+
+    def _targets(self):
+        return getattr(self._local, 'targets', ())
+
+    @contextmanager
+    def _scope(self, targets):
+        previous = self._targets()
+        self._local.targets = targets
+        try:
+            yield
+        finally:
+            self._local.targets = previous
+
+    def collect(self, target):
+        """
+        Контекстный менеджер, внутри которого значения, собранные в текущем потоке,
+        также добавляются в другой объект Metrics (например, отдельный для одной генерации).
+
+        Аргументы:
+        target - объект Metrics.
+        """
+        return self._scope(self._targets() + (target,))
+
+    def bind(self, function):
+        """
+        Метод для передачи сбора значений текущего потока функции, которая выполняется в другом потоке.
+
+        Аргументы:
+        function - функция.
+
+        Возвращает:
+        Функцию, значения внутри которой добавляются в те же объекты Metrics, что и в текущем потоке.
+        """
+        targets = self._targets()
+
+        @functools.wraps(function)
+        def bound(*args, **kwargs):
+            with self._scope(targets):
+                return function(*args, **kwargs)
+
+        return bound
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Контекстный менеджер для замера времени выполнения этапа.
+
+        Аргументы:
+        name - название этапа.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        """
+        Метод для добавления замера времени этапа.
+
+        Аргументы:
+        name - название этапа.
+        seconds - время в секундах.
+        """
+        with self._lock:
+            timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+        for target in self._targets():
+            target.add_time(name, seconds)
+
+    def incr(self, name, value=1):
+        """
+        Метод для увеличения счетчика.
+
+        Аргументы:
+        name - название счетчика.
+        value - величина, на которую увеличивается счетчик.
+        """
+        if value:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + value
+            for target in self._targets():
+                target.incr(name, value)
+
+    def snapshot(self):
+        """
+        Метод для получения текущих значений.
+
+        Возвращает:
+        Словарь с таймерами (количество замеров, общее, среднее и максимальное время в секундах)
+        и счетчиками.
+        """
+        with self._lock:
+            timers = {name: {'count': count, 'total': round(total, 6), 'mean': round(total / count, 6),
+                             'max': round(maximum, 6)}
+                      for name, (count, total, maximum) in sorted(self._timers.items())}
+            counters = dict(sorted(self._counters.items()))
+
+        return {'timers': timers, 'counters': counters}
+
+    def to_json(self):
+        """
+        Метод для получения текущих значений в формате JSON (одной строкой).
+
+        Возвращает:
+        Строку JSON со значениями метода snapshot и состоянием моделей.
+        """
+        return json.dumps(dict(self.snapshot(), models=models.status()), ensure_ascii=False)
+
+    def merge(self, snapshot):
+        """
+        Метод для добавления значений, собранных в другом процессе.
+
+        Аргументы:
+        snapshot - словарь, полученный методом snapshot.
+        """
+        with self._lock:
+            for name, values in snapshot['timers'].items():
+                timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += values['count']
+                timer[1] += values['total']
+                timer[2] = max(timer[2], values['max'])
+            for name, value in snapshot['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+        for target in self._targets():
+            target.merge(snapshot)
+
+    def reset(self):
+        """
+        Метод для сброса всех таймеров и счетчиков.
+        """
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+
+# Общий для всего процесса сбор времени и счетчиков
+metrics = Metrics()
+
+
+def _ensure_nltk_data(resource, package):
+    # Скачиваем данные nltk, только если их еще нет на диске
+    import nltk
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        nltk.download(package, quiet=True)
+
+
+def _load_sent_tokenize():
+    # Токенизатор предложений nltk
+    _ensure_nltk_data('tokenizers/punkt', 'punkt')
+    from nltk.tokenize import sent_tokenize
+    return sent_tokenize
+
+
+def _load_nlp():
+    # Предобученная модель spacy
+    import en_core_web_sm
+    return en_core_web_sm.load()
+
+
+def _load_get_word_forms():
+    # Функция получения форм слова, которая использует WordNet
+    _ensure_nltk_data('corpora/wordnet', 'wordnet')
+    from word_forms.word_forms import get_word_forms
+    return get_word_forms
+
+
+def _load_modelru():
+    # Если построена сокращенная модель, загружаем только ее
+    if os.path.exists(os.path.join(WORD2VEC_SUBSET_PATH, 'meta.json')):
+        return CompactVectors.load(WORD2VEC_SUBSET_PATH)
+
+    return load_full_word2vec()
+
+
+def load_full_word2vec():
+    """
+    Функция для загрузки полной предобученной модели word2vec-ruscorpora-300 c gensim.
+
+    Возвращает:
+    Модель KeyedVectors.
+    """
+    import gensim.downloader as api
+    from gensim.models import KeyedVectors
+
+    # Если модель уже преобразована функцией convert_word2vec, открываем ее только для чтения
+    # через отображение в память: векторы не копируются в память процесса
+    if os.path.exists(WORD2VEC_PATH):
+        return KeyedVectors.load(WORD2VEC_PATH, mmap='r')
+
+    # Если модель уже скачана, загружаем ее напрямую, без обращения к каталогу моделей в сети
+    path = os.path.join(api.BASE_DIR, WORD2VEC_MODEL_NAME, f'{WORD2VEC_MODEL_NAME}.gz')
+    if os.path.exists(path):
+        return KeyedVectors.load_word2vec_format(path, binary=True)
+
+    return api.load(WORD2VEC_MODEL_NAME)
+
+
+def _load_word_frequency():
+    # Частотный список: слово в каждой строке, строки с # - комментарии
+    frequency = {}
+    with open(WORD_FREQUENCY_PATH, encoding='utf-8') as file:
+        for line in file:
+            word = line.strip().lower()
+            if word and not word.startswith('#'):
+                frequency.setdefault(word, len(frequency) + 1)
+    return frequency
+
+
+# Общий для всего процесса реестр моделей
+models = ModelRegistry()
+models.register('sent_tokenize', _load_sent_tokenize)
+models.register('nlp', _load_nlp)
+models.register('get_word_forms', _load_get_word_forms)
+models.register('modelru', _load_modelru)
+models.register('distractors', lambda: DistractorEngine(models.get('modelru')))
+models.register('verb_forms', lambda: VerbFormService.load(VERB_FORMS_PATH))
+models.register('word_frequency', _load_word_frequency)
+
+
+def convert_word2vec(path=WORD2VEC_PATH):
+    """
+    Функция для однократного преобразования модели word2vec в родной формат gensim,
+    который можно открывать через отображение в память.
+
+    Аргументы:
+    path - путь для сохранения модели (векторы сохраняются рядом в файл path + '.vectors.npy').
+
+    Возвращает:
+    Путь к сохраненной модели.
+    """
+    # Загружаем исходную модель, минуя уже преобразованную
+    import gensim.downloader as api
+    from gensim.models import KeyedVectors
+    source = os.path.join(api.BASE_DIR, WORD2VEC_MODEL_NAME, f'{WORD2VEC_MODEL_NAME}.gz')
+    if os.path.exists(source):
+        model = KeyedVectors.load_word2vec_format(source, binary=True)
+    else:
+        model = api.load(WORD2VEC_MODEL_NAME)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Сохраняем во временный файл и переименовываем, чтобы работающие процессы
+    # никогда не увидели недописанную модель
+    tmp_path = path + '.tmp'
+    model.save(tmp_path, separately=['vectors'])
+    os.replace(tmp_path + '.vectors.npy', path + '.vectors.npy')
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def warmup(names=None):
+    """
+    Функция для заблаговременной загрузки моделей из общего реестра.
+
+    Аргументы:
+    names - список названий моделей (по умолчанию все модели).
+    """
+    models.warmup(names)
+
+
+def status():
+    """
+    Функция для получения состояния моделей из общего реестра.
+
+    Возвращает:
+    Словарь с признаком загрузки и временем загрузки каждой модели.
+    """
+    return models.status()
+
+
+def __getattr__(name):
+    # Сохраняем доступ к моделям через атрибуты модуля nlp и modelru
+    if name in ('nlp', 'modelru'):
+        return models.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class TextToDataFrame:
+    def __init__(self, text, max_chunk_chars=1000000):
+        """
+        Конструктор класса TextToDataFrame.
+
+        Аргументы:
+        text - текст для обработки: строка или файловый объект (байты в UTF-8 или строки),
+        например, загруженный в Streamlit файл.
+        max_chunk_chars - размер части текста, которая читается и разбивается на предложения за один раз:
+        в памяти одновременно находится не больше двух частей, сколько бы ни весил весь текст.
+        """
+        self.text = text
+        self.max_chunk_chars = max_chunk_chars
+
+    def iter_chunks(self):
+        """
+        Метод для чтения текста по частям.
+
+        Возвращает:
+        Итератор по частям текста (строкам длиной не больше max_chunk_chars).
+        """
+        if isinstance(self.text, str):
+            for start in range(0, len(self.text), self.max_chunk_chars):
+                yield self.text[start:start + self.max_chunk_chars]
+            return
+
+        # Файл читается с начала, байты декодируются постепенно: символ,
+        # разрезанный границей части, собирается из двух частей
+        if hasattr(self.text, 'seek'):
+            self.text.seek(0)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            data = self.text.read(self.max_chunk_chars)
+            if not data:
+                break
+            chunk = decoder.decode(data) if isinstance(data, bytes) else data
+            if chunk:
+                yield chunk
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+    def iter_sentences(self):
+        """
+        Метод для получения предложений из текста по одному.
+
+        Текст разбивается на предложения по частям. Последнее предложение части может продолжаться
+        в следующей части, поэтому оно не возвращается сразу, а разбивается заново вместе со следующей частью.
+
+        Возвращает:
+        Итератор по предложениям без пробелов и табуляций в начале и в конце.
+        """
+        sent_tokenize = models.get('sent_tokenize')
+        chunks = self.iter_chunks()
+        buffer = ''
+        chunk = next(chunks, None)
+
+        while chunk is not None:
+            buffer += chunk
+            chunk = next(chunks, None)
+
+            # Разбиваем текст на предложения
+            with metrics.timer('split'):
+                sentences = sent_tokenize(buffer)
+
+            if chunk is not None and sentences:
+                # Оставляем в буфере исходный текст последнего предложения вместе с пробелами после него
+                start = buffer.rfind(sentences[-1])
+                buffer = buffer[start:] if start >= 0 else sentences[-1] + ' '
+                sentences = sentences[:-1]
+
+                # Предложение длиннее части текста отдается целиком, чтобы буфер не рос без ограничения
+                if len(buffer) > self.max_chunk_chars:
+                    sentences.append(buffer)
+                    buffer = ''
+
+            metrics.incr('sentences', len(sentences))
+            for sentence in sentences:
+                # Удаляем пробелы и табуляции в начале и в конце предложения
+                yield sentence.strip()
+
+    def txt_to_df(self):
+        """
+        Метод для преобразования текста в датафрейм.
+
+        Возвращает:
+        Датафрейм, содержащий предложения из текста и дополнительные столбцы
+        для упражнений по английскому языку.
+        """
+        # Создаем датафрейм из списка предложений
+        df = pd.DataFrame(list(self.iter_sentences()), columns=['sentence'])
+
+        # Добавляем новые столбцы в датафрейм
+        df['exercise_type'] = ''
+        df['exercise_sentence'] = ''
+        df['options'] = ''
+        df['correct_answer'] = ''
+
+        return df
+
+
+class SQLiteCache:
+    # При переполнении кэш очищается до этой доли ограничений, чтобы очистка выполнялась редко
+    LOW_WATER = 0.9
+
+    def __init__(self, path, max_entries=200000, max_bytes=None):
+        """
+        Конструктор класса SQLiteCache - постоянного кэша "ключ - значение" в файле SQLite.
+
+        Аргументы:
+        path - путь к файлу базы данных.
+        max_entries - максимальное количество записей, лишние записи удаляются
+        начиная с тех, к которым дольше всего не обращались.
+        max_bytes - максимальный общий размер значений в байтах (None - без ограничения).
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # Создаем каталог для файла базы данных, если его еще нет
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Одно соединение используется всеми потоками под блокировкой,
+        # режим WAL позволяет нескольким процессам работать с одним файлом
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                                 '(key TEXT PRIMARY KEY, value TEXT, accessed_at REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+
+        # Количество записей и общий размер значений поддерживаются триггерами,
+        # поэтому при каждой записи не нужно просматривать всю таблицу
+        self._connection.execute('CREATE TABLE IF NOT EXISTS cache_stats '
+                                 '(id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, bytes INTEGER)')
+        self._connection.execute('CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN '
+                                 'UPDATE cache_stats SET entries = entries + 1, '
+                                 'bytes = bytes + LENGTH(CAST(NEW.value AS BLOB)); END')
+        self._connection.execute('CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN '
+                                 'UPDATE cache_stats SET entries = entries - 1, '
+                                 'bytes = bytes - LENGTH(CAST(OLD.value AS BLOB)); END')
+        self._connection.execute('CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF value ON cache BEGIN '
+                                 'UPDATE cache_stats SET bytes = bytes - LENGTH(CAST(OLD.value AS BLOB)) '
+                                 '+ LENGTH(CAST(NEW.value AS BLOB)); END')
+
+        # Для уже существующей базы считаем начальные значения один раз
+        self._connection.execute('INSERT OR IGNORE INTO cache_stats '
+                                 'SELECT 0, COUNT(*), CAST(TOTAL(LENGTH(CAST(value AS BLOB))) AS INTEGER) FROM cache')
+        self._connection.commit()
+
+    def __getstate__(self):
+        # В другой процесс передается только путь к базе, соединение открывается заново
+        return {'path': self.path, 'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def get_many(self, keys):
+        """
+        Метод для получения нескольких значений из кэша.
+
+        Аргументы:
+        keys - список ключей.
+
+        Возвращает:
+        Словарь с найденными ключами и значениями (отсутствующие ключи пропускаются).
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+
+        with self._lock:
+            # Запрашиваем ключи частями, чтобы не превысить ограничение SQLite на число параметров
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._connection.execute(
+                    f'SELECT key, value FROM cache WHERE key IN ({placeholders})', chunk).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+
+            # Обновляем время последнего обращения к найденным записям
+            now = time.time()
+            self._connection.executemany('UPDATE cache SET accessed_at = ? WHERE key = ?',
+                                         [(now, key) for key in found])
+            self._connection.commit()
+
+        return found
+
+    def set_many(self, items):
+        """
+        Метод для сохранения нескольких значений в кэш.
+
+        Аргументы:
+        items - словарь с ключами и значениями (значения должны сериализоваться в JSON).
+        """
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            # При замене значения срабатывает триггер обновления, который пересчитывает общий размер
+            self._connection.executemany('INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE '
+                                         'SET value = excluded.value, accessed_at = excluded.accessed_at',
+                                         [(key, json.dumps(value, ensure_ascii=False), now)
+                                          for key, value in items.items()])
+            self._evict()
+            self._connection.commit()
+
+    def get(self, key, default=None):
+        """
+        Метод для получения одного значения из кэша.
+
+        Аргументы:
+        key - ключ.
+        default - значение, которое возвращается, если ключа нет в кэше.
+
+        Возвращает:
+        Значение из кэша или default.
+        """
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key, value):
+        """
+        Метод для сохранения одного значения в кэш.
+
+        Аргументы:
+        key - ключ.
+        value - значение.
+        """
+        self.set_many({key: value})
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT entries FROM cache_stats').fetchone()[0]
+
+    @property
+    def size(self):
+        """
+        Общий размер значений в кэше в байтах.
+        """
+        with self._lock:
+            return int(self._connection.execute('SELECT bytes FROM cache_stats').fetchone()[0])
+
+    def _evict(self):
+        # Удаляем записи, к которым дольше всего не обращались, только если кэш переполнен:
+        # количество записей и размер берутся из таблицы cache_stats, а не подсчетом по всей таблице
+        entries, total = self._connection.execute('SELECT entries, bytes FROM cache_stats').fetchone()
+        if entries > self.max_entries:
+            excess = entries - int(self.max_entries * SQLiteCache.LOW_WATER)
+            self._connection.execute('DELETE FROM cache WHERE key IN '
+                                     '(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)', (excess,))
+            total = self._connection.execute('SELECT bytes FROM cache_stats').fetchone()[0]
+
+        # Удаляем старые записи, пока общий размер значений больше нижней границы
+        if self.max_bytes is not None and total > self.max_bytes:
+            target = self.max_bytes * SQLiteCache.LOW_WATER
+            cursor = self._connection.execute('SELECT key, LENGTH(CAST(value AS BLOB)) FROM cache '
+                                              'ORDER BY accessed_at')
+            evicted = []
+            while total > target:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for key, size in rows:
+                    if total <= target:
+                        break
+                    evicted.append((key,))
+                    total -= size
+            cursor.close()
+            self._connection.executemany('DELETE FROM cache WHERE key = ?', evicted)
+
+
+class GoogleTranslateBackend:
+    def __init__(self):
+        """
+        Конструктор класса GoogleTranslateBackend - перевода слов с помощью Google Translate.
+        """
+        self._translator = None
+
+    def __getstate__(self):
+        # Объект Translator не передается в другие процессы и создается заново
+        return {'_translator': None}
+
+    def translate_many(self, words, src, dest):
+        """
+        Метод для перевода списка слов одним запросом.
+
+        Аргументы:
+        words - список слов для перевода.
+        src - язык исходных слов.
+        dest - язык перевода.
+
+        Возвращает:
+        Словарь, где ключи - слова, а значения - их переводы.
+        """
+        # Создаем объект Translator один раз и используем его для всех запросов
+        if self._translator is None:
+            from googletrans import Translator
+            self._translator = Translator()
+
+        translations = self._translator.translate(list(words), src=src, dest=dest)
+
+        return {word: translation.text for word, translation in zip(words, translations)}
+
+
+class DictionaryBackend:
+    def __init__(self, translations):
+        """
+        Конструктор класса DictionaryBackend - перевода слов по локальному словарю без обращения к сети.
+
+        Аргументы:
+        translations - словарь, где ключи - слова, а значения - их переводы.
+        """
+        self.translations = {word.lower(): translation for word, translation in translations.items()}
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Метод для загрузки локального словаря из файла.
+
+        Аргументы:
+        path - путь к файлу в формате JSON или к текстовому файлу,
+        где каждая строка содержит слово и перевод, разделенные табуляцией.
+
+        Возвращает:
+        Объект DictionaryBackend.
+        """
+        with open(path, encoding='utf-8') as file:
+            if path.endswith('.json'):
+                translations = json.load(file)
+            else:
+                translations = dict(line.rstrip('\n').split('\t', 1) for line in file if '\t' in line)
+
+        return cls(translations)
+
+    def translate_many(self, words, src, dest):
+        """
+        Метод для перевода списка слов по локальному словарю.
+
+        Аргументы:
+        words - список слов для перевода.
+        src - язык исходных слов.
+        dest - язык перевода.
+
+        Возвращает:
+        Словарь, где ключи - слова, а значения - их переводы (None, если слова нет в словаре).
+        """
+        return {word: self.translations.get(word.lower()) for word in words}
+
+
+class CachedTranslator:
+    def __init__(self, backend=None, cache=None, src='en', dest='ru', batch_size=100):
+        """
+        Конструктор класса CachedTranslator - перевода слов с постоянным кэшем.
+
+        Аргументы:
+        backend - объект для перевода слов с методом translate_many
+        (по умолчанию GoogleTranslateBackend).
+        cache - объект SQLiteCache для хранения переводов
+        (по умолчанию файл translations.sqlite3 в каталоге CACHE_DIR).
+        src - язык исходных слов.
+        dest - язык перевода.
+        batch_size - количество слов, которые отправляются в backend за один раз.
+        """
+        self.backend = backend if backend is not None else GoogleTranslateBackend()
+        self.cache = cache if cache is not None else SQLiteCache(os.path.join(CACHE_DIR, 'translations.sqlite3'))
+        self.src = src
+        self.dest = dest
+        self.batch_size = batch_size
+
+    def translate_many(self, words):
+        """
+        Метод для перевода списка слов: каждое слово переводится один раз,
+        а уже переведенные слова берутся из кэша.
+
+        Аргументы:
+        words - список слов для перевода (может содержать повторы).
+
+        Возвращает:
+        Словарь, где ключи - уникальные слова, а значения - их переводы (None, если перевод не найден).
+        """
+        # Убираем повторы, сохраняя порядок слов
+        words = list(dict.fromkeys(words))
+
+        # Ключ кэша составляется из слова и пары языков
+        keys = {word: f'{word}\t{self.src}\t{self.dest}' for word in words}
+
+        # Получаем уже известные переводы из кэша
+        cached = self.cache.get_many(keys.values())
+        translations = {word: cached.get(keys[word]) for word in words}
+
+        # Переводим недостающие слова пачками
+        missing = [word for word in words if translations[word] is None]
+        metrics.incr('translate.cache_hits', len(words) - len(missing))
+        metrics.incr('translate.cache_misses', len(missing))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            with metrics.timer('translate.request'):
+                translated = self.backend.translate_many(batch, self.src, self.dest)
+            metrics.incr('translate.requests')
+            translations.update(translated)
+
+            # Сохраняем в кэш только найденные переводы
+            self.cache.set_many({keys[word]: translation for word, translation in translated.items()
+                                 if translation is not None})
+
+        return translations
+
+    def translate(self, word):
+        """
+        Метод для перевода одного слова.
+
+        Аргументы:
+        word - слово для перевода.
+
+        Возвращает:
+        Перевод слова или None, если перевод не найден.
+        """
+        return self.translate_many([word])[word]
+
+
+class YandexDictionaryClient:
+    # Коды ответов, после которых запрос повторяется
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key, lang='en-ru', base_url=YANDEX_DICTIONARY_URL, cache=None,
+                 max_workers=8, requests_per_second=20, timeout=10, max_retries=3, backoff_factor=0.5):
+        """
+        Конструктор класса YandexDictionaryClient - клиента API сервиса Yandex Dictionary.
+
+        Аргументы:
+        api_key - API-ключ для доступа к сервису Yandex Dictionary.
+        lang - направление перевода.
+        base_url - адрес метода lookup (можно заменить на адрес локального тестового сервера).
+        cache - объект SQLiteCache для хранения ответов сервиса
+        (по умолчанию файл yandex_dictionary.sqlite3 в каталоге CACHE_DIR).
+        max_workers - максимальное количество одновременных запросов.
+        requests_per_second - максимальное количество запросов в секунду (None - без ограничения).
+        timeout - время ожидания ответа на один запрос в секундах.
+        max_retries - количество повторов запроса при ошибках 429 и 5xx.
+        backoff_factor - начальная пауза перед повтором в секундах, удваивается с каждым повтором.
+        """
+        self.api_key = api_key
+        self.lang = lang
+        self.base_url = base_url
+        self.cache = cache if cache is not None else SQLiteCache(os.path.join(CACHE_DIR, 'yandex_dictionary.sqlite3'))
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        # Одна сессия с пулом соединений на все запросы
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Время, раньше которого нельзя отправлять следующий запрос
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0.0
+
+    def _wait_for_rate_limit(self):
+        # Резервируем время для следующего запроса и ждем, если запросы идут слишком часто
+        if not self.requests_per_second:
+            return
+
+        with self._rate_lock:
+            now = time.monotonic()
+            request_time = max(now, self._next_request_time)
+            self._next_request_time = request_time + 1 / self.requests_per_second
+
+        time.sleep(request_time - now)
+
+    def _fetch(self, word):
+        # Отправляем запрос, повторяя его с растущей паузой при ошибках 429 и 5xx
+        params = {'key': self.api_key, 'lang': self.lang, 'text': word}
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+
+            try:
+                with metrics.timer('dictionary.request'):
+                    response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except requests.RequestException:
+                response = None
+            metrics.incr('dictionary.requests')
+
+            if response is not None:
+                # Успешный ответ содержит список статей словаря
+                if response.status_code == 200:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        data = None
+                    if isinstance(data, dict):
+                        return data.get('def', [])
+
+                    # Ответ без JSON (например, страница HTML или пустое тело): статей для слова нет,
+                    # результат не кэшируется
+                    logger.warning('Некорректный ответ Yandex Dictionary для слова %r', word)
+                    metrics.incr('dictionary.errors')
+                    return None
+
+                # Остальные ошибки повторять бессмысленно
+                if response.status_code not in self.RETRY_STATUSES:
+                    metrics.incr('dictionary.errors')
+                    return None
+
+            if attempt < self.max_retries:
+                metrics.incr('dictionary.retries')
+                time.sleep(self.backoff_factor * 2 ** attempt)
+
+        metrics.incr('dictionary.errors')
+        return None
+
+    def lookup_many(self, words, executor=None):
+        """
+        Метод для получения словарных статей для списка слов: запросы выполняются параллельно,
+        а уже полученные статьи берутся из кэша.
+
+        Аргументы:
+        words - список слов (может содержать повторы).
+        executor - пул потоков для запросов, общий для нескольких одновременных вызовов
+        (по умолчанию для вызова создается свой пул на max_workers потоков).
+
+        Возвращает:
+        Словарь, где ключи - уникальные слова, а значения - списки статей из поля def ответа
+        (None, если получить ответ не удалось).
+        """
+        # Убираем повторы, сохраняя порядок слов
+        words = list(dict.fromkeys(words))
+
+        # Ключ кэша составляется из слова и направления перевода
+        keys = {word: f'{word}\t{self.lang}' for word in words}
+
+        # Получаем уже известные статьи из кэша
+        cached = self.cache.get_many(keys.values())
+        definitions = {word: cached.get(keys[word]) for word in words}
+
+        # Запрашиваем недостающие слова параллельно
+        missing = [word for word in words if keys[word] not in cached]
+        metrics.incr('dictionary.cache_hits', len(words) - len(missing))
+        metrics.incr('dictionary.cache_misses', len(missing))
+        if len(missing) == 1 and executor is None:
+            # Одно слово запрашиваем без создания пула потоков
+            fetched = {missing[0]: self._fetch(missing[0])}
+        elif missing and executor is not None:
+            fetched = dict(zip(missing, executor.map(metrics.bind(self._fetch), missing)))
+        elif missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                fetched = dict(zip(missing, executor.map(metrics.bind(self._fetch), missing)))
+        else:
+            fetched = {}
+
+        if fetched:
+            definitions.update(fetched)
+
+            # Сохраняем в кэш только успешные ответы
+            self.cache.set_many({keys[word]: value for word, value in fetched.items() if value is not None})
+
+        return definitions
+
+    def lookup(self, word):
+        """
+        Метод для получения словарных статей для одного слова.
+
+        Аргументы:
+        word - слово.
+
+        Возвращает:
+        Список статей из поля def ответа или None, если получить ответ не удалось.
+        """
+        return self.lookup_many([word])[word]
+
+    @staticmethod
+    def extract_transcription(definitions):
+        """
+        Метод для получения транскрипции из списка словарных статей.
+
+        Аргументы:
+        definitions - список статей из поля def ответа.
+
+        Возвращает:
+        Транскрипцию из первой статьи или None, если транскрипция не найдена.
+        """
+        # Проверяем, найден ли хотя бы один элемент
+        if definitions:
+            # Получаем транскрипцию из первого элемента списка
+            return definitions[0].get('ts')
+        else:
+            return None
+
+
+class DictionaryCreator:
+    def __init__(self, api_key, translator=None, client=None, parser=None, lemmatize=True,
+                 pos_tags=('NOUN', 'VERB', 'ADJ', 'ADV'), frequency=None):
+        """
+        Конструктор класса DictionaryCreator.
+        
+        Аргументы:
+        api_key - API-ключ для доступа к сервису Yandex Dictionary.
+        translator - объект CachedTranslator для перевода слов (по умолчанию создается новый).
+        client - объект YandexDictionaryClient для получения транскрипций (по умолчанию создается новый).
+        parser - объект SentenceParser для получения лемм (по умолчанию создается новый).
+        lemmatize - если True, в словарь попадают леммы слов нужных частей речи ("runs" и "running"
+        дают одну запись "run"), иначе слова в той форме, в которой они встречаются в тексте.
+        pos_tags - части речи слов для словаря (используются, если lemmatize равен True).
+        frequency - словарь "слово - место в общем частотном списке" для отбора слов
+        (по умолчанию список из файла WORD_FREQUENCY_PATH).
+        """
+        self.api_key = api_key
+        self.translator = translator if translator is not None else CachedTranslator()
+        self.client = client if client is not None else YandexDictionaryClient(api_key)
+        self.parser = parser if parser is not None else SentenceParser()
+        self.lemmatize = lemmatize
+        self.pos_tags = set(pos_tags)
+        self.frequency = frequency
+    
+    def get_transcription(self, word):
+        """
+        Метод для получения транскрипции слова с помощью API сервиса Yandex Dictionary.
+        
+        Аргументы:
+        word - слово для транскрипции.
+        
+        Возвращает:
+        Транскрипцию слова или None, если транскрипция не найдена.
+        """
+        return self.client.extract_transcription(self.client.lookup(word))
+    
+    @staticmethod
+    def _sentence_words(sentence, min_word_length):
+        # Удаляем знаки препинания из предложения
+        sentence = sentence.translate(str.maketrans('', '', string.punctuation))
+
+        # Разбиваем предложение на слова и оставляем слова не короче минимальной длины
+        return [word for word in sentence.split() if len(word) >= min_word_length]
+
+    def _doc_words(self, doc, min_word_length):
+        # Оставляем леммы слов нужных частей речи не короче минимальной длины
+        lemmas = (token.lemma_.lower() for token in doc if token.is_alpha and token.pos_ in self.pos_tags)
+        return [lemma for lemma in lemmas if len(lemma) >= min_word_length]
+
+    def _extract(self, sentences, min_word_length, docs=None):
+        # Получаем слова для словаря из каждого предложения
+        if not self.lemmatize:
+            return [self._sentence_words(sentence, min_word_length) for sentence in sentences]
+        if docs is None:
+            docs = self.parser.parse_sentences(sentences)
+        return [self._doc_words(doc, min_word_length) for doc in docs]
+
+    def extract_words(self, sentences, min_word_length=6, store=None, docs=None):
+        """
+        Метод для получения слов для словаря из каждого предложения.
+
+        Аргументы:
+        sentences - список предложений.
+        min_word_length - минимальная длина слова.
+        store - объект ResultStore: слова предложений, которые уже встречались раньше,
+        берутся из хранилища, а разбираются только новые и измененные предложения.
+        docs - уже разобранные предложения (список или ParsedChunk), чтобы не разбирать их заново.
+
+        Возвращает:
+        Список списков слов (с повторами) в порядке предложений.
+        """
+        if store is None:
+            return self._extract(sentences, min_word_length, docs)
+
+        keys = store.make_keys('words', sentences, min_word_length=min_word_length,
+                               lemmatize=self.lemmatize, pos_tags=sorted(self.pos_tags))
+        stored = store.get_many(keys)
+
+        # Разбираем только предложения, которых нет в хранилище (или берем уже разобранные)
+        first_index = {}
+        for i, (sentence, key) in enumerate(zip(sentences, keys)):
+            if key not in stored:
+                first_index.setdefault(sentence, i)
+        missing = list(first_index)
+        missing_docs = _select_docs(docs, first_index.values()) if docs is not None else None
+        new_words = dict(zip(missing, self._extract(missing, min_word_length, missing_docs)))
+        store.put_many({key: new_words[sentence] for sentence, key in zip(sentences, keys) if key not in stored})
+
+        return [stored[key] if key in stored else new_words[sentence] for sentence, key in zip(sentences, keys)]
+
+    def select_words(self, sentences, min_word_length=6, max_entries=None, store=None):
+        """
+        Метод для отбора уникальных слов для словаря.
+
+        Если слов больше max_entries, остаются слова с наибольшей оценкой: количество повторов
+        в тексте, умноженное на логарифм места слова в общем частотном списке. Так частые в тексте,
+        но редкие в языке слова оказываются выше общеупотребительных.
+
+        Аргументы:
+        sentences - список предложений.
+        min_word_length - минимальная длина слова.
+        max_entries - максимальное количество слов (None - без ограничения).
+        store - объект ResultStore (см. extract_words).
+
+        Возвращает:
+        Список уникальных слов в порядке их первого появления в тексте.
+        """
+        return self.rank_words(self.extract_words(sentences, min_word_length, store), max_entries)
+
+    def rank_words(self, sentence_words, max_entries=None):
+        """
+        Метод для отбора уникальных слов для словаря из уже извлеченных слов (см. select_words).
+
+        Аргументы:
+        sentence_words - список списков слов предложений, как у extract_words.
+        max_entries - максимальное количество слов (None - без ограничения).
+
+        Возвращает:
+        Список уникальных слов в порядке их первого появления в тексте.
+        """
+        # Считаем повторы слов, порядок ключей - порядок первого появления
+        counts = collections.Counter(word for words in sentence_words for word in words)
+        words = list(counts)
+        metrics.incr('dictionary.candidates', len(words))
+
+        if max_entries is not None and len(words) > max_entries:
+            frequency = self.frequency if self.frequency is not None else models.get('word_frequency')
+            unknown_rank = len(frequency) + 1
+            scores = {word: count * math.log(frequency.get(word, unknown_rank) + 1) for word, count in counts.items()}
+            selected = set(sorted(words, key=lambda word: -scores[word])[:max_entries])
+            words = [word for word in words if word in selected]
+
+        metrics.incr('dictionary.selected', len(words))
+
+        return words
+
+    def _build_dictionary_df(self, words, translations, transcriptions):
+        # Создаем пустой список для хранения данных
+        data = []
+
+        for word in words:
+            # Получаем перевод и транскрипцию слова
+            translation = translations[word]
+            transcription = transcriptions[word]
+
+            # Добавляем данные в список
+            data.append((word.capitalize(), transcription,
+                         translation.capitalize() if translation is not None else None))
+
+        # Создаем датафрейм из списка данных
+        result_df = pd.DataFrame(data, columns=['Word', 'Transcription', 'Translation'])
+        result_df = result_df.dropna()
+        result_df = result_df.reset_index(drop=True)
+
+        return result_df
+
+    def create_dictionary_df(self, df, min_word_length=6, max_entries=None):
+        """
+        Метод для создания датафрейма со словами, их транскрипциями и переводами из другого датафрейма.
+        
+        Аргументы:
+        df - датафрейм с предложениями для анализа.
+        min_word_length - минимальная длина слова, слова короче этой длины не будут включены в датафрейм.
+        max_entries - максимальное количество слов в словаре (см. select_words).
+        
+        Возвращает:
+        Датафрейм, где первая колонка - это сложные слова, вторая колонка - транскрипции слов, 
+        а третья колонка - переводы на русский язык.
+        """
+        # Отбираем уникальные слова нужной длины
+        words = self.select_words(df['sentence'].tolist(), min_word_length, max_entries)
+
+        return self.lookup_dictionary_df(words)
+
+    def lookup_dictionary_df(self, words):
+        """
+        Метод для создания датафрейма со словарем для уже отобранных слов.
+
+        Аргументы:
+        words - список уникальных слов.
+
+        Возвращает:
+        Такой же датафрейм, как create_dictionary_df, с тем же порядком слов.
+        """
+        # Получаем переводы и словарные статьи всех слов сразу
+        with metrics.timer('dictionary.build'):
+            translations = self.translator.translate_many(words)
+            definitions = self.client.lookup_many(words)
+
+        transcriptions = {word: self.client.extract_transcription(definitions[word]) for word in words}
+
+        return self._build_dictionary_df(words, translations, transcriptions)
+
+    async def create_dictionary_df_async(self, df, min_word_length=6, concurrency=16, store=None, max_entries=None):
+        """
+        Асинхронный вариант метода create_dictionary_df: перевод и транскрипция всех слов
+        запрашиваются пачками одновременно, но не больше concurrency пачек сразу.
+        
+        Аргументы:
+        df - датафрейм с предложениями для анализа.
+        min_word_length - минимальная длина слова, слова короче этой длины не будут включены в датафрейм.
+        concurrency - максимальное количество пачек слов, которые запрашиваются одновременно.
+        store - объект ResultStore: слова уже обработанных предложений, а также переводы и транскрипции
+        уже встречавшихся слов берутся из хранилища.
+        max_entries - максимальное количество слов в словаре (см. select_words).
+        
+        Возвращает:
+        Такой же датафрейм, как create_dictionary_df, с тем же порядком слов.
+        """
+        # Отбираем уникальные слова нужной длины
+        words = self.select_words(df['sentence'].tolist(), min_word_length, max_entries, store)
+
+        return await self.lookup_dictionary_df_async(words, concurrency, store)
+
+    async def lookup_dictionary_df_async(self, words, concurrency=16, store=None):
+        """
+        Асинхронный вариант метода lookup_dictionary_df.
+
+        Аргументы:
+        words - список уникальных слов.
+        concurrency - максимальное количество пачек слов, которые запрашиваются одновременно.
+        store - объект ResultStore: переводы и транскрипции уже встречавшихся слов берутся из хранилища.
+
+        Возвращает:
+        Такой же датафрейм, как lookup_dictionary_df, с тем же порядком слов.
+        """
+        if store is None:
+            translations, transcriptions = await self._lookup_words_async(words, concurrency)
+        else:
+            translations, transcriptions = await self._lookup_stored_async(words, concurrency, store)
+
+        return self._build_dictionary_df(words, translations, transcriptions)
+
+    async def _lookup_stored_async(self, words, concurrency, store):
+        # Берем из хранилища переводы и транскрипции уже встречавшихся слов
+        keys = store.make_keys('entry', words, lang=self.client.lang)
+        stored = store.get_many(keys)
+        entries = {word: stored[key] for word, key in zip(words, keys) if key in stored}
+
+        # Запрашиваем только новые слова
+        new_words = [word for word in words if word not in entries]
+        translations, transcriptions = await self._lookup_words_async(new_words, concurrency)
+        for word in new_words:
+            entries[word] = [transcriptions[word], translations[word]]
+
+        # Слова, для которых не удалось получить перевод или транскрипцию, не сохраняются и запрашиваются снова
+        store.put_many({key: entries[word] for word, key in zip(words, keys)
+                        if key not in stored and None not in entries[word]})
+
+        return ({word: translation for word, (transcription, translation) in entries.items()},
+                {word: transcription for word, (transcription, translation) in entries.items()})
+
+    async def _lookup_words_async(self, words, concurrency):
+        # Делим слова на пачки: каждая пачка переводится одним вызовом translate_many
+        # и запрашивается одним вызовом lookup_many (с общим чтением и записью кэша)
+        words = list(dict.fromkeys(words))
+        batch_size = self.translator.batch_size
+        batches = [words[i:i + batch_size] for i in range(0, len(words), batch_size)]
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # Запросы всех пачек выполняются в одном общем пуле: одновременных запросов не больше,
+        # чем соединений в пуле соединений клиента, поэтому соединения не закрываются лишний раз
+        requests_executor = ThreadPoolExecutor(max_workers=min(concurrency, self.client.max_workers))
+        lookup_many = functools.partial(self.client.lookup_many, executor=requests_executor)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor, requests_executor:
+            async def run(function, batch):
+                # Синхронные клиенты выполняются в пуле потоков под семафором
+                async with semaphore:
+                    return await loop.run_in_executor(executor, metrics.bind(function), batch)
+
+            # Запускаем все пачки сразу, gather возвращает результаты в порядке пачек
+            with metrics.timer('dictionary.build'):
+                translation_results, definition_results = await asyncio.gather(
+                    asyncio.gather(*(run(self.translator.translate_many, batch) for batch in batches)),
+                    asyncio.gather(*(run(lookup_many, batch) for batch in batches)))
+
+        translations = {}
+        for result in translation_results:
+            translations.update(result)
+        transcriptions = {}
+        for result in definition_results:
+            transcriptions.update({word: self.client.extract_transcription(definitions)
+                                   for word, definitions in result.items()})
+
+        return translations, transcriptions
+
+
+class SentenceParser:
+    def __init__(self, batch_size=256, n_process=1, disable=DISABLED_PIPES):
+        """
+        Конструктор класса SentenceParser.
+
+        Аргументы:
+        batch_size - количество предложений, которые spacy обрабатывает за один раз.
+        n_process - количество процессов для разбора предложений.
+        disable - список компонентов конвейера spacy, которые не нужно запускать.
+        """
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.disable = list(disable)
+
+    def parse(self, sentence):
+        """
+        Метод для разбора одного предложения.
+
+        Аргументы:
+        sentence - предложение для разбора.
+
+        Возвращает:
+        Объект Doc с токенами предложения.
+        """
+        with metrics.timer('parse'):
+            return models.get('nlp')(sentence, disable=self.disable)
+
+    def parse_sentences(self, sentences):
+        """
+        Метод для пакетного разбора списка предложений с помощью nlp.pipe.
+
+        Аргументы:
+        sentences - список предложений для разбора.
+
+        Возвращает:
+        Список объектов Doc в том же порядке, что и предложения.
+        """
+        nlp = models.get('nlp')
+        with metrics.timer('parse'):
+            return list(nlp.pipe(sentences,
+                                 batch_size=self.batch_size,
+                                 n_process=self.n_process,
+                                 disable=self.disable))
+
+
+class ParsedChunk:
+    def __init__(self, sentences, parser):
+        """
+        Конструктор класса ParsedChunk - части предложений, каждое из которых разбирается не больше
+        одного раза, даже если разобранные предложения нужны нескольким этапам (упражнениям и словарю).
+
+        Аргументы:
+        sentences - список предложений.
+        parser - объект SentenceParser.
+        """
+        self.sentences = list(sentences)
+        self.parser = parser
+        self._docs = {}
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __iter__(self):
+        return iter(self.select(range(len(self.sentences))))
+
+    def select(self, indices):
+        """
+        Метод для получения разобранных предложений с нужными номерами: еще не разобранные
+        предложения разбираются одним пакетом.
+
+        Аргументы:
+        indices - номера предложений.
+
+        Возвращает:
+        Список объектов Doc в порядке номеров.
+        """
+        indices = list(indices)
+        missing = list(dict.fromkeys(i for i in indices if i not in self._docs))
+        if missing:
+            self._docs.update(zip(missing, self.parser.parse_sentences([self.sentences[i] for i in missing])))
+        return [self._docs[i] for i in indices]
+
+
+def _select_docs(docs, indices):
+    # Разобранные предложения с нужными номерами (ParsedChunk разбирает только недостающие)
+    if isinstance(docs, ParsedChunk):
+        return docs.select(indices)
+    return [docs[i] for i in indices]
+
+
+class CompactVectors:
+    # Версия формата сокращенной модели
+    FORMAT_VERSION = 1
+
+    # Поддерживаемые типы хранения векторов
+    DTYPES = ('float32', 'float16', 'int8')
+
+    def __init__(self, keys, data, norms, scales=None, path=None):
+        """
+        Конструктор класса CompactVectors - сокращенной модели word2vec, которую DistractorEngine
+        может использовать вместо полной модели KeyedVectors.
+
+        Аргументы:
+        keys - список ключей модели вида "слово_NOUN".
+        data - матрица векторов (float32, float16 или int8).
+        norms - нормы векторов в том виде, в котором их возвращает vectors.
+        scales - множители строк для векторов int8 (вектор равен data[i] * scales[i]).
+        path - каталог, из которого загружена модель (если есть).
+        """
+        self.index_to_key = list(keys)
+        self.key_to_index = {key: index for index, key in enumerate(self.index_to_key)}
+        self.data = data
+        self.norms = norms
+        self.scales = scales
+        self.path = path
+
+    def __getstate__(self):
+        # Модель, загруженная из каталога, передается в другие процессы только путем
+        if self.path is not None:
+            return {'path': self.path}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {'path'}:
+            state = CompactVectors.load(state['path']).__dict__
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return len(self.index_to_key)
+
+    @property
+    def vectors(self):
+        # Векторы int8 восстанавливаются в float32 только для запрошенных строк
+        if self.scales is None:
+            return self.data
+        return _ScaledVectors(self.data, self.scales)
+
+    @property
+    def nbytes(self):
+        # Объем памяти, который занимают массивы модели
+        return sum(array.nbytes for array in (self.data, self.norms, self.scales) if array is not None)
+
+    @classmethod
+    def from_model(cls, model, pos_tags=('NOUN', 'ADJ'), dtype='float16', block_size=16384):
+        """
+        Метод для создания сокращенной модели из полной: остаются только ключи с приписками
+        из pos_tags и без словосочетаний через '::', векторы при необходимости квантуются.
+
+        Аргументы:
+        model - модель word2vec (KeyedVectors).
+        pos_tags - части речи, ключи которых сохраняются.
+        dtype - тип хранения векторов ('float32', 'float16' или 'int8'). float16 почти не меняет результат поиска,
+        а int8 квантует с потерями: для части ключей (в проверке на синтетической модели - около 8%)
+        ближайшие слова отличаются от полной модели.
+        block_size - количество векторов, которые обрабатываются за один раз.
+
+        Возвращает:
+        Объект CompactVectors.
+        """
+        if dtype not in CompactVectors.DTYPES:
+            raise ValueError(f"Неподдерживаемый тип векторов: {dtype}")
+
+        suffixes = tuple(f'_{pos}' for pos in pos_tags)
+        indices = np.array([index for index, key in enumerate(model.index_to_key)
+                            if key.endswith(suffixes) and '::' not in key], dtype=np.int64)
+
+        data = np.empty((len(indices), model.vector_size), dtype=dtype)
+        norms = np.empty(len(indices), dtype=np.float32)
+        scales = np.empty(len(indices), dtype=np.float32) if dtype == 'int8' else None
+
+        # Обрабатываем векторы частями, чтобы не копировать всю матрицу в память процесса
+        for start in range(0, len(indices), block_size):
+            block = np.asarray(model.vectors[indices[start:start + block_size]], dtype=np.float32)
+            end = start + len(block)
+            if dtype == 'int8':
+                # Каждая строка масштабируется так, чтобы ее наибольший по модулю элемент стал 127
+                block_scales = np.maximum(np.abs(block).max(axis=1), 1e-12) / 127
+                data[start:end] = np.rint(block / block_scales[:, None])
+                scales[start:end] = block_scales
+                block = data[start:end] * block_scales[:, None]
+            else:
+                data[start:end] = block
+                block = data[start:end].astype(np.float32)
+
+            # Нормы считаем по уже округленным векторам, чтобы близость совпадала с поиском по ним
+            norms[start:end] = np.linalg.norm(block, axis=1)
+
+        return cls([model.index_to_key[index] for index in indices], data, norms, scales)
+
+    def save(self, path):
+        """
+        Метод для сохранения модели в каталог: массивы в файлы .npy, ключи и тип векторов в meta.json.
+        Модель сначала записывается во временный каталог, поэтому недописанная модель не видна читателям.
+
+        Аргументы:
+        path - путь к каталогу.
+        """
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        np.save(os.path.join(tmp_path, 'data.npy'), self.data)
+        np.save(os.path.join(tmp_path, 'norms.npy'), self.norms)
+        if self.scales is not None:
+            np.save(os.path.join(tmp_path, 'scales.npy'), self.scales)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump({'format_version': CompactVectors.FORMAT_VERSION, 'dtype': str(self.data.dtype),
+                       'keys': self.index_to_key}, file, ensure_ascii=False)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Метод для загрузки модели из каталога.
+
+        Аргументы:
+        path - путь к каталогу.
+        mmap - если True, массивы открываются только для чтения через отображение в память.
+
+        Возвращает:
+        Объект CompactVectors.
+        """
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta['format_version'] != CompactVectors.FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия сокращенной модели: {meta['format_version']}")
+
+        mmap_mode = 'r' if mmap else None
+        data = np.load(os.path.join(path, 'data.npy'), mmap_mode=mmap_mode)
+        norms = np.load(os.path.join(path, 'norms.npy'), mmap_mode=mmap_mode)
+        scales = None
+        if meta['dtype'] == 'int8':
+            scales = np.load(os.path.join(path, 'scales.npy'), mmap_mode=mmap_mode)
+
+        return cls(meta['keys'], data, norms, scales, path=path)
+
+
+class _ScaledVectors:
+    def __init__(self, data, scales):
+        # Векторы int8 с множителями строк, которые при обращении по номерам возвращаются в float32
+        self.data = data
+        self.scales = scales
+        self.shape = data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return np.asarray(self.data[index], dtype=np.float32) * np.asarray(self.scales[index])[..., None]
+
+
+class DistractorEngine:
+    def __init__(self, model, pos_tags=('NOUN', 'ADJ'), neighbours=None, block_size=16384, query_block_size=256):
+        """
+        Конструктор класса DistractorEngine - пакетного поиска похожих слов для вариантов ответа.
+
+        Аргументы:
+        model - модель word2vec (KeyedVectors, в том числе открытая через отображение в память,
+        или сокращенная модель CompactVectors).
+        pos_tags - части речи, среди которых ищутся похожие слова.
+        neighbours - заранее вычисленная таблица похожих слов для частых ключей
+        (словарь, где ключи - ключи модели, а значения - списки пар "слово - близость").
+        block_size - количество векторов модели, которые обрабатываются за один раз.
+        query_block_size - количество запросов, которые обрабатываются за один раз
+        (вместе с block_size ограничивает объем памяти для промежуточных массивов).
+        """
+        self.model = model
+        self.block_size = block_size
+        self.query_block_size = query_block_size
+        self.neighbours = dict(neighbours) if neighbours is not None else {}
+
+        # Заранее отбираем для каждой части речи подходящие ключи модели:
+        # с нужной припиской и без словосочетаний через '::'
+        self._candidates = {}
+        self._candidate_norms = {}
+        for pos in pos_tags:
+            suffix = f'_{pos}'
+            indices = np.array([index for index, key in enumerate(model.index_to_key)
+                                if key.endswith(suffix) and '::' not in key], dtype=np.int64)
+            self._candidates[pos] = indices
+
+            # Если у модели уже есть нормы векторов (например, у CompactVectors), берем их,
+            # иначе считаем частями, чтобы не копировать всю матрицу в память процесса
+            model_norms = getattr(model, 'norms', None)
+            if model_norms is not None:
+                norms = np.asarray(model_norms[indices], dtype=np.float32)
+            else:
+                norms = np.empty(len(indices), dtype=np.float32)
+                for start in range(0, len(indices), block_size):
+                    chunk = indices[start:start + block_size]
+                    norms[start:start + block_size] = np.linalg.norm(
+                        np.asarray(model.vectors[chunk], dtype=np.float32), axis=1)
+            self._candidate_norms[pos] = np.maximum(norms, 1e-12)
+
+    @classmethod
+    def load_neighbours(cls, path):
+        """
+        Метод для загрузки таблицы похожих слов из файла JSON.
+
+        Аргументы:
+        path - путь к файлу.
+
+        Возвращает:
+        Словарь, где ключи - ключи модели, а значения - списки пар "слово - близость".
+        """
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def save_neighbours(self, path):
+        """
+        Метод для сохранения таблицы похожих слов в файл JSON.
+
+        Аргументы:
+        path - путь к файлу.
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.neighbours, file, ensure_ascii=False)
+
+    def precompute(self, keys, topn=3):
+        """
+        Метод для заполнения таблицы похожих слов для частых ключей.
+
+        Аргументы:
+        keys - список ключей модели вида "слово_NOUN".
+        topn - количество похожих слов для каждого ключа.
+        """
+        self.neighbours.update(self._search(keys, topn))
+
+    def most_similar_batch(self, keys, topn=3):
+        """
+        Метод для поиска похожих слов сразу для всех ключей.
+
+        Аргументы:
+        keys - список ключей модели вида "слово_NOUN" или "слово_ADJ" (может содержать повторы).
+        topn - количество похожих слов для каждого ключа.
+
+        Возвращает:
+        Словарь, где ключи - найденные в модели ключи, а значения - списки пар "слово - близость"
+        в порядке убывания близости. Ключей, которых нет в модели, в словаре нет.
+        """
+        keys = list(dict.fromkeys(keys))
+
+        # Частые ключи берем из таблицы, остальные ищем одним пакетом
+        result = {key: self.neighbours[key][:topn] for key in keys if key in self.neighbours}
+        metrics.incr('distractors.table_hits', len(result))
+        metrics.incr('distractors.queries', len(keys) - len(result))
+        with metrics.timer('distractors.most_similar'):
+            result.update(self._search([key for key in keys if key not in result], topn))
+
+        return result
+
+    def _search(self, keys, topn):
+        # Группируем ключи по части речи, неизвестные модели ключи пропускаем
+        groups = {}
+        for key in keys:
+            pos = key.rsplit('_', 1)[-1]
+            if pos in self._candidates and key in self.model.key_to_index:
+                groups.setdefault(pos, []).append(key)
+
+        result = {}
+        for pos, group in groups.items():
+            candidates = self._candidates[pos]
+            norms = self._candidate_norms[pos]
+
+            # Обрабатываем запросы блоками фиксированного размера
+            for query_start in range(0, len(group), self.query_block_size):
+                block = group[query_start:query_start + self.query_block_size]
+                best_scores, best_indices = self._search_block(block, candidates, norms, topn)
+
+                for i, key in enumerate(block):
+                    result[key] = [(self.model.index_to_key[index], float(score))
+                                   for index, score in zip(best_indices[i], best_scores[i])
+                                   if score > -np.inf]
+
+        return result
+
+    def _search_block(self, keys, candidates, norms, topn):
+        # Нормализуем векторы запросов
+        query_indices = np.array([self.model.key_to_index[key] for key in keys], dtype=np.int64)
+        queries = np.asarray(self.model.vectors[query_indices], dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        rows = np.arange(len(keys))
+
+        # Лучшие найденные на текущий момент близости и номера слов для каждого запроса
+        best_scores = np.full((len(keys), 0), -np.inf, dtype=np.float32)
+        best_indices = np.empty((len(keys), 0), dtype=np.int64)
+
+        for start in range(0, len(candidates), self.block_size):
+            chunk = candidates[start:start + self.block_size]
+
+            # Косинусная близость всех запросов блока со всеми словами части одним умножением матриц
+            scores = queries @ np.asarray(self.model.vectors[chunk], dtype=np.float32).T
+            scores /= norms[start:start + self.block_size]
+
+            # Само слово запроса не считается похожим на себя (номера кандидатов отсортированы)
+            positions = np.minimum(np.searchsorted(chunk, query_indices), len(chunk) - 1)
+            own = chunk[positions] == query_indices
+            scores[rows[own], positions[own]] = -np.inf
+
+            # Оставляем topn лучших слов части и объединяем их с лучшими результатами
+            k = min(topn, scores.shape[1])
+            top = np.argpartition(scores, -k, axis=1)[:, -k:]
+            all_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            all_indices = np.concatenate([best_indices, chunk[top]], axis=1)
+            k = min(topn, all_scores.shape[1])
+            top = np.argpartition(all_scores, -k, axis=1)[:, -k:]
+            best_scores = np.take_along_axis(all_scores, top, axis=1)
+            best_indices = np.take_along_axis(all_indices, top, axis=1)
+
+        # Сортируем результаты по убыванию близости
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_indices, order, axis=1)
+
+
+class VerbFormIndex:
+    def __init__(self, groups, index):
+        """
+        Конструктор класса VerbFormIndex - заранее построенного индекса форм глаголов,
+        который заменяет вызовы get_word_forms во время генерации упражнений.
+
+        Аргументы:
+        groups - список наборов форм глагола (одинаковые наборы хранятся один раз).
+        index - словарь, где ключи - формы слов, а значения - номера наборов в groups,
+        совпадающих с get_word_forms(слово)['v'].
+        """
+        self.groups = [frozenset(group) for group in groups]
+        self.index = index
+
+    @classmethod
+    def build(cls, words=None):
+        """
+        Метод для построения индекса с помощью get_word_forms и WordNet.
+
+        Аргументы:
+        words - список начальных слов (по умолчанию все однословные глаголы WordNet).
+        Формы, найденные для этих слов, тоже добавляются в индекс.
+
+        Возвращает:
+        Объект VerbFormIndex.
+        """
+        get_word_forms = models.get('get_word_forms')
+        if words is None:
+            from nltk.corpus import wordnet
+            words = sorted({lemma.name().lower() for synset in wordnet.all_synsets('v')
+                            for lemma in synset.lemmas() if '_' not in lemma.name()})
+
+        groups = []
+        group_ids = {}
+        index = {}
+        queue = list(words)
+        seen = set(queue)
+
+        # Обходим слова и все найденные формы, пока не встретятся только известные формы
+        while queue:
+            word = queue.pop()
+            forms = frozenset(get_word_forms(word)['v'])
+            if forms not in group_ids:
+                group_ids[forms] = len(groups)
+                groups.append(forms)
+            index[word] = group_ids[forms]
+            for form in forms:
+                if form not in seen:
+                    seen.add(form)
+                    queue.append(form)
+
+        return cls(groups, index)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Метод для загрузки индекса из сжатого файла JSON.
+
+        Аргументы:
+        path - путь к файлу.
+
+        Возвращает:
+        Объект VerbFormIndex.
+        """
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            data = json.load(file)
+
+        return cls(data['groups'], data['index'])
+
+    def save(self, path):
+        """
+        Метод для сохранения индекса в сжатый файл JSON.
+
+        Аргументы:
+        path - путь к файлу.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            json.dump({'groups': [sorted(group) for group in self.groups], 'index': self.index},
+                      file, ensure_ascii=False, separators=(',', ':'))
+
+    def get(self, word):
+        """
+        Метод для получения форм глагола.
+
+        Аргументы:
+        word - слово в нижнем регистре.
+
+        Возвращает:
+        Множество форм глагола или None, если слова нет в индексе.
+        """
+        group_id = self.index.get(word)
+        return self.groups[group_id] if group_id is not None else None
+
+    def __len__(self):
+        return len(self.index)
+
+
+class VerbFormService:
+    def __init__(self, index=None, cache_size=4096):
+        """
+        Конструктор класса VerbFormService - получения форм глагола с ограниченным кэшем в памяти.
+
+        Аргументы:
+        index - объект VerbFormIndex (если не передан, формы вычисляются функцией get_word_forms).
+        cache_size - максимальное количество слов в кэше.
+        """
+        self.index = index
+        self._cached_forms = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def load(cls, path, cache_size=4096):
+        """
+        Метод для создания сервиса по файлу индекса.
+
+        Аргументы:
+        path - путь к файлу индекса (если файла нет, формы вычисляются функцией get_word_forms).
+        cache_size - максимальное количество слов в кэше.
+
+        Возвращает:
+        Объект VerbFormService.
+        """
+        index = VerbFormIndex.load(path) if os.path.exists(path) else None
+        return cls(index, cache_size)
+
+    def _lookup(self, word):
+        # Слова, которых нет в индексе, не являются формами глаголов WordNet
+        if self.index is not None:
+            forms = self.index.get(word)
+            return forms if forms is not None else frozenset()
+
+        return frozenset(models.get('get_word_forms')(word)['v'])
+
+    def forms(self, word):
+        """
+        Метод для получения форм глагола (совпадает с get_word_forms(word)['v']).
+
+        Аргументы:
+        word - слово в нижнем регистре.
+
+        Возвращает:
+        Множество форм глагола.
+        """
+        return self._cached_forms(word)
+
+
+class Exercise:
+    # Список полей вместо словаря атрибутов: запись занимает меньше памяти и быстрее создается
+    __slots__ = ('sentence', 'exercise_type', 'exercise_sentence', 'options', 'correct_answer')
+
+    def __init__(self, sentence, exercise_type, exercise_sentence, options, correct_answer):
+        """
+        Конструктор класса Exercise - записи об одном упражнении.
+
+        Аргументы:
+        sentence - исходное предложение.
+        exercise_type - тип упражнения.
+        exercise_sentence - предложение для упражнения.
+        options - список вариантов ответа.
+        correct_answer - верный ответ.
+        """
+        self.sentence = sentence
+        self.exercise_type = exercise_type
+        self.exercise_sentence = exercise_sentence
+        self.options = options
+        self.correct_answer = correct_answer
+
+    def to_tuple(self):
+        """
+        Метод для преобразования записи в кортеж.
+
+        Возвращает:
+        Кортеж значений полей в порядке EXERCISE_COLUMNS.
+        """
+        return (self.sentence, self.exercise_type, self.exercise_sentence, self.options, self.correct_answer)
+
+    def __eq__(self, other):
+        return isinstance(other, Exercise) and self.to_tuple() == other.to_tuple()
+
+    def __repr__(self):
+        return f'Exercise{self.to_tuple()!r}'
+
+
+# Столбцы датафрейма с упражнениями
+EXERCISE_COLUMNS = list(Exercise.__slots__)
+
+
+def exercises_to_df(exercises):
+    """
+    Функция для сборки датафрейма из записей об упражнениях.
+
+    Аргументы:
+    exercises - итерируемый объект с записями Exercise.
+
+    Возвращает:
+    Датафрейм со столбцами EXERCISE_COLUMNS.
+    """
+    records = [exercise.to_tuple() for exercise in exercises]
+    with metrics.timer('assemble'):
+        return pd.DataFrame(records, columns=EXERCISE_COLUMNS)
+
+
+class ExerciseStore:
+    def __init__(self, exercises, base=None):
+        """
+        Конструктор класса ExerciseStore - неизменяемого набора упражнений с индексами по типам,
+        который можно использовать из всех сессий одновременно.
+
+        Аргументы:
+        exercises - итерируемый объект с записями Exercise (записи копируются,
+        варианты ответа хранятся в кортежах).
+        base - набор ExerciseStore, к упражнениям которого добавляются exercises: его записи и индексы
+        используются повторно, поэтому обрабатываются только новые упражнения (сам base не изменяется).
+        """
+        added = tuple(Exercise(exercise.sentence, exercise.exercise_type, exercise.exercise_sentence,
+                               tuple(exercise.options), exercise.correct_answer)
+                      for exercise in exercises)
+        base_exercises = base.exercises if base is not None else ()
+        base_types = base.types if base is not None else ()
+        base_indexes = base._indexes if base is not None else {frozenset(): np.empty(0, dtype=np.int32)}
+        self.exercises = base_exercises + added
 
-import word_forms
-from word_forms.word_forms import get_word_forms
+        # Типы упражнений в порядке первого появления и код типа каждого нового упражнения
+        self.types = tuple(dict.fromkeys(base_types + tuple(exercise.exercise_type for exercise in added)))
+        type_codes = {exercise_type: code for code, exercise_type in enumerate(self.types)}
+        codes = np.fromiter((type_codes[exercise.exercise_type] for exercise in added), dtype=np.int8,
+                            count=len(added))
+
+        # Номера упражнений для каждого непустого набора типов (типов немного, поэтому наборов тоже):
+        # к номерам упражнений base добавляются номера подходящих новых упражнений
+        self._indexes = {frozenset(): base_indexes[frozenset()]}
+        for size in range(1, len(self.types) + 1):
+            for combination in itertools.combinations(range(len(self.types)), size):
+                types = frozenset(self.types[code] for code in combination)
+                index = base_indexes[types.intersection(base_types)]
+                new_numbers = np.flatnonzero(np.isin(codes, combination)).astype(np.int32) + len(base_exercises)
+                if len(new_numbers):
+                    index = np.concatenate((index, new_numbers))
+                    index.flags.writeable = False
+                self._indexes[types] = index
+
+    def __len__(self):
+        return len(self.exercises)
+
+    def _index(self, types):
+        # Номера упражнений выбранных типов (None, если подходят все упражнения)
+        if not types:
+            return None
+        types = frozenset(types).intersection(self.types)
+        if types and len(types) == len(self.types):
+            return None
+        return self._indexes[types]
+
+    def count(self, types=None):
+        """
+        Метод для подсчета упражнений выбранных типов.
+
+        Аргументы:
+        types - список типов упражнений (пустой список или None - все типы).
+
+        Возвращает:
+        Количество упражнений.
+        """
+        index = self._index(types)
+        return len(self.exercises) if index is None else len(index)
+
+    def page(self, start, size, types=None):
+        """
+        Метод для получения страницы упражнений без копирования всего набора.
+
+        Аргументы:
+        start - номер первого упражнения среди упражнений выбранных типов.
+        size - количество упражнений на странице.
+        types - список типов упражнений (пустой список или None - все типы).
+
+        Возвращает:
+        Кортеж записей Exercise (записи общие для всех сессий и не должны изменяться).
+        """
+        index = self._index(types)
+        if index is None:
+            return self.exercises[start:start + size]
+        return tuple(self.exercises[i] for i in index[start:start + size])
+
+
+class ExercisePack:
+    # Версия формата пакета упражнений
+    FORMAT_VERSION = 1
+
+    # Массивы пакета (каждый хранится в отдельном файле .npy)
+    ARRAYS = ('string_data', 'string_offsets', 'sentences', 'exercise_sentences', 'correct_answers',
+              'type_codes', 'option_offsets', 'options')
+
+    def __init__(self, arrays, types, path=None):
+        """
+        Конструктор класса ExercisePack - компактного набора упражнений из массивов NumPy.
+
+        Все строки хранятся один раз: в массиве string_data (байты UTF-8 подряд) с границами
+        в string_offsets, а упражнения ссылаются на них номерами. Варианты ответа всех упражнений
+        лежат подряд в массиве options, границы вариантов упражнения i - option_offsets[i:i + 2].
+        Вместо названий типов хранятся их коды (номера в списке types).
+
+        Аргументы:
+        arrays - словарь с массивами ARRAYS.
+        types - список названий типов упражнений.
+        path - каталог, из которого загружен пакет (если есть).
+        """
+        self.arrays = arrays
+        self.types = tuple(types)
+        self.path = path
+
+    def __getattr__(self, name):
+        # Массивы доступны как атрибуты: pack.options, pack.type_codes и т.д.
+        if name in ExercisePack.ARRAYS and 'arrays' in self.__dict__:
+            return self.arrays[name]
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        # Пакет, загруженный из каталога, передается в другие процессы только путем,
+        # и каждый процесс заново открывает файлы через отображение в память
+        if self.path is not None:
+            return {'path': self.path}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {'path'}:
+            state = ExercisePack.load(state['path']).__dict__
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_exercises(cls, exercises):
+        """
+        Метод для создания пакета из записей об упражнениях.
+
+        Аргументы:
+        exercises - итерируемый объект с записями Exercise.
+
+        Возвращает:
+        Объект ExercisePack.
+        """
+        # Номера строк: одинаковые строки хранятся один раз
+        strings = {}
+        types = {}
+        columns = {'sentences': [], 'exercise_sentences': [], 'correct_answers': [], 'type_codes': []}
+        options = []
+        option_offsets = [0]
+
+        for exercise in exercises:
+            columns['sentences'].append(strings.setdefault(exercise.sentence, len(strings)))
+            columns['exercise_sentences'].append(strings.setdefault(exercise.exercise_sentence, len(strings)))
+            columns['correct_answers'].append(strings.setdefault(exercise.correct_answer, len(strings)))
+            columns['type_codes'].append(types.setdefault(exercise.exercise_type, len(types)))
+            options.extend(strings.setdefault(option, len(strings)) for option in exercise.options)
+            option_offsets.append(len(options))
+
+        # Склеиваем строки в один массив байтов и запоминаем границы строк
+        encoded = [value.encode('utf-8') for value in strings]
+        string_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=string_offsets[1:])
+
+        arrays = {
+            'string_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'string_offsets': string_offsets,
+            'sentences': np.array(columns['sentences'], dtype=np.int32),
+            'exercise_sentences': np.array(columns['exercise_sentences'], dtype=np.int32),
+            'correct_answers': np.array(columns['correct_answers'], dtype=np.int32),
+            'type_codes': np.array(columns['type_codes'], dtype=np.int8),
+            'option_offsets': np.array(option_offsets, dtype=np.int64),
+            'options': np.array(options, dtype=np.int32),
+        }
+
+        return cls(arrays, list(types))
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Метод для создания пакета из датафрейма с упражнениями.
+
+        Аргументы:
+        df - датафрейм со столбцами EXERCISE_COLUMNS.
+
+        Возвращает:
+        Объект ExercisePack.
+        """
+        return cls.from_exercises(Exercise(*record) for record in df[EXERCISE_COLUMNS].itertuples(index=False))
+
+    def save(self, path):
+        """
+        Метод для сохранения пакета в каталог: массивы в файлы .npy, типы и версия формата в meta.json.
+        Пакет сначала записывается во временный каталог, поэтому недописанный пакет не виден читателям.
+
+        Аргументы:
+        path - путь к каталогу.
+        """
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        for name in ExercisePack.ARRAYS:
+            np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(self.arrays[name]))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump({'format_version': ExercisePack.FORMAT_VERSION, 'count': len(self),
+                       'types': list(self.types)}, file, ensure_ascii=False)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Метод для загрузки пакета из каталога.
+
+        Аргументы:
+        path - путь к каталогу.
+        mmap - если True, массивы открываются только для чтения через отображение в память:
+        загрузка почти мгновенная, а все процессы делят одну копию данных в кэше страниц.
+
+        Возвращает:
+        Объект ExercisePack.
+        """
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta['format_version'] != ExercisePack.FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия пакета упражнений: {meta['format_version']}")
+
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in ExercisePack.ARRAYS}
+
+        return cls(arrays, meta['types'], path=path)
+
+    def __len__(self):
+        return len(self.arrays['sentences'])
+
+    def string(self, number):
+        """
+        Метод для получения строки по номеру.
+
+        Аргументы:
+        number - номер строки.
+
+        Возвращает:
+        Строку.
+        """
+        start, end = self.string_offsets[number], self.string_offsets[number + 1]
+        return self.string_data[start:end].tobytes().decode('utf-8')
+
+    def __getitem__(self, i):
+        # Собираем запись об одном упражнении, декодируя только нужные строки
+        start, end = self.option_offsets[i], self.option_offsets[i + 1]
+        return Exercise(self.string(self.sentences[i]), self.types[self.type_codes[i]],
+                        self.string(self.exercise_sentences[i]),
+                        [self.string(number) for number in self.options[start:end]],
+                        self.string(self.correct_answers[i]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_df(self):
+        """
+        Метод для преобразования пакета в датафрейм.
+
+        Возвращает:
+        Датафрейм со столбцами EXERCISE_COLUMNS, как у exercises_to_df.
+        """
+        # Декодируем все строки один раз
+        data = self.string_data.tobytes()
+        offsets = self.string_offsets.tolist()
+        strings = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+        option_offsets = self.option_offsets.tolist()
+        options = [strings[number] for number in self.options.tolist()]
+        types = [self.types[code] for code in self.type_codes.tolist()]
+
+        with metrics.timer('assemble'):
+            return pd.DataFrame({
+                'sentence': [strings[number] for number in self.sentences.tolist()],
+                'exercise_type': types,
+                'exercise_sentence': [strings[number] for number in self.exercise_sentences.tolist()],
+                'options': [options[option_offsets[i]:option_offsets[i + 1]] for i in range(len(self))],
+                'correct_answer': [strings[number] for number in self.correct_answers.tolist()],
+            }, columns=EXERCISE_COLUMNS)
+
+
+def model_versions():
+    """
+    Функция для получения версий моделей и библиотек, от которых зависит результат генерации.
+
+    Возвращает:
+    Словарь с версиями.
+    """
+    versions = {'pipeline': PIPELINE_VERSION, 'word2vec': WORD2VEC_MODEL_NAME}
+    for package in ('en_core_web_sm', 'spacy', 'word_forms'):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+
+    # Индекс форм глаголов может быть построен заново, поэтому учитываем время его изменения
+    versions['verb_forms'] = os.path.getmtime(VERB_FORMS_PATH) if os.path.exists(VERB_FORMS_PATH) else None
+
+    # Неверные варианты перевода зависят от того, используется ли сокращенная модель word2vec
+    subset_meta = os.path.join(WORD2VEC_SUBSET_PATH, 'meta.json')
+    versions['word2vec_subset'] = os.path.getmtime(subset_meta) if os.path.exists(subset_meta) else None
+
+    return versions
+
+
+def normalize_text(text):
+    """
+    Функция для приведения текста к единому виду перед генерацией и вычислением ключа.
+
+    Аргументы:
+    text - текст.
+
+    Возвращает:
+    Текст в форме NFC с переводами строк \\n и без пробелов в начале и в конце.
+    """
+    return unicodedata.normalize('NFC', text).replace('\r\n', '\n').replace('\r', '\n').strip()
+
+
+def file_fingerprint(file, chunk_size=2 ** 20):
+    """
+    Функция для вычисления хэша содержимого файла по частям, без чтения всего файла в память.
+
+    Аргументы:
+    file - файловый объект (байтовый или текстовый, текст хэшируется в кодировке UTF-8).
+    chunk_size - размер части, которая читается за один раз.
+
+    Возвращает:
+    Хэш SHA-256 содержимого файла в шестнадцатеричном виде.
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    digest = hashlib.sha256()
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            break
+        digest.update(data if isinstance(data, bytes) else data.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path=None, max_bytes=512 * 2 ** 20):
+        """
+        Конструктор класса ResultStore - постоянного хранилища сгенерированных упражнений и словарей,
+        общего для всех процессов и перезапусков приложения.
+
+        Аргументы:
+        path - путь к файлу базы данных (по умолчанию results.sqlite3 в каталоге CACHE_DIR).
+        max_bytes - максимальный общий размер сохраненных результатов в байтах.
+        """
+        path = path if path is not None else os.path.join(CACHE_DIR, 'results.sqlite3')
+        self.cache = SQLiteCache(path, max_bytes=max_bytes)
+
+        # Версии моделей определяются один раз при открытии хранилища
+        self.versions = model_versions()
+
+    def _digest(self, kind, text, params):
+        # Хэш SHA-256 вида результата, текста, параметров и версий моделей
+        digest = hashlib.sha256(text.encode('utf-8'))
+        digest.update(json.dumps({'kind': kind, 'params': params, 'versions': self.versions},
+                                 sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def make_key(self, text, **params):
+        """
+        Метод для вычисления ключа результата по содержимому текста.
+
+        Аргументы:
+        text - текст.
+        params - параметры генерации (например, min_word_length).
+
+        Возвращает:
+        Хэш SHA-256 нормализованного текста, параметров и версий моделей.
+        """
+        return self._digest('text', normalize_text(text), params)
+
+    def make_file_key(self, fingerprint, **params):
+        """
+        Метод для вычисления ключа результата для файла по хэшу его содержимого.
+
+        Аргументы:
+        fingerprint - хэш SHA-256 байтов файла (см. file_fingerprint).
+        params - параметры генерации (например, min_word_length).
+
+        Возвращает:
+        Хэш SHA-256 хэша файла, параметров и версий моделей.
+        """
+        return self._digest('file', fingerprint, params)
+
+    def make_keys(self, kind, values, **params):
+        """
+        Метод для вычисления ключей результатов для отдельных предложений или слов.
+
+        Аргументы:
+        kind - вид результата ('exercise', 'words' или 'entry').
+        values - список предложений или слов.
+        params - параметры генерации.
+
+        Возвращает:
+        Список ключей в том же порядке.
+        """
+        return [f'{kind}:{self._digest(kind, value, params)}' for value in values]
+
+    def get_many(self, keys):
+        """
+        Метод для получения сохраненных результатов для отдельных предложений или слов.
+
+        Аргументы:
+        keys - список ключей, вычисленных методом make_keys.
+
+        Возвращает:
+        Словарь с найденными ключами и значениями.
+        """
+        found = self.cache.get_many(keys)
+        metrics.incr('results.item_hits', len(found))
+        metrics.incr('results.item_misses', len(set(keys)) - len(found))
+        return found
+
+    def put_many(self, items):
+        """
+        Метод для сохранения результатов для отдельных предложений или слов.
+
+        Аргументы:
+        items - словарь с ключами и значениями.
+        """
+        self.cache.set_many(items)
+
+    def get(self, key):
+        """
+        Метод для получения сохраненного результата.
+
+        Аргументы:
+        key - ключ, вычисленный методом make_key.
+
+        Возвращает:
+        Кортеж из списка записей Exercise и датафрейма со словарем или None, если результата нет.
+        """
+        value = self.cache.get(key)
+        metrics.incr('results.hits' if value is not None else 'results.misses')
+        if value is None:
+            return None
+
+        exercises = [Exercise(*record) for record in value['exercises']]
+        dictionary_df = pd.DataFrame(value['dictionary'], columns=['Word', 'Transcription', 'Translation'])
+
+        return exercises, dictionary_df
+
+    def put(self, key, exercises, dictionary_df):
+        """
+        Метод для сохранения результата.
+
+        Аргументы:
+        key - ключ, вычисленный методом make_key.
+        exercises - список записей Exercise.
+        dictionary_df - датафрейм со словарем.
+        """
+        self.cache.set(key, {'exercises': [exercise.to_tuple() for exercise in exercises],
+                             'dictionary': dictionary_df.values.tolist()})
+
+
+class ExerciseGenerator:
+    def __init__(self, parser=None, translator=None, distractors=None, rng=None,
+                 n_workers=1, seed=None, shard_size=256, mp_context='spawn'):
+        """
+        Конструктор класса ExerciseGenerator.
+
+        Аргументы:
+        parser - объект SentenceParser для разбора предложений
+        (по умолчанию создается с параметрами по умолчанию).
+        translator - объект CachedTranslator для перевода слов (по умолчанию создается новый).
+        distractors - объект DistractorEngine для поиска неверных вариантов перевода
+        (по умолчанию используется общий объект из реестра моделей).
+        rng - генератор случайных чисел (по умолчанию модуль random).
+        n_workers - количество процессов для генерации упражнений.
+        seed - начальное значение для генерации: если оно задано, каждое предложение получает свой
+        генератор случайных чисел, который зависит только от seed и текста предложения, поэтому результат
+        не зависит от количества процессов, размера частей и от того, что уже сохранено в хранилище.
+        shard_size - количество предложений в одной части, которая обрабатывается процессом пула.
+        mp_context - способ запуска процессов пула (см. multiprocessing.get_context): при spawn процессы
+        не наследуют открытые соединения SQLite и блокировки других потоков, а генератор передается им через pickle.
+        """
+        self.parser = parser if parser is not None else SentenceParser()
+        self.translator = translator if translator is not None else CachedTranslator()
+        self.distractors = distractors
+        self.rng = rng
+        self.n_workers = n_workers
+        self.seed = seed
+        self.shard_size = shard_size
+        self.mp_context = mp_context
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Пул процессов и блокировка не передаются в другие процессы
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        del state['_executor_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._executor_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Метод для остановки пула процессов, если он был создан.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_rng(self):
+        # Генератор случайных чисел по умолчанию - общий модуль random
+        return self.rng if self.rng is not None else random
+
+    def _get_distractors(self):
+        # Объект поиска похожих слов загружается вместе с моделью word2vec только при первом обращении
+        return self.distractors if self.distractors is not None else models.get('distractors')
+
+    @staticmethod
+    def _fill_row(row, exercise):
+        # Заполняем поля упражнения в строке, если упражнение не составлено - заполняем все поля None
+        for column in EXERCISE_COLUMNS[1:]:
+            row[column] = getattr(exercise, column) if exercise is not None else None
+
+        return row
+
+    @staticmethod
+    def _translate_tokens(doc):
+        # Токены, которые являются существительными или прилагательными
+        return [token for token in doc if token.pos_ in ['NOUN', 'ADJ']]
+
+    @staticmethod
+    def _verb_tokens(doc):
+        # Токены, которые являются глаголами
+        return [token for token in doc if token.pos_ == 'VERB']
+
+    @staticmethod
+    def _article_tokens(doc):
+        # Токены, которые являются артиклями
+        return [token for token in doc if token.pos_ == 'DET' and token.text.lower() in ['a', 'an', 'the']]
+
+    def _choose_translate_token(self, doc, rng):
+        # Выбираем токены, которые являются существительными или прилагательными
+        tokens = self._translate_tokens(doc)
+
+        # Если есть подходящие токены, выбираем случайный токен
+        return rng.choice(tokens) if len(tokens) > 0 else None
+
+    def _choose_verb_token(self, doc, rng):
+        # Выбираем токены, которые являются глаголами
+        tokens = self._verb_tokens(doc)
+
+        # Если есть подходящие токены, выбираем случайный токен
+        return rng.choice(tokens) if len(tokens) > 0 else None
+
+    def _choose_article_token(self, doc, rng):
+        # Выбираем токены, которые являются артиклями
+        tokens = self._article_tokens(doc)
+
+        # Если есть подходящие токены, выбираем случайный токен
+        return rng.choice(tokens) if len(tokens) > 0 else None
+
+    @staticmethod
+    def _distractor_key(token, translation):
+        # Ключ модели word2vec для перевода выбранного слова
+        return f"{translation}_{token.pos_}"
+
+    @staticmethod
+    def _distractor_words(similar_words):
+        # Удаляем приписки _NOUN и _ADJ у похожих слов (None, если перевода нет в модели word2vec)
+        if similar_words is None:
+            return None
+        return [word.split('_')[0] for word, similarity in similar_words]
+
+    @staticmethod
+    def _verb_forms(token_text):
+        # Получаем отсортированный список других форм глагола по слову в нижнем регистре
+        with metrics.timer('word_forms'):
+            return sorted(models.get('verb_forms').forms(token_text.lower()))
+
+    @staticmethod
+    def _build_translate_exercise(sentence, token_text, translation, distractors, rng):
+        # Если перевод не найден или его нет в модели word2vec, упражнение составить нельзя
+        if translation is None or distractors is None:
+            return None
+
+        # Выделяем выбранное слово жирным шрифтом
+        exercise_sentence = sentence.replace(token_text, f'**{token_text}**')
+
+        # Проверяем, начинается ли слово с заглавной буквы
+        is_title = token_text.istitle()
+
+        # Неверные варианты - похожие на перевод слова
+        options = list(distractors)
+
+        # Если слово начиналось с заглавной буквы, преобразуем перевод в заглавный
+        if is_title:
+            options = [option.title() for option in options]
+            translation = translation.title()
+
+        # Добавляем перевод верного ответа в список вариантов
+        options.append(translation)
+
+        # Удаляем дубликаты из списка вариантов и сортируем его, чтобы результат
+        # не зависел от порядка обхода множества в конкретном процессе
+        options = sorted(set(options))
+
+        # Перемешиваем список вариантов
+        rng.shuffle(options)
+
+        return Exercise(sentence, 'Выберите перевод слова', exercise_sentence, options, translation)
+
+    @staticmethod
+    def _build_verb_exercise(sentence, start, end, verb_forms, rng):
+        # Получаем текст токена
+        token_text = sentence[start:end]
+
+        # Заменяем токен на пропуск в предложении
+        exercise_sentence = sentence[:start] + '___' + sentence[end:]
+
+        # Получаем верный ответ
+        correct_answer = token_text
+
+        # Используем все формы глагола из списка
+        options = list(verb_forms)
+
+        # Если слово начиналось с заглавной буквы, преобразуем варианты в заглавные
+        if token_text.istitle():
+            options = [option.title() for option in options]
+
+        # Перемешиваем список вариантов
+        rng.shuffle(options)
+
+        return Exercise(sentence, 'Выберите форму глагола', exercise_sentence, options, correct_answer)
+
+    @staticmethod
+    def _build_article_exercise(sentence, start, end):
+        # Получаем текст токена
+        token_text = sentence[start:end]
+
+        # Проверяем, начинается ли слово с заглавной буквы
+        is_title = token_text.istitle()
+
+        # Заменяем токен на пропуск в предложении
+        exercise_sentence = sentence[:start] + '___' + sentence[end:]
+
+        # Получаем верный ответ
+        correct_answer = token_text
+
+        # Создаем список вариантов ответа
+        options = ['a', 'an', 'the']
+
+        # Если слово начиналось с заглавной буквы, преобразуем варианты в заглавные
+        if is_title:
+            options = [option.title() for option in options]
+
+        return Exercise(sentence, 'Выберите артикль', exercise_sentence, options, correct_answer)
+
+    def generate_translate_exercise(self, row, doc=None):
+        """
+        Функция для генерации упражнения на перевод слова.
+    
+        Аргументы:
+        row - строка датафрейма, содержащая предложение и столбцы для упражнений.
+        doc - уже разобранное предложение (если не передано, предложение разбирается заново).
+    
+        Возвращает:
+        Обновленную строку с информацией об упражнении на перевод слова.
+        """
+        # Получаем предложение
+        sentence = row['sentence']
+    
+        # Разбиваем предложение на токены с помощью spacy, если это не сделано заранее
+        if doc is None:
+            doc = self.parser.parse(sentence)
+
+        # Выбираем случайное существительное или прилагательное
+        token = self._choose_translate_token(doc, self._get_rng())
+
+        exercise = None
+        if token is not None:
+            # Находим перевод выбранного слова в нижнем регистре
+            translation = self.translator.translate(token.text.lower())
+
+            # Получаем ближайшие слова из модели word2vec
+            similar_words = None
+            if translation is not None:
+                key = self._distractor_key(token, translation)
+                similar_words = self._get_distractors().most_similar_batch([key]).get(key)
+
+            exercise = self._build_translate_exercise(sentence, token.text, translation,
+                                                      self._distractor_words(similar_words), self._get_rng())
+
+        return self._fill_row(row, exercise)
+
+    def generate_verb_exercise(self, row, doc=None):
+        """
+        Функция для генерации упражнения с глаголами.
+    
+        Аргументы:
+        row - строка датафрейма, содержащая предложение и столбцы для упражнений.
+        doc - уже разобранное предложение (если не передано, предложение разбирается заново).
+    
+        Возвращает:
+        Обновленную строку с информацией об упражнении с глаголами.
+        """
+        # Получаем предложение
+        sentence = row['sentence']
+    
+        # Разбиваем предложение на токены с помощью spacy, если это не сделано заранее
+        if doc is None:
+            doc = self.parser.parse(sentence)
+
+        # Выбираем случайный глагол
+        token = self._choose_verb_token(doc, self._get_rng())
+
+        exercise = None
+        if token is not None:
+            exercise = self._build_verb_exercise(sentence, token.idx, token.idx + len(token),
+                                                 self._verb_forms(token.text), self._get_rng())
+
+        return self._fill_row(row, exercise)
+    
+    def generate_article_exercise(self, row, doc=None):
+        """
+        Функция для генерации упражнения на употребление артиклей.
+    
+        Аргументы:
+        row - строка датафрейма, содержащая предложение и столбцы для упражнений.
+        doc - уже разобранное предложение (если не передано, предложение разбирается заново).
+    
+        Возвращает:
+        Обновленную строку с информацией об упражнении на употребление артиклей.
+        """
+        # Получаем предложение
+        sentence = row['sentence']
+    
+        # Разбиваем предложение на токены с помощью spacy, если это не сделано заранее
+        if doc is None:
+            doc = self.parser.parse(sentence)
 
-import random
-import gensim.downloader as api
+        # Выбираем случайный артикль
+        token = self._choose_article_token(doc, self._get_rng())
 
-import requests
+        exercise = None
+        if token is not None:
+            exercise = self._build_article_exercise(sentence, token.idx, token.idx + len(token))
 
-# Предобученная модель spacy
-import en_core_web_sm
-nlp = en_core_web_sm.load()
+        return self._fill_row(row, exercise)
+    
+    def generate_exercises(self, sentences, docs=None, rng=None, seed=None):
+        """
+        Метод для генерации случайных упражнений для списка предложений.
 
-# Предобученная модель word2vec-ruscorpora-300 c gensim
-modelru = api.load("word2vec-ruscorpora-300")
+        Сначала для каждого предложения выбирается тип упражнения и слово, затем переводы
+        и похожие слова для всех упражнений на перевод ищутся одним пакетом,
+        после чего упражнения составляются по порядку.
 
+        Аргументы:
+        sentences - список предложений.
+        docs - уже разобранные предложения (если не переданы, предложения разбираются пакетами).
+        rng - генератор случайных чисел (по умолчанию генератор объекта).
+        seed - начальное значение: если оно задано, вместо rng для каждого предложения используется
+        свой генератор случайных чисел, зависящий только от seed и текста предложения.
 
-class TextToDataFrame:
-    def __init__(self, text):
+        Возвращает:
+        Список записей Exercise той же длины, что и список предложений
+        (None для предложений, по которым упражнение составить не удалось).
         """
-        Конструктор класса TextToDataFrame.
+        # Генератор случайных чисел для каждого предложения
+        if seed is not None:
+            rngs = [self._sentence_rng(seed, sentence) for sentence in sentences]
+        else:
+            rngs = [rng if rng is not None else self._get_rng()] * len(sentences)
 
-        Аргументы:
-        text - текст для обработки.
-        """
-        self.text = text
+        # Разбираем все предложения один раз пакетами
+        if docs is None:
+            docs = self.parser.parse_sentences(sentences)
 
-    def txt_to_df(self):
+        # Функции выбора слова для каждого типа упражнений
+        choosers = {'translate': self._choose_translate_token,
+                    'verb': self._choose_verb_token,
+                    'article': self._choose_article_token}
+
+        # Выбираем случайный тип упражнения и слово для каждого предложения
+        choices = []
+        for doc, rng in zip(docs, rngs):
+            exercise_kind = rng.choice(['translate', 'verb', 'article'])
+            choices.append((exercise_kind, choosers[exercise_kind](doc, rng)))
+
+        # Переводим все выбранные для упражнений на перевод слова сразу
+        translate_tokens = [token for exercise_kind, token in choices
+                            if exercise_kind == 'translate' and token is not None]
+        translations = self.translator.translate_many([token.text.lower() for token in translate_tokens])
+
+        # Ищем похожие слова для всех переводов одним пакетом
+        keys = [self._distractor_key(token, translations[token.text.lower()]) for token in translate_tokens
+                if translations[token.text.lower()] is not None]
+        similar = self._get_distractors().most_similar_batch(keys)
+
+        exercises = []
+        for sentence, (exercise_kind, token), rng in zip(sentences, choices, rngs):
+            # Составляем упражнение выбранного типа
+            if token is None:
+                exercise = None
+            elif exercise_kind == 'translate':
+                translation = translations[token.text.lower()]
+                similar_words = similar.get(self._distractor_key(token, translation))
+                exercise = self._build_translate_exercise(sentence, token.text, translation,
+                                                          self._distractor_words(similar_words), rng)
+            elif exercise_kind == 'verb':
+                exercise = self._build_verb_exercise(sentence, token.idx, token.idx + len(token),
+                                                     self._verb_forms(token.text), rng)
+            else:
+                exercise = self._build_article_exercise(sentence, token.idx, token.idx + len(token))
+
+            exercises.append(exercise)
+
+        # Считаем составленные упражнения и предложения, по которым упражнение составить не удалось
+        built = sum(exercise is not None for exercise in exercises)
+        metrics.incr('exercises.built', built)
+        metrics.incr('exercises.dropped', len(exercises) - built)
+
+        return exercises
+
+    @staticmethod
+    def _sentence_rng(seed, sentence):
+        # Генератор случайных чисел предложения зависит только от начального значения и текста предложения
+        return random.Random(f'{seed}:{sentence}')
+
+    def generate_exercises_sharded(self, sentences, offset=0, docs=None):
         """
-        Метод для преобразования текста в датафрейм.
+        Метод для генерации упражнений по частям с отдельным генератором случайных чисел для каждого
+        предложения. Если n_workers больше 1, части обрабатываются параллельно в пуле процессов.
+
+        Аргументы:
+        sentences - список предложений.
+        offset - номер первого предложения в тексте (границы частей отсчитываются от начала текста).
+        docs - уже разобранные предложения (список или ParsedChunk; используются, если части
+        обрабатываются в этом процессе).
 
         Возвращает:
-        Датафрейм, содержащий предложения из текста и дополнительные столбцы
-        для упражнений по английскому языку.
+        Список записей Exercise той же длины, что и список предложений, в исходном порядке.
         """
-        # Разбиваем текст на предложения
-        sentences = sent_tokenize(self.text)
+        # Если начальное значение не задано, берем его из общего генератора случайных чисел
+        seed = self.seed if self.seed is not None else self._get_rng().randrange(2 ** 32)
 
-        # Удаляем пробелы и табуляции в начале и в конце каждого предложения
-        sentences = [sentence.strip() for sentence in sentences]
+        # Делим предложения на части, границы которых кратны shard_size от начала текста
+        shards = []
+        start = 0
+        while start < len(sentences):
+            end = start + self.shard_size - (offset + start) % self.shard_size
+            shards.append((sentences[start:end], seed))
+            start = end
 
-        # Создаем датафрейм из списка предложений
-        df = pd.DataFrame(sentences, columns=['sentence'])
+        # Одну часть или без нескольких процессов обрабатываем все предложения вместе в этом процессе
+        if self.n_workers <= 1 or len(shards) <= 1:
+            return self.generate_exercises(sentences, docs=docs, seed=seed)
 
-        # Добавляем новые столбцы в датафрейм
-        df['exercise_type'] = ''
-        df['exercise_sentence'] = ''
-        df['options'] = ''
-        df['correct_answer'] = ''
+        # Пул процессов создается один раз (даже если генератор используется из нескольких потоков),
+        # каждый процесс загружает модели при запуске
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.n_workers,
+                                                     mp_context=multiprocessing.get_context(self.mp_context),
+                                                     initializer=_init_worker, initargs=(self,))
+        results = self._merge_worker_metrics(self._executor.map(_generate_shard, shards))
 
-        return df
+        # Собираем результаты в исходном порядке предложений
+        return [exercise for result in results for exercise in result]
 
+    @staticmethod
+    def _merge_worker_metrics(results):
+        # Добавляем время и счетчики процессов пула к общим значениям этого процесса
+        for exercises, snapshot in results:
+            metrics.merge(snapshot)
+            yield exercises
 
-class DictionaryCreator:
-    def __init__(self, api_key):
+    def _generate_all(self, sentences, offset=0, docs=None):
+        # Части обрабатываются в пуле процессов, только если процессов несколько
+        if self.n_workers > 1:
+            return self.generate_exercises_sharded(sentences, offset, docs)
+        return self.generate_exercises(sentences, docs=docs, seed=self.seed)
+
+    def _generate_stored(self, sentences, offset, store, docs=None):
+        # Берем из хранилища упражнения для уже обработанных предложений
+        keys = store.make_keys('exercise', sentences, seed=self.seed)
+        stored = store.get_many(keys)
+
+        # Составляем упражнения только для новых и измененных предложений
+        missing_indices = [i for i, key in enumerate(keys) if key not in stored]
+        missing = [sentences[i] for i in missing_indices]
+        missing_docs = _select_docs(docs, missing_indices) if docs is not None and missing else None
+        generated = iter(self._generate_all(missing, offset, missing_docs) if missing else [])
+
+        # Собираем упражнения в исходном порядке предложений
+        exercises = []
+        new_records = {}
+        for key in keys:
+            if key in stored:
+                record = stored[key]
+                exercise = Exercise(*record) if record is not None else None
+            else:
+                exercise = next(generated)
+                new_records[key] = exercise.to_tuple() if exercise is not None else None
+            exercises.append(exercise)
+
+        store.put_many(new_records)
+
+        return exercises
+
+    def iter_exercises(self, sentences, chunk_size=None, store=None, on_chunk=None):
         """
-        Конструктор класса DictionaryCreator.
-        
+        Метод для получения составленных упражнений без сборки датафрейма.
+
         Аргументы:
-        api_key - API-ключ для доступа к сервису Yandex Dictionary.
+        sentences - итерируемый объект с предложениями (например, генератор).
+        chunk_size - количество предложений, которые обрабатываются вместе: упражнения
+        из первой части появляются, не дожидаясь обработки остальных предложений
+        (по умолчанию все предложения обрабатываются вместе).
+        store - объект ResultStore: упражнения для предложений, которые уже встречались раньше,
+        берутся из хранилища, а составляются только для новых и измененных предложений.
+        on_chunk - функция, которая вызывается для каждой части с ее предложениями и объектом ParsedChunk
+        после составления упражнений: так другие этапы (например, словарь) используют те же разобранные
+        предложения, и каждое предложение разбирается один раз.
+
+        Возвращает:
+        Итератор по записям Exercise (предложения без упражнений пропускаются).
         """
-        self.api_key = api_key
-    
-    def get_transcription(self, word):
+        sentences = iter(sentences)
+        offset = 0
+
+        while True:
+            # Берем следующую часть предложений
+            chunk = list(itertools.islice(sentences, chunk_size))
+            if not chunk:
+                return
+
+            # Предложения части разбираются только при первом обращении и только один раз
+            docs = ParsedChunk(chunk, self.parser)
+            if store is None:
+                exercises = self._generate_all(chunk, offset, docs)
+            else:
+                exercises = self._generate_stored(chunk, offset, store, docs)
+            if on_chunk is not None:
+                on_chunk(chunk, docs)
+            for exercise in exercises:
+                if exercise is not None:
+                    yield exercise
+
+            offset += len(chunk)
+
+    def generate_random_exercises(self, df):
         """
-        Метод для получения транскрипции слова с помощью API сервиса Yandex Dictionary.
+        Метод для генерации случайных упражнений.
         
         Аргументы:
-        word - слово для транскрипции.
+        df - датафрейм, содержащий предложения и столбцы для упражнений.
         
         Возвращает:
-        Транскрипцию слова или None, если транскрипция не найдена.
+        Новый датафрейм с информацией об упражнениях (предложения без упражнений удаляются).
         """
-        # URL для запроса к API сервиса Yandex Dictionary
-        url = f"https://dictionary.yandex.net/api/v1/dicservice.json/lookup?key={self.api_key}&lang=en-ru&text={word}"
+        # Собираем датафрейм один раз из готовых записей
+        return exercises_to_df(self.iter_exercises(df['sentence'].tolist()))
 
-        # Отправляем запрос к API сервиса Yandex Dictionary
-        response = requests.get(url)
+    def build_candidate_index(self, sentences, docs=None):
+        """
+        Метод для однократного разбора предложений и сохранения всех слов, по которым можно составить
+        упражнения. Переводы, неверные варианты перевода и формы глаголов находятся сразу для всех слов,
+        поэтому новые наборы упражнений по индексу составляются без spaCy, WordNet и word2vec.
 
-        # Проверяем статус ответа
-        if response.status_code == 200:
-            # Получаем JSON-ответ
-            data = response.json()
+        Аргументы:
+        sentences - список предложений.
+        docs - уже разобранные предложения (если не переданы, предложения разбираются пакетами).
 
-            # Получаем список элементов с транскрипциями
-            transcription_elements = data.get('def', [])
+        Возвращает:
+        Объект CandidateIndex.
+        """
+        sentences = list(sentences)
 
-            # Проверяем, найден ли хотя бы один элемент
-            if len(transcription_elements) > 0:
-                # Получаем первый элемент списка
-                transcription_element = transcription_elements[0]
+        # Разбираем все предложения один раз пакетами
+        if docs is None:
+            docs = self.parser.parse_sentences(sentences)
 
-                # Получаем текст элемента
-                transcription = transcription_element.get('ts')
+        with metrics.timer('candidates.build'):
+            # Собираем пары "номер предложения - токен" для каждого типа упражнений
+            finders = {'translate': self._translate_tokens,
+                       'verb': self._verb_tokens,
+                       'article': self._article_tokens}
+            found = {kind: [] for kind in finders}
+            for number, doc in enumerate(docs):
+                for kind, finder in finders.items():
+                    found[kind].extend((number, token) for token in finder(doc))
 
-                return transcription
-            else:
-                # Если элемент не найден, возвращаем None
-                return None
-        else:
-            # Если статус ответа не равен 200, возвращаем None
-            return None
-    
-    def create_dictionary_df(self, df, min_word_length=6):
+            # Переводим все существительные и прилагательные и ищем похожие слова одним пакетом
+            translations = self.translator.translate_many([token.text.lower() for number, token in found['translate']])
+            keys = [self._distractor_key(token, translations[token.text.lower()])
+                    for number, token in found['translate'] if translations[token.text.lower()] is not None]
+            similar = self._get_distractors().most_similar_batch(keys)
+
+            candidates = {kind: [] for kind in finders}
+            for number, token in found['translate']:
+                # Слова без перевода или без перевода в модели word2vec в индекс не попадают
+                translation = translations[token.text.lower()]
+                if translation is None:
+                    continue
+                distractors = self._distractor_words(similar.get(self._distractor_key(token, translation)))
+                if distractors is not None:
+                    candidates['translate'].append((number, token, (translation, tuple(distractors))))
+
+            # Для глаголов сохраняем отсортированные формы, для артиклей дополнительные данные не нужны
+            candidates['verb'] = [(number, token, tuple(self._verb_forms(token.text))) for number, token in found['verb']]
+            candidates['article'] = [(number, token, None) for number, token in found['article']]
+
+            # Кандидаты предложения i имеют номера от offsets[i] до offsets[i + 1]
+            offsets, spans, payloads = {}, {}, {}
+            for kind, items in candidates.items():
+                numbers = np.array([number for number, token, payload in items], dtype=np.int64)
+                offsets[kind] = np.concatenate(([0], np.cumsum(np.bincount(numbers, minlength=len(sentences)))))
+                offsets[kind] = offsets[kind].astype(np.int32)
+                spans[kind] = np.array([(token.idx, token.idx + len(token)) for number, token, payload in items],
+                                       dtype=np.int32).reshape(-1, 2)
+                payloads[kind] = tuple(payload for number, token, payload in items)
+                metrics.incr(f'candidates.{kind}', len(items))
+
+        return CandidateIndex(sentences, offsets, spans, payloads)
+
+
+# Генератор упражнений в процессе пула (у каждого процесса свой)
+_worker_generator = None
+
+
+def _init_worker(generator):
+    # Загружаем модели один раз при запуске процесса пула
+    global _worker_generator
+    _worker_generator = generator
+    names = ['nlp', 'verb_forms']
+    if generator.distractors is None:
+        names.append('distractors')
+    models.warmup(names)
+
+
+def _generate_shard(shard):
+    # Генерируем упражнения для одной части предложений в процессе пула
+    # и возвращаем их вместе с временем и счетчиками, собранными при генерации
+    sentences, seed = shard
+    metrics.reset()
+    exercises = _worker_generator.generate_exercises(sentences, seed=seed)
+    return exercises, metrics.snapshot()
+
+
+class CandidateIndex:
+    # Типы упражнений: перевод слова, форма глагола и артикль
+    KINDS = ('translate', 'verb', 'article')
+
+    def __init__(self, sentences, offsets, spans, payloads):
         """
-        Метод для создания датафрейма со словами, их транскрипциями и переводами из другого датафрейма.
-        
+        Конструктор класса CandidateIndex - индекса всех слов текста, по которым можно составить упражнения
+        (создается методом ExerciseGenerator.build_candidate_index).
+
         Аргументы:
-        df - датафрейм с предложениями для анализа.
-        min_word_length - минимальная длина слова, слова короче этой длины не будут включены в датафрейм.
-        
+        sentences - список предложений.
+        offsets - словарь, где ключи - типы упражнений, а значения - массивы длины len(sentences) + 1:
+        кандидаты предложения i имеют номера от offsets[i] до offsets[i + 1].
+        spans - словарь, где значения - массивы пар "начало - конец слова в предложении" для всех кандидатов.
+        payloads - словарь, где значения - кортежи данных кандидатов: пара из перевода и неверных вариантов
+        для перевода, формы глагола для глаголов и None для артиклей.
+        """
+        self.sentences = tuple(sentences)
+        self.offsets = offsets
+        self.spans = spans
+        self.payloads = payloads
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def count(self, kind):
+        """
+        Метод для подсчета кандидатов одного типа во всем тексте.
+
+        Аргументы:
+        kind - тип упражнения ('translate', 'verb' или 'article').
+
         Возвращает:
-        Датафрейм, где первая колонка - это сложные слова, вторая колонка - транскрипции слов, 
-        а третья колонка - переводы на русский язык.
+        Количество кандидатов.
         """
-        # Создаем пустой список для хранения данных
-        data = []
+        return len(self.payloads[kind])
+
+    def _build(self, number, kind, candidate, rng):
+        # Составляем упражнение по сохраненным данным кандидата
+        sentence = self.sentences[number]
+        start, end = self.spans[kind][candidate].tolist()
+        payload = self.payloads[kind][candidate]
+        if kind == 'translate':
+            translation, distractors = payload
+            return ExerciseGenerator._build_translate_exercise(sentence, sentence[start:end], translation,
+                                                               distractors, rng)
+        if kind == 'verb':
+            return ExerciseGenerator._build_verb_exercise(sentence, start, end, payload, rng)
+        return ExerciseGenerator._build_article_exercise(sentence, start, end)
 
-        # Создаем множество для хранения уникальных слов
-        unique_words = set()
+    def _sample(self, number, kinds, offsets, rng):
+        # Выбираем случайный тип из тех, для которых в предложении есть кандидаты, и случайного кандидата
+        available = [kind for kind in kinds if offsets[kind][number] < offsets[kind][number + 1]]
+        if not available:
+            return None
+        kind = rng.choice(available)
+        candidate = rng.randrange(offsets[kind][number], offsets[kind][number + 1])
+        return self._build(number, kind, candidate, rng)
+
+    def sample(self, rng=None, kinds=None):
+        """
+        Метод для составления нового случайного набора упражнений по индексу.
 
-        # Создаем объект Translator
-        translator = Translator()
+        Аргументы:
+        rng - генератор случайных чисел (по умолчанию модуль random).
+        kinds - список допустимых типов упражнений (по умолчанию все типы).
 
-        # Получаем список предложений из датафрейма
-        sentences = df['sentence'].tolist()
+        Возвращает:
+        Список записей Exercise той же длины, что и список предложений
+        (None для предложений без подходящих кандидатов).
+        """
+        rng = rng if rng is not None else random
+        kinds = [kind for kind in self.KINDS if kind in kinds] if kinds else list(self.KINDS)
 
-        for sentence in sentences:
-            # Удаляем знаки препинания из предложения
-            sentence = sentence.translate(str.maketrans('', '', string.punctuation))
+        # Границы кандидатов переводим в списки один раз: обращение к элементам списка быстрее
+        offsets = {kind: self.offsets[kind].tolist() for kind in kinds}
 
-            # Разбиваем предложение на слова
-            words = sentence.split()
+        with metrics.timer('candidates.sample'):
+            return [self._sample(number, kinds, offsets, rng) for number in range(len(self.sentences))]
 
-            for word in words:
+    def variant(self, number, rng=None, kinds=None):
+        """
+        Метод для составления другого упражнения по одному предложению (например, по кнопке "другое упражнение").
 
-                # Определяем длину слова
-                word_length = len(word)
+        Аргументы:
+        number - номер предложения.
+        rng - генератор случайных чисел (по умолчанию модуль random).
+        kinds - список допустимых типов упражнений (по умолчанию все типы).
 
-                # Если длина слова больше или равна минимальной
-                if word_length >= min_word_length:
+        Возвращает:
+        Запись Exercise или None, если в предложении нет подходящих кандидатов.
+        """
+        rng = rng if rng is not None else random
+        kinds = [kind for kind in self.KINDS if kind in kinds] if kinds else list(self.KINDS)
+        return self._sample(number, kinds, self.offsets, rng)
 
-                    # Проверяем, есть ли уже такое слово в множестве
-                    if word not in unique_words:
 
-                        # Добавляем слово в множество
-                        unique_words.add(word)
+class GenerationClient:
+    def __init__(self, url, timeout=300):
+        """
+        Конструктор класса GenerationClient - клиента локального сервиса генерации (generation_service.py).
 
-                        # Получаем перевод слова
-                        translation = translator.translate(word, src='en', dest='ru').text
+        Аргументы:
+        url - адрес сервиса, например http://127.0.0.1:8765.
+        timeout - максимальное время обработки одного текста в секундах.
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
 
-                        # Получаем транскрипцию слова
-                        transcription = self.get_transcription(word)
+    def stream(self, text, min_word_length=6, max_entries=None):
+        """
+        Метод для отправки текста в сервис и получения результатов по мере готовности.
 
-                        # Добавляем данные в список
-                        data.append((word.capitalize(), transcription, translation.capitalize()))
+        Аргументы:
+        text - текст.
+        min_word_length - минимальная длина слова для словаря.
+        max_entries - максимальное количество слов в словаре.
 
-        # Создаем датафрейм из списка данных
-        result_df = pd.DataFrame(data, columns=['Word', 'Transcription', 'Translation'])
-        result_df = result_df.dropna()
-        result_df = result_df.reset_index(drop=True)
+        Возвращает:
+        Итератор по сообщениям сервиса: {'exercises': [...]} для каждой готовой части упражнений,
+        {'exercises_done': True} и {'dictionary': [...]}.
+        """
+        payload = {'text': text, 'min_word_length': min_word_length, 'max_entries': max_entries,
+                   'timeout': self.timeout}
 
-        return result_df
+        # Ответ читается построчно: каждая строка - отдельное сообщение в JSON
+        with self.session.post(f'{self.url}/generate', json=payload, stream=True,
+                               timeout=(10, self.timeout)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if 'error' in message:
+                    raise RuntimeError(f"Ошибка сервиса генерации: {message['error']}")
+                yield message
 
 
-class ExerciseGenerator:
-    def generate_translate_exercise(self, row):
+class ExercisePipeline:
+    def __init__(self, text, api_key, translator=None, dictionary_creator=None, exercise_generator=None,
+                 chunk_size=32, min_word_length=6, n_workers=1, seed=None, store=None, max_entries=None,
+                 client=None, max_chunk_chars=1000000, queue_size=4, fingerprint=None):
         """
-        Функция для генерации упражнения на перевод слова.
-    
+        Конструктор класса ExercisePipeline - фоновой генерации упражнений и словаря по тексту,
+        при которой готовые упражнения доступны сразу, не дожидаясь обработки всего текста.
+
+        Текст читается и разбивается на предложения одним потоком по частям, части предложений
+        передаются генерации упражнений, а слова для словаря извлекаются из тех же разобранных
+        предложений и передаются составлению словаря. Этапы связаны очередями ограниченного размера,
+        поэтому объем памяти не зависит от размера текста (кроме самих результатов).
+
         Аргументы:
-        row - строка датафрейма, содержащая предложение и столбцы для упражнений.
-    
+        text - текст для обработки: строка или файловый объект (см. TextToDataFrame).
+        api_key - API-ключ для доступа к сервису Yandex Dictionary.
+        translator - объект CachedTranslator, общий для словаря и упражнений (по умолчанию создается новый).
+        dictionary_creator - объект DictionaryCreator (по умолчанию создается новый).
+        exercise_generator - объект ExerciseGenerator (по умолчанию создается новый).
+        chunk_size - количество предложений, которые обрабатываются вместе.
+        min_word_length - минимальная длина слова для словаря.
+        n_workers - количество процессов для генерации упражнений (если генератор создается здесь).
+        seed - начальное значение для генерации упражнений (если генератор создается здесь).
+        store - объект ResultStore: если результат для этого текста уже сохранен, он берется
+        из хранилища, иначе обрабатываются только новые и измененные предложения,
+        а результат сохраняется туда после генерации.
+        max_entries - максимальное количество слов в словаре (None - без ограничения).
+        client - объект GenerationClient: если он задан, упражнения и словарь составляет
+        локальный сервис генерации, а модели в этом процессе не загружаются.
+        max_chunk_chars - размер части текста, которая читается за один раз.
+        queue_size - количество частей предложений в очереди к каждому этапу.
+        fingerprint - хэш SHA-256 содержимого файла, если он уже известен (см. file_fingerprint):
+        по нему ищется готовый результат для файла, иначе хэш вычисляется при запуске.
+        """
+        # Для файла результат целиком ищется по хэшу его содержимого
+        self.source = text
+        self.text = normalize_text(text) if isinstance(text, str) else None
+        self.fingerprint = fingerprint
+        self.max_chunk_chars = max_chunk_chars
+        self.queue_size = queue_size
+        self.store = store
+        self.client = client
+        self.chunk_size = chunk_size
+        self.min_word_length = min_word_length
+        self.max_entries = max_entries
+
+        if client is None:
+            translator = translator if translator is not None else CachedTranslator()
+            self.dictionary_creator = (dictionary_creator if dictionary_creator is not None
+                                       else DictionaryCreator(api_key, translator=translator))
+            self.exercise_generator = (exercise_generator if exercise_generator is not None
+                                       else ExerciseGenerator(translator=translator, n_workers=n_workers, seed=seed))
+        else:
+            self.dictionary_creator = dictionary_creator
+            self.exercise_generator = exercise_generator
+
+        # Пул процессов созданного здесь генератора останавливается после генерации
+        self._owns_generator = exercise_generator is None and client is None
+
+        # Готовые упражнения (список только пополняется) и словарь (появляется, когда готов)
+        self.exercises = []
+        self.dictionary_df = None
+        self.error = None
+
+        # Время и счетчики только этой генерации (они также добавляются к общим значениям процесса)
+        self.metrics = Metrics()
+
+        # Время от запуска до первого упражнения, до всех упражнений, до словаря и общее время
+        self.timings = {'first_exercise': None, 'exercises': None, 'dictionary': None, 'total': None}
+
+        # Последний снимок упражнений в виде ExerciseStore
+        self._exercise_store = ExerciseStore([])
+
+        self._condition = threading.Condition()
+        self._started_at = None
+        self._threads = []
+        self.key = None
+
+    def start(self):
+        """
+        Метод для запуска генерации упражнений и словаря в фоновых потоках.
+
         Возвращает:
-        Обновленную строку с информацией об упражнении на перевод слова.
+        Сам объект ExercisePipeline.
         """
-        # Получаем предложение
-        sentence = row['sentence']
-    
-        # Разбиваем предложение на токены с помощью spacy
-        doc = nlp(sentence)
-    
-        # Выбираем токены, которые являются существительными или прилагательными
-        tokens = [token for token in doc if token.pos_ in ['NOUN', 'ADJ']]
-    
-        # Если есть подходящие токены
-        if len(tokens) > 0:
-            # Выбираем случайный токен
-            token = random.choice(tokens)
-        
-            # Получаем текст токена
-            token_text = token.text
-        
-            # Выделяем выбранное слово жирным шрифтом
-            exercise_sentence = sentence.replace(token_text, f'**{token_text}**')
-        
-            # Проверяем, начинается ли слово с заглавной буквы
-            is_title = token_text.istitle()
-        
-            # Преобразуем слово в нижний регистр для поиска похожих слов в модели word2vec
-            token_text = token_text.lower()
-        
-            # Находим перевод выбранного слова
-            translator = Translator()
-            translation = translator.translate(token_text, src='en', dest='ru').text
+        self._started_at = time.perf_counter()
+        with metrics.collect(self.metrics):
+            return self._start()
+
+    def _start(self):
+        # Упражнения и словарь составляет сервис генерации
+        if self.client is not None:
+            self._threads = [threading.Thread(target=metrics.bind(self._run_service), daemon=True)]
+            self._threads[0].start()
+            return self
+
+        # Если результат уже сохранен, генерация не нужна
+        if self.store is not None:
+            params = {'min_word_length': self.min_word_length, 'max_entries': self.max_entries,
+                      'seed': self.exercise_generator.seed}
+            if self.text is not None:
+                self.key = self.store.make_key(self.text, **params)
+            else:
+                if self.fingerprint is None:
+                    self.fingerprint = file_fingerprint(self.source, self.max_chunk_chars)
+                self.key = self.store.make_file_key(self.fingerprint, **params)
+            stored = self.store.get(self.key)
+            if stored is not None:
+                self.exercises, self.dictionary_df = stored
+                self.timings['first_exercise'] = self._elapsed()
+                self._finish('exercises')
+                self._finish('dictionary')
+                self._release_source()
+                if self._owns_generator:
+                    self.exercise_generator.close()
+                return self
+
+        # Очередь частей предложений к генерации упражнений и очередь слов этих частей к составлению словаря
+        exercises_queue = queue.Queue(self.queue_size)
+        dictionary_queue = queue.Queue(self.queue_size)
+
+        # Значения всех этапов собираются и в общие значения процесса, и в значения этой генерации
+        self._threads = [threading.Thread(target=metrics.bind(self._run_reader), args=(exercises_queue,),
+                                          daemon=True),
+                         threading.Thread(target=metrics.bind(self._run_exercises),
+                                          args=(exercises_queue, dictionary_queue), daemon=True),
+                         threading.Thread(target=metrics.bind(self._run_dictionary), args=(dictionary_queue,),
+                                          daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+        return self
+
+    def _elapsed(self):
+        return time.perf_counter() - self._started_at
+
+    def _finish(self, stage):
+        # Отмечаем окончание этапа и будим ожидающие потоки
+        with self._condition:
+            self.timings[stage] = self._elapsed()
+            finished = self.timings['exercises'] is not None and self.timings['dictionary'] is not None
+            if finished:
+                self.timings['total'] = max(self.timings['exercises'], self.timings['dictionary'])
+            self._condition.notify_all()
+
+        # Сохраняем новый результат в хранилище
+        if finished and self.error is None and self.key is not None and self.client is None and self._threads:
+            self.store.put(self.key, self.exercises, self.dictionary_df)
+
+    def _fail(self, error):
+        # Сохраняем первую ошибку и останавливаем ожидание
+        with self._condition:
+            if self.error is None:
+                self.error = error
+            self._condition.notify_all()
 
+    def _put(self, chunk_queue, chunk):
+        # Ждем места в очереди, пока другие этапы работают без ошибок
+        while self.error is None:
             try:
-                # Получаем ближайшие слова из модели word2vec
-                pos_map = {'NOUN': 'NOUN', 'ADJ': 'ADJ'}
-                key = f"{translation}_{pos_map[token.pos_]}"
-                similar_words = modelru.most_similar(key, topn=3)
-            
-                # Выбираем два ближайших слова из списка ближайших слов и удаляем приписки _NOUN и _ADJ
-                options = [word.split('_')[0] for word, similarity in similar_words 
-                           if word.endswith(pos_map[token.pos_]) and '::' not in word]
-
-                # Если слово начиналось с заглавной буквы, преобразуем перевод в заглавный
-                if is_title:
-                    options = [option.title() for option in options]
-                    translation = translation.title()
-                
-                # Добавляем перевод верного ответа в список вариантов
-                options.append(translation)
-            
-                # Удаляем дубликаты из списка вариантов
-                options = list(set(options))
-            
-                # Перемешиваем список вариантов
-                random.shuffle(options)
-            
-                # Обновляем строку с информацией об упражнении
-                row['exercise_type'] = 'Выберите перевод слова'
-                row['exercise_sentence'] = exercise_sentence
-                row['options'] = options
-                row['correct_answer'] = translation
-        
-            except KeyError:
-                # Если нет подходящих слов в модели, заполняем все поля None
-                row['exercise_type'] = None
-                row['exercise_sentence'] = None
-                row['options'] = None
-                row['correct_answer'] = None
-    
-        else:
-            # Если нет подходящих токенов, заполняем все поля None
-            row['exercise_type'] = None
-            row['exercise_sentence'] = None
-            row['options'] = None
-            row['correct_answer'] = None
-    
-        return row
+                chunk_queue.put(chunk, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _iter_queue(self, chunk_queue):
+        # Получаем части предложений из очереди до признака конца текста
+        while self.error is None:
+            try:
+                chunk = chunk_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+        # Другой этап завершился с ошибкой
+        raise self.error
 
+    def _run_reader(self, chunk_queue):
+        try:
+            text = self.text if self.text is not None else self.source
+            sentences = TextToDataFrame(text, self.max_chunk_chars).iter_sentences()
+            while True:
+                # Передаем каждую часть предложений генерации упражнений
+                chunk = list(itertools.islice(sentences, self.chunk_size))
+                if not chunk:
+                    break
+                if not self._put(chunk_queue, chunk):
+                    return
 
-    def generate_verb_exercise(self, row):
+            # Сообщаем о конце текста
+            self._put(chunk_queue, None)
+        except Exception as error:
+            self._fail(error)
+        finally:
+            self._release_source()
+
+    def _release_source(self):
+        # Текст прочитан: не держим в памяти его (и загруженный файл) все время, пока хранится результат
+        self.source = None
+        self.text = None
+
+    def _run_exercises(self, chunk_queue, words_queue):
+        try:
+            def send_words(chunk, docs):
+                # Слова для словаря извлекаются из уже разобранных для упражнений предложений
+                self._put(words_queue, self.dictionary_creator.extract_words(chunk, self.min_word_length,
+                                                                             self.store, docs=docs))
+
+            sentences = (sentence for chunk in self._iter_queue(chunk_queue) for sentence in chunk)
+            for exercise in self.exercise_generator.iter_exercises(sentences, chunk_size=self.chunk_size,
+                                                                   store=self.store, on_chunk=send_words):
+                with self._condition:
+                    self.exercises.append(exercise)
+                    if self.timings['first_exercise'] is None:
+                        self.timings['first_exercise'] = self._elapsed()
+                    self._condition.notify_all()
+            self._put(words_queue, None)
+            self._finish('exercises')
+        except Exception as error:
+            self._fail(error)
+        finally:
+            if self._owns_generator:
+                self.exercise_generator.close()
+
+    def _run_dictionary(self, words_queue):
+        try:
+            # Слова приходят по частям по мере генерации упражнений, в памяти остаются только их счетчики
+            creator = self.dictionary_creator
+            sentence_words = (words for chunk_words in self._iter_queue(words_queue) for words in chunk_words)
+            words = creator.rank_words(sentence_words, self.max_entries)
+            self.dictionary_df = asyncio.run(creator.lookup_dictionary_df_async(words, store=self.store))
+            self._finish('dictionary')
+        except Exception as error:
+            self._fail(error)
+
+    def _run_service(self):
+        try:
+            text = self.text
+            if text is None:
+                text = normalize_text(''.join(TextToDataFrame(self.source).iter_chunks()))
+            self._release_source()
+            for message in self.client.stream(text, self.min_word_length, self.max_entries):
+                if 'exercises' in message:
+                    with self._condition:
+                        self.exercises.extend(Exercise(*record) for record in message['exercises'])
+                        if self.timings['first_exercise'] is None and self.exercises:
+                            self.timings['first_exercise'] = self._elapsed()
+                        self._condition.notify_all()
+                elif 'exercises_done' in message:
+                    self._finish('exercises')
+                elif 'dictionary' in message:
+                    self.dictionary_df = pd.DataFrame(message['dictionary'],
+                                                      columns=['Word', 'Transcription', 'Translation'])
+                    self._finish('dictionary')
+
+            # Ответ, оборвавшийся до словаря, считается ошибкой, иначе ожидание результата не закончится
+            if self.timings['dictionary'] is None:
+                raise RuntimeError('Сервис генерации завершил ответ без словаря')
+        except Exception as error:
+            self._fail(error)
+
+    @property
+    def exercises_done(self):
         """
-        Функция для генерации упражнения с глаголами.
-    
+        Признак того, что все упражнения составлены.
+        """
+        return self.timings['exercises'] is not None
+
+    @property
+    def done(self):
+        """
+        Признак того, что составлены и упражнения, и словарь.
+        """
+        return self.timings['total'] is not None
+
+    def wait_for(self, count, timeout=None):
+        """
+        Метод для ожидания нужного количества упражнений.
+
         Аргументы:
-        row - строка датафрейма, содержащая предложение и столбцы для упражнений.
-    
+        count - количество упражнений.
+        timeout - максимальное время ожидания в секундах (None - без ограничения).
+
         Возвращает:
-        Обновленную строку с информацией об упражнении с глаголами.
+        Количество готовых упражнений (может быть меньше count, если упражнений в тексте меньше
+        или истекло время ожидания).
         """
-        # Получаем предложение
-        sentence = row['sentence']
-    
-        # Разбиваем предложение на токены с помощью spacy
-        doc = nlp(sentence)
-    
-        # Выбираем токены, которые являются глаголами
-        tokens = [token for token in doc if token.pos_ == 'VERB']
-    
-        # Если есть подходящие токены
-        if len(tokens) > 0:
-            # Выбираем случайный токен
-            token = random.choice(tokens)
-        
-            # Получаем текст токена
-            token_text = token.text
-        
-            # Заменяем токен на пропуск в предложении
-            start = token.idx
-            end = start + len(token)
-            exercise_sentence = sentence[:start] + '___' + sentence[end:]
-        
-            # Получаем верный ответ
-            correct_answer = token_text
-        
-            # Проверяем, начинается ли слово с заглавной буквы
-            is_title = token_text.istitle()
-        
-            # Преобразуем слово в нижний регистр для получения других форм глагола
-            token_text = token_text.lower()
-        
-            # Получаем другие формы глагола
-            word_forms = get_word_forms(token_text)
-        
-            # Получаем список форм глагола
-            verb_forms = list(word_forms['v'])
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.exercises) >= count or self.exercises_done
+                                     or self.error is not None, timeout)
+            if self.error is not None:
+                raise self.error
+            return len(self.exercises)
 
-            # Используем все формы глагола из списка
-            options = verb_forms
-        
-            # Если слово начиналось с заглавной буквы, преобразуем варианты в заглавные
-            if is_title:
-                options = [option.title() for option in options]
-        
-            # Перемешиваем список вариантов
-            random.shuffle(options)
-        
-            # Обновляем строку с информацией об упражнении
-            row['exercise_type'] = 'Выберите форму глагола'
-            row['exercise_sentence'] = exercise_sentence
-            row['options'] = options
-            row['correct_answer'] = correct_answer
-    
-        else:
-            # Если нет подходящих токенов, заполняем все поля None
-            row['exercise_type'] = None
-            row['exercise_sentence'] = None
-            row['options'] = None
-            row['correct_answer'] = None
-    
-        return row
-    
-    def generate_article_exercise(self, row):
+    def exercises_df(self):
         """
-        Функция для генерации упражнения на употребление артиклей.
-    
-        Аргументы:
-        row - строка датафрейма, содержащая предложение и столбцы для упражнений.
-    
+        Метод для получения уже готовых упражнений.
+
         Возвращает:
-        Обновленную строку с информацией об упражнении на употребление артиклей.
+        Датафрейм с упражнениями, составленными к текущему моменту.
         """
-        # Получаем предложение
-        sentence = row['sentence']
-    
-        # Разбиваем предложение на токены с помощью spacy
-        doc = nlp(sentence)
-    
-        # Выбираем токены, которые являются артиклями
-        tokens = [token for token in doc if token.pos_ == 'DET' and token.text.lower() in ['a', 'an', 'the']]
-    
-        # Если есть подходящие токены
-        if len(tokens) > 0:
-            # Выбираем случайный токен
-            token = random.choice(tokens)
-        
-            # Получаем текст токена
-            token_text = token.text
-        
-            # Проверяем, начинается ли слово с заглавной буквы
-            is_title = token_text.istitle()
-        
-            # Заменяем токен на пропуск в предложении
-            start = token.idx
-            end = start + len(token)
-            exercise_sentence = sentence[:start] + '___' + sentence[end:]
-        
-            # Получаем верный ответ
-            correct_answer = token_text
-        
-            # Создаем список вариантов ответа
-            options = ['a', 'an', 'the']
-        
-            # Если слово начиналось с заглавной буквы, преобразуем варианты в заглавные
-            if is_title:
-                options = [option.title() for option in options]
-        
-            # Обновляем строку с информацией об упражнении
-            row['exercise_type'] = 'Выберите артикль'
-            row['exercise_sentence'] = exercise_sentence
-            row['options'] = options
-            row['correct_answer'] = correct_answer
-    
-        else:
-            # Если нет подходящих токенов, заполняем все поля None
-            row['exercise_type'] = None
-            row['exercise_sentence'] = None
-            row['options'] = None
-            row['correct_answer'] = None
-    
-        return row
-    
-    def generate_random_exercises(self, df):
+        with self._condition:
+            exercises = list(self.exercises)
+
+        return exercises_to_df(exercises)
+
+    def exercise_store(self):
         """
-        Метод для генерации случайных упражнений.
-        
-        Аргументы:
-        df - датафрейм, содержащий предложения и столбцы для упражнений.
-        
+        Метод для получения уже готовых упражнений в виде неизменяемого набора с индексами по типам.
+        Новый набор собирается, только если с прошлого вызова появились новые упражнения, и дополняет
+        прошлый набор только этими упражнениями.
+
         Возвращает:
-        Обновленный датафрейм с информацией об упражнениях.
+        Объект ExerciseStore.
         """
-        for i, row in df.iterrows():
-            # Выбираем случайную функцию генерации упражнений
-            exercise_function = random.choice([self.generate_translate_exercise,
-                                               self.generate_verb_exercise,
-                                               self.generate_article_exercise])
+        with self._condition:
+            if len(self._exercise_store) != len(self.exercises):
+                self._exercise_store = ExerciseStore(self.exercises[len(self._exercise_store):],
+                                                     base=self._exercise_store)
+            return self._exercise_store
 
-            # Применяем функцию генерации упражнений к строке
-            row = exercise_function(row)
+    def result(self, timeout=None):
+        """
+        Метод для ожидания окончания генерации.
 
-            # Обновляем строку в датафрейме
-            df.iloc[i] = row
+        Аргументы:
+        timeout - максимальное время ожидания в секундах (None - без ограничения).
 
-        # Удаляем пустые строки и сбрасываем индексы
-        df = df.dropna()
-        df = df.reset_index(drop=True)
+        Возвращает:
+        Кортеж из датафрейма с упражнениями и датафрейма со словарем.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.done or self.error is not None, timeout)
+            if self.error is not None:
+                raise self.error
 
-        return df
+        return self.exercises_df(), self.dictionary_df
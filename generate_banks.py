@@ -0,0 +1,204 @@
+# Импортируем необходимые библиотеки
+import argparse
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Импортируем классы из файла exercise_generator
+from exercise_generator import (CachedTranslator, DictionaryCreator, ExerciseGenerator, ExercisePack,
+                                ExercisePipeline, ResultStore, metrics, warmup)
+
+# Расширения выходных файлов с упражнениями и со словарем для каждого формата
+# (в формате pack упражнения сохраняются в каталог ExercisePack, а словарь - в JSONL)
+EXTENSIONS = {'jsonl': ('.jsonl', '.jsonl'), 'parquet': ('.parquet', '.parquet'), 'pack': ('.pack', '.jsonl')}
+
+
+def find_texts(input_dir):
+    """
+    Функция для поиска текстовых файлов в каталоге и его подкаталогах.
+
+    Аргументы:
+    input_dir - каталог с текстами.
+
+    Возвращает:
+    Отсортированный список путей к файлам .txt относительно input_dir.
+    """
+    paths = []
+    for root, dirs, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith('.txt'):
+                paths.append(os.path.relpath(os.path.join(root, name), input_dir))
+
+    return sorted(paths)
+
+
+def output_paths(output_dir, relative_path, output_format):
+    """
+    Функция для получения путей к файлам с упражнениями и словарем для одного текста.
+
+    Аргументы:
+    output_dir - каталог для результатов.
+    relative_path - путь к тексту относительно входного каталога.
+    output_format - формат файлов ('jsonl', 'parquet' или 'pack').
+
+    Возвращает:
+    Кортеж из пути к файлу с упражнениями и пути к файлу со словарем.
+    """
+    base = os.path.join(output_dir, os.path.splitext(relative_path)[0])
+    exercises_extension, dictionary_extension = EXTENSIONS[output_format]
+    return base + '.exercises' + exercises_extension, base + '.dictionary' + dictionary_extension
+
+
+def write_df(df, path, output_format):
+    """
+    Функция для сохранения датафрейма: файл сначала записывается под временным именем,
+    поэтому после прерывания не остается недописанных файлов.
+
+    Аргументы:
+    df - датафрейм.
+    path - путь к файлу.
+    output_format - формат файла ('jsonl', 'parquet' или 'pack').
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    # Пакет упражнений сам записывается через временный каталог
+    if output_format == 'pack':
+        ExercisePack.from_df(df).save(path)
+        return
+
+    tmp_path = path + '.tmp'
+    if output_format == 'parquet':
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_json(tmp_path, orient='records', lines=True, force_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def process_file(path, exercises_path, dictionary_path, args, generator, dictionary_creator, store):
+    """
+    Функция для генерации упражнений и словаря по одному тексту.
+
+    Аргументы:
+    path - путь к тексту.
+    exercises_path - путь к файлу с упражнениями.
+    dictionary_path - путь к файлу со словарем.
+    args - аргументы командной строки.
+    generator - общий объект ExerciseGenerator.
+    dictionary_creator - общий объект DictionaryCreator.
+    store - объект ResultStore или None.
+
+    Возвращает:
+    Словарь со статистикой по тексту.
+    """
+    start = time.perf_counter()
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+
+    # Упражнения и словарь составляются одновременно, модели и пул процессов общие для всех текстов
+    pipeline = ExercisePipeline(text, args.api_key, dictionary_creator=dictionary_creator,
+                                exercise_generator=generator, chunk_size=args.chunk_size,
+                                min_word_length=args.min_word_length, max_entries=args.max_entries,
+                                store=store).start()
+    exercises_df, dictionary_df = pipeline.result()
+
+    # Словарь записывается первым: текст считается обработанным, когда есть оба файла
+    write_df(dictionary_df, dictionary_path, 'parquet' if args.format == 'parquet' else 'jsonl')
+    write_df(exercises_df, exercises_path, args.format)
+
+    return {'characters': len(text), 'exercises': len(exercises_df), 'words': len(dictionary_df),
+            'seconds': time.perf_counter() - start}
+
+
+def main():
+    """
+    Функция для пакетной генерации банков упражнений по каталогу с текстами.
+    """
+    parser = argparse.ArgumentParser(description="Пакетная генерация упражнений и словарей для каталога текстов")
+    parser.add_argument("input_dir", help="каталог с файлами .txt (включая подкаталоги)")
+    parser.add_argument("output_dir", help="каталог для сохранения результатов")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="jsonl", help="формат выходных файлов")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"),
+                        help="API-ключ Yandex Dictionary (по умолчанию переменная окружения API_KEY)")
+    parser.add_argument("--jobs", type=int, default=4, help="количество текстов, которые обрабатываются одновременно")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="количество процессов для генерации упражнений")
+    parser.add_argument("--chunk-size", type=int, default=256, help="количество предложений в одной части")
+    parser.add_argument("--min-word-length", type=int, default=6, help="минимальная длина слова для словаря")
+    parser.add_argument("--max-entries", type=int, help="максимальное количество слов в словаре")
+    parser.add_argument("--seed", type=int, default=0, help="начальное значение генерации упражнений")
+    parser.add_argument("--store", action="store_true",
+                        help="использовать хранилище готовых результатов (results.sqlite3 в каталоге кэша)")
+    parser.add_argument("--force", action="store_true", help="обработать заново уже обработанные тексты")
+    parser.add_argument("--metrics", help="файл для сохранения времени этапов и счетчиков в JSON")
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("нужен API-ключ: --api-key или переменная окружения API_KEY")
+
+    # Для формата parquet нужна одна из библиотек, которые поддерживает pandas
+    if args.format == 'parquet' and not any(importlib.util.find_spec(name) for name in ('pyarrow', 'fastparquet')):
+        parser.error("для формата parquet нужно установить pyarrow или fastparquet")
+
+    # Пропускаем тексты, для которых уже есть оба выходных файла
+    tasks = []
+    skipped = 0
+    for relative_path in find_texts(args.input_dir):
+        exercises_path, dictionary_path = output_paths(args.output_dir, relative_path, args.format)
+        if not args.force and os.path.exists(exercises_path) and os.path.exists(dictionary_path):
+            skipped += 1
+            continue
+        tasks.append((os.path.join(args.input_dir, relative_path), exercises_path, dictionary_path))
+
+    print(f"Текстов для обработки: {len(tasks)}, пропущено уже обработанных: {skipped}")
+    if not tasks:
+        return
+
+    # Модели загружаются один раз и используются всеми текстами
+    start = time.perf_counter()
+    warmup()
+    translator = CachedTranslator()
+    dictionary_creator = DictionaryCreator(args.api_key, translator=translator)
+    store = ResultStore() if args.store else None
+    print(f"Модели загружены за {time.perf_counter() - start:.1f} с")
+
+    totals = {'characters': 0, 'exercises': 0, 'words': 0}
+    failed = []
+    start = time.perf_counter()
+    with ExerciseGenerator(translator=translator, n_workers=args.workers, seed=args.seed) as generator:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = {executor.submit(process_file, *task, args, generator, dictionary_creator, store): task[0]
+                       for task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as error:
+                    failed.append(path)
+                    print(f"[{done}/{len(tasks)}] {path}: ошибка {error!r}")
+                    continue
+
+                for key in totals:
+                    totals[key] += result[key]
+                print(f"[{done}/{len(tasks)}] {path}: {result['exercises']} упражнений, "
+                      f"{result['words']} слов за {result['seconds']:.1f} с")
+
+    elapsed = time.perf_counter() - start
+    processed = len(tasks) - len(failed)
+    print(f"Обработано текстов: {processed}, с ошибками: {len(failed)}, за {elapsed:.1f} с")
+    print(f"Скорость: {processed / elapsed:.2f} текстов/с, {totals['exercises'] / elapsed:.1f} упражнений/с, "
+          f"{totals['characters'] / elapsed / 1000:.1f} тыс. символов/с")
+
+    # Сохраняем время этапов и счетчики
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as file:
+            json.dump(metrics.snapshot(), file, ensure_ascii=False, indent=2)
+
+    # Код возврата 1, если какие-то тексты обработать не удалось
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# Импортируем необходимые библиотеки
+import argparse
+import collections
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, CancelledError, ThreadPoolExecutor, TimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Импортируем классы из файла exercise_generator
+from exercise_generator import (CachedTranslator, DictionaryCreator, ExerciseGenerator, SentenceParser,
+                                TextToDataFrame, metrics, models, normalize_text, warmup)
+
+
+class MicroBatcher:
+    def __init__(self, generator, dictionary_creator, max_batch_sentences=512, max_wait=0.02,
+                 max_queue_sentences=20000):
+        """
+        Конструктор класса MicroBatcher - очереди, которая объединяет предложения из одновременных
+        запросов в общие пакеты: один вызов nlp.pipe, один пакетный перевод и один пакетный поиск
+        похожих слов на все предложения пакета.
+
+        Аргументы:
+        generator - объект ExerciseGenerator.
+        dictionary_creator - объект DictionaryCreator (из разобранных предложений берутся слова для словаря).
+        max_batch_sentences - максимальное количество предложений в пакете.
+        max_wait - время в секундах, в течение которого к пакету добавляются новые части.
+        max_queue_sentences - максимальное количество предложений в очереди: запросы сверх него отклоняются.
+        """
+        self.generator = generator
+        self.dictionary_creator = dictionary_creator
+        self.max_batch_sentences = max_batch_sentences
+        self.max_wait = max_wait
+        self.max_queue_sentences = max_queue_sentences
+
+        # Очередь частей: кортежи из предложений, минимальной длины слова и объекта Future
+        self._queue = collections.deque()
+        self._queued_sentences = 0
+        self._peak_queued_sentences = 0
+        self._condition = threading.Condition()
+        self._rng = random.Random()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit_many(self, chunks, min_word_length):
+        """
+        Метод для постановки частей одного запроса в очередь.
+
+        Аргументы:
+        chunks - список списков предложений.
+        min_word_length - минимальная длина слова для словаря.
+
+        Возвращает:
+        Список объектов Future (результат каждого - кортеж из списка записей Exercise
+        и списка слов для словаря по предложениям) или None, если очередь переполнена.
+        """
+        count = sum(len(chunk) for chunk in chunks)
+        with self._condition:
+            # Отклоняем запрос целиком, если он не помещается в очередь
+            # (в пустую очередь принимается запрос любого размера)
+            if self._queued_sentences and self._queued_sentences + count > self.max_queue_sentences:
+                return None
+
+            futures = []
+            for chunk in chunks:
+                future = Future()
+                self._queue.append((chunk, min_word_length, future))
+                futures.append(future)
+
+            self._queued_sentences += count
+            self._peak_queued_sentences = max(self._peak_queued_sentences, self._queued_sentences)
+            self._condition.notify_all()
+
+        return futures
+
+    def status(self):
+        """
+        Метод для получения состояния очереди.
+
+        Возвращает:
+        Словарь с количеством частей и предложений в очереди и максимальным количеством предложений
+        в очереди с момента запуска.
+        """
+        with self._condition:
+            return {'queued_chunks': len(self._queue), 'queued_sentences': self._queued_sentences,
+                    'peak_queued_sentences': self._peak_queued_sentences,
+                    'max_queue_sentences': self.max_queue_sentences}
+
+    def _next_batch(self):
+        # Ждем первую часть, затем в течение max_wait добавляем к пакету следующие
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue)
+            batch = [self._queue.popleft()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_sentences:
+                if not self._queue:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        break
+                    continue
+                if size + len(self._queue[0][0]) > self.max_batch_sentences:
+                    break
+                batch.append(self._queue.popleft())
+                size += len(batch[-1][0])
+
+            self._queued_sentences -= sum(len(chunk) for chunk, min_word_length, future in batch)
+
+        # Части, запросы которых уже завершились по времени ожидания, пропускаем
+        return [job for job in batch if job[2].set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            # Ошибка одного пакета передается его запросам, а поток продолжает обрабатывать следующие пакеты
+            try:
+                self._process(batch)
+            except Exception as error:
+                for chunk, min_word_length, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    def _process(self, batch):
+        sentences = [sentence for chunk, min_word_length, future in batch for sentence in chunk]
+        metrics.incr('service.batches')
+        metrics.incr('service.batch_sentences', len(sentences))
+
+        # Разбираем все предложения пакета одним вызовом nlp.pipe и составляем упражнения
+        # (переводы и похожие слова ищутся одним пакетом на весь пакет предложений)
+        with metrics.timer('service.batch'):
+            docs = self.generator.parser.parse_sentences(sentences)
+            exercises = self.generator.generate_exercises(sentences, docs=docs, rng=self._rng)
+
+        # Раздаем результаты частям в исходном порядке
+        start = 0
+        for chunk, min_word_length, future in batch:
+            end = start + len(chunk)
+            words = self.dictionary_creator.extract_words(chunk, min_word_length, docs=docs[start:end])
+            future.set_result((exercises[start:end], words))
+            start = end
+
+
+class GenerationService:
+    def __init__(self, batcher, dictionary_creator, chunk_size=64, max_requests=32, timeout=300):
+        """
+        Конструктор класса GenerationService - обработки запросов к сервису генерации.
+
+        Аргументы:
+        batcher - объект MicroBatcher.
+        dictionary_creator - объект DictionaryCreator для перевода и транскрипции слов.
+        chunk_size - количество предложений в одной части запроса.
+        max_requests - максимальное количество одновременно обрабатываемых запросов.
+        timeout - максимальное время обработки одного запроса в секундах.
+        """
+        self.batcher = batcher
+        self.dictionary_creator = dictionary_creator
+        self.chunk_size = chunk_size
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self._active_requests = 0
+        self._lock = threading.Lock()
+
+        # Словари составляются в отдельных потоках, чтобы ожидание ограничивалось временем запроса
+        self._dictionary_executor = ThreadPoolExecutor(max_workers=max_requests)
+
+    def status(self):
+        """
+        Метод для получения состояния сервиса.
+
+        Возвращает:
+        Словарь с состоянием очереди, количеством активных запросов, временем этапов и счетчиками.
+        """
+        with self._lock:
+            active_requests = self._active_requests
+        return {'queue': self.batcher.status(), 'active_requests': active_requests,
+                'max_requests': self.max_requests, 'models': models.status(), **metrics.snapshot()}
+
+    def admit(self):
+        """
+        Метод для проверки, можно ли принять еще один запрос.
+
+        Возвращает:
+        True, если запрос принят (после обработки нужно вызвать release).
+        """
+        with self._lock:
+            if self._active_requests >= self.max_requests:
+                return False
+            self._active_requests += 1
+            return True
+
+    def release(self):
+        """
+        Метод для освобождения места после обработки запроса.
+        """
+        with self._lock:
+            self._active_requests -= 1
+
+    def generate(self, request):
+        """
+        Метод для обработки одного текста.
+
+        Аргументы:
+        request - словарь с полями text, min_word_length, max_entries и timeout.
+
+        Возвращает:
+        Итератор по сообщениям для клиента (см. GenerationClient.stream) или None,
+        если очередь переполнена.
+        """
+        text = normalize_text(request['text'])
+        min_word_length = request.get('min_word_length') or 6
+        max_entries = request.get('max_entries')
+        timeout = min(request.get('timeout') or self.timeout, self.timeout)
+
+        # Делим предложения на части и ставим их в общую очередь
+        sentences = list(TextToDataFrame(text).iter_sentences())
+        chunks = [sentences[i:i + self.chunk_size] for i in range(0, len(sentences), self.chunk_size)]
+        futures = self.batcher.submit_many(chunks, min_word_length)
+        if futures is None:
+            return None
+
+        return self._messages(futures, max_entries, time.perf_counter() + timeout)
+
+    def _messages(self, futures, max_entries, deadline):
+        sentence_words = []
+        try:
+            # Отдаем упражнения каждой части, как только она готова
+            for future in futures:
+                exercises, words = future.result(timeout=max(deadline - time.perf_counter(), 0))
+                sentence_words.extend(words)
+                yield {'exercises': [exercise.to_tuple() for exercise in exercises if exercise is not None]}
+            yield {'exercises_done': True}
+
+            # Словарь составляется из слов всех частей запроса
+            dictionary = self._dictionary_executor.submit(self._dictionary, sentence_words, max_entries)
+            dictionary_df = dictionary.result(timeout=max(deadline - time.perf_counter(), 0))
+            yield {'dictionary': dictionary_df.values.tolist()}
+        except (TimeoutError, CancelledError):
+            metrics.incr('service.timeouts')
+            yield {'error': 'превышено время обработки запроса'}
+            return
+        except Exception as error:
+            yield {'error': repr(error)}
+            return
+        finally:
+            # Части, которые еще не начали обрабатываться, убираем из работы
+            for future in futures:
+                future.cancel()
+
+    def _dictionary(self, sentence_words, max_entries):
+        # Отбираем слова для словаря и получаем их переводы и транскрипции
+        words = self.dictionary_creator.rank_words(sentence_words, max_entries)
+        return self.dictionary_creator.lookup_dictionary_df(words)
+
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    # Объект GenerationService задается при запуске сервера
+    service = None
+
+    def _send_json(self, status, data, headers=()):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Проверка работоспособности и метрики (в том числе глубина очереди)
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send_json(200, self.service.status())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/generate':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        # Отклоняем запрос, если сервис уже обрабатывает максимальное количество запросов
+        if not self.service.admit():
+            metrics.incr('service.rejected')
+            self._send_json(503, {'error': 'сервис перегружен'}, [('Retry-After', '5')])
+            return
+
+        try:
+            metrics.incr('service.requests')
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            with metrics.timer('service.request'):
+                messages = self.service.generate(request)
+                if messages is None:
+                    metrics.incr('service.rejected')
+                    self._send_json(503, {'error': 'очередь переполнена'}, [('Retry-After', '5')])
+                    return
+
+                # Отправляем сообщения построчно по мере готовности, соединение закрывается в конце ответа
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.end_headers()
+                try:
+                    for message in messages:
+                        self.wfile.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+                        self.wfile.flush()
+                finally:
+                    # Если клиент отключился, оставшиеся части запроса убираются из очереди
+                    messages.close()
+        finally:
+            self.service.release()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    """
+    Функция для запуска локального сервиса генерации упражнений.
+    """
+    parser = argparse.ArgumentParser(description="Локальный сервис генерации упражнений и словарей")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес сервиса")
+    parser.add_argument("--port", type=int, default=8765, help="порт сервиса")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"),
+                        help="API-ключ Yandex Dictionary (по умолчанию переменная окружения API_KEY)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="количество предложений в одной части запроса")
+    parser.add_argument("--max-batch-sentences", type=int, default=512,
+                        help="максимальное количество предложений в общем пакете")
+    parser.add_argument("--max-wait-ms", type=float, default=20,
+                        help="время ожидания других запросов перед обработкой пакета в миллисекундах")
+    parser.add_argument("--max-queue-sentences", type=int, default=20000,
+                        help="максимальное количество предложений в очереди")
+    parser.add_argument("--max-requests", type=int, default=32,
+                        help="максимальное количество одновременно обрабатываемых запросов")
+    parser.add_argument("--timeout", type=float, default=300, help="максимальное время обработки запроса в секундах")
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("нужен API-ключ: --api-key или переменная окружения API_KEY")
+
+    # Модели загружаются один раз при запуске сервиса
+    start = time.perf_counter()
+    warmup()
+    translator = CachedTranslator()
+    sentence_parser = SentenceParser()
+    generator = ExerciseGenerator(parser=sentence_parser, translator=translator)
+    dictionary_creator = DictionaryCreator(args.api_key, translator=translator, parser=sentence_parser)
+    batcher = MicroBatcher(generator, dictionary_creator, args.max_batch_sentences, args.max_wait_ms / 1000,
+                           args.max_queue_sentences)
+    GenerationRequestHandler.service = GenerationService(batcher, dictionary_creator, args.chunk_size,
+                                                         args.max_requests, args.timeout)
+    print(f"Модели загружены за {time.perf_counter() - start:.1f} с")
+
+    server = ThreadingHTTPServer((args.host, args.port), GenerationRequestHandler)
+    server.daemon_threads = True
+    print(f"Сервис генерации запущен на http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
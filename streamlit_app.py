@@ -1,49 +1,216 @@
 # Импортируем необходимые библиотеки
 import streamlit as st
-from PIL import Image
 from urllib.request import urlopen
-from io import BytesIO
+import collections
+import statistics
+import time
+import hashlib
+import threading
 
 # Импортируем классы из файла exercise_generator
-from exercise_generator import TextToDataFrame, DictionaryCreator, ExerciseGenerator
+from exercise_generator import (CachedTranslator, ExerciseGenerator, ExercisePipeline, GenerationClient, ResultStore,
+                                metrics)
+
+# Запоминаем время начала перезапуска скрипта
+rerun_start = time.perf_counter()
+
+# Адрес изображения в шапке страницы
+HEADER_IMAGE_URL = "https://climbingthedissertationmountain.files.wordpress.com/2018/01/cropped-vladislav-klapin-316711.jpg"
 
 # Задаем ключ API для доступа к словарю
 api_key = st.secrets["API_KEY"]
 
-# Определяем функцию для загрузки данных из текста
-@st.cache_data
-def creating_a_dictionary_and_exercises(text):
+# Задаем количество процессов для генерации упражнений
+n_workers = int(st.secrets.get("N_WORKERS", 1))
+
+# Задаем максимальное количество слов в словаре (по умолчанию без ограничения)
+max_entries = st.secrets.get("MAX_DICTIONARY_ENTRIES")
+max_entries = int(max_entries) if max_entries is not None else None
+
+# Задаем максимальное количество общих объектов генерации и время их хранения без обращений в секундах
+max_pipelines = int(st.secrets.get("MAX_PIPELINES", 16))
+pipeline_ttl = float(st.secrets.get("PIPELINE_TTL", 3600))
+
+# Задаем адрес локального сервиса генерации (если он не задан, модели загружаются в процессе приложения)
+service_url = st.secrets.get("GENERATION_SERVICE_URL")
+
+# Определяем функцию для открытия хранилища готовых результатов
+@st.cache_resource
+def get_result_store():
     """
-    Функция для загрузки данных из текста.
+    Функция для открытия хранилища результатов, общего для всех сессий, процессов и перезапусков приложения.
 
-    Аргументы:
-    text - текст для обработки.
+    Возвращает:
+    Объект ResultStore.
+    """
+    return ResultStore()
+
+# Определяем функцию для создания переводчика
+@st.cache_resource
+def get_translator():
+    """
+    Функция для создания переводчика с кэшем, общего для словаря и упражнений всех сессий.
+
+    Возвращает:
+    Объект CachedTranslator.
+    """
+    return CachedTranslator()
+
+# Определяем функцию для создания генератора упражнений
+@st.cache_resource
+def get_exercise_generator():
+    """
+    Функция для создания генератора упражнений, общего для всех сессий и загрузок:
+    пул процессов запускается, и модели в нем загружаются только один раз.
+
+    Возвращает:
+    Объект ExerciseGenerator.
+    """
+    return ExerciseGenerator(translator=get_translator(), n_workers=n_workers)
+
+# Определяем функцию для получения общих объектов генерации
+@st.cache_resource
+def get_pipelines():
+    """
+    Функция для получения словаря объектов генерации, общего для всех сессий (переменные модуля
+    создаются заново при каждом перезапуске скрипта, поэтому словарь хранится в кэше streamlit).
 
     Возвращает:
-    Кортеж из двух датафреймов:
-    - Датафрейм с упражнениями по английскому языку.
-    - Датафрейм со словарем.
+    Кортеж из упорядоченного словаря, где ключи - хэши содержимого файлов, а значения - пары
+    из объекта ExercisePipeline и времени последнего обращения, и блокировки, под которой словарь изменяется.
     """
-    # Создаем объект класса TextToDataFrame
-    text_to_df = TextToDataFrame(text)
+    return collections.OrderedDict(), threading.Lock()
+
+# Определяем функцию для запуска генерации упражнений и словаря по тексту
+def creating_a_dictionary_and_exercises(fingerprint, uploaded_file):
+    """
+    Функция для запуска фоновой генерации упражнений и словаря по тексту.
+
+    Аргументы:
+    fingerprint - хэш SHA-256 содержимого файла (по нему сохраняется результат).
+    uploaded_file - загруженный файл: текст читается и декодируется по частям.
 
-    # Преобразуем текст в датафрейм с упражнениями
-    english_exercises_df = text_to_df.txt_to_df()
+    Возвращает:
+    Объект ExercisePipeline, который пополняется упражнениями по мере их генерации.
+    """
+    # Создаем объект фоновой генерации и запускаем ее
+    if service_url:
+        return ExercisePipeline(uploaded_file, api_key, max_entries=max_entries,
+                                client=GenerationClient(service_url)).start()
+    return ExercisePipeline(uploaded_file, api_key, translator=get_translator(),
+                            exercise_generator=get_exercise_generator(), max_entries=max_entries,
+                            store=get_result_store(), fingerprint=fingerprint).start()
+
+# Определяем функцию для загрузки изображения в шапке страницы
+@st.cache_resource
+def load_header_image():
+    """
+    Функция для однократной загрузки изображения в шапке страницы (общего для всех сессий).
 
-    # Создаем объект класса DictionaryCreator
-    dictionary_creator = DictionaryCreator(api_key)
+    Возвращает:
+    Содержимое изображения в байтах.
+    """
+    return urlopen(HEADER_IMAGE_URL).read()
+
+class SessionState:
+    def __init__(self, upload_id, fingerprint, pipeline):
+        """
+        Конструктор класса SessionState - состояния одной сессии пользователя для загруженного файла.
+
+        Аргументы:
+        upload_id - пара из идентификатора и размера загруженного файла.
+        fingerprint - хэш содержимого файла.
+        pipeline - объект ExercisePipeline для этого файла.
+        """
+        self.upload_id = upload_id
+        self.fingerprint = fingerprint
+        self.pipeline = pipeline
+        self.current_index = 0
+
+        # Упражнения, на которые дан верный ответ (тип упражнения и предложение)
+        self.correct = set()
+
+        # Время последних перезапусков скрипта в секундах
+        self.rerun_times = collections.deque(maxlen=50)
+
+    @property
+    def score(self):
+        # Количество упражнений, на которые дан верный ответ
+        return len(self.correct)
+
+    def record_answer(self, exercise, answer):
+        """
+        Метод для сохранения ответа на упражнение.
+
+        Аргументы:
+        exercise - запись Exercise.
+        answer - выбранный вариант ответа.
+
+        Возвращает:
+        True, если ответ верный.
+        """
+        key = (exercise.exercise_type, exercise.exercise_sentence)
+        if answer == exercise.correct_answer:
+            self.correct.add(key)
+            return True
+        self.correct.discard(key)
+        return False
+
+def start_pipeline(fingerprint, uploaded_file):
+    """
+    Функция для получения общего объекта генерации для файла: один и тот же объект используется
+    всеми сессиями, загрузившими этот текст. Генерация, завершившаяся ошибкой, заменяется новой,
+    а объекты генерации других файлов остаются в словаре. В словаре хранится не больше max_pipelines
+    объектов, и объекты, к которым не обращались дольше pipeline_ttl секунд, удаляются
+    (сессии, которые их уже получили, продолжают их использовать).
 
-    # Создаем датафрейм со словарем
-    dictionary_df = dictionary_creator.create_dictionary_df(english_exercises_df)
+    Аргументы:
+    fingerprint - хэш содержимого файла.
+    uploaded_file - загруженный файл.
 
-    # Создаем объект класса ExerciseGenerator
-    exercise_generator = ExerciseGenerator()
+    Возвращает:
+    Объект ExercisePipeline.
+    """
+    pipelines, lock = get_pipelines()
+    with lock:
+        now = time.monotonic()
+        pipeline, last_used = pipelines.pop(fingerprint, (None, None))
+        if pipeline is None or pipeline.error is not None:
+            pipeline = creating_a_dictionary_and_exercises(fingerprint, uploaded_file)
+        pipelines[fingerprint] = (pipeline, now)
+
+        # Удаляем самые давние объекты сверх ограничения и объекты, к которым давно не обращались
+        while pipelines:
+            oldest, oldest_used = next(iter(pipelines.values()))
+            if len(pipelines) <= max_pipelines and now - oldest_used <= pipeline_ttl:
+                break
+            pipelines.popitem(last=False)
+    return pipeline
+
+def get_session_state(uploaded_file):
+    """
+    Функция для получения состояния сессии для загруженного файла. Хэш содержимого файла
+    вычисляется и генерация запускается только один раз для каждой загрузки
+    (загрузка определяется по идентификатору и размеру файла), а не при каждом перезапуске скрипта.
+    Если генерация завершилась ошибкой, она запускается заново.
 
-    # Генерируем случайные упражнения
-    english_exercises_df = exercise_generator.generate_random_exercises(english_exercises_df)
+    Аргументы:
+    uploaded_file - загруженный файл.
 
-    # Возвращаем датафреймы с упражнениями и словарем
-    return english_exercises_df, dictionary_df
+    Возвращает:
+    Объект SessionState.
+    """
+    upload_id = (uploaded_file.id, uploaded_file.size)
+    state = st.session_state.get("state")
+    if state is None or state.upload_id != upload_id:
+        # Вычисляем хэш содержимого файла без копирования и декодирования всего текста
+        fingerprint = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        state = SessionState(upload_id, fingerprint, start_pipeline(fingerprint, uploaded_file))
+        st.session_state["state"] = state
+    elif state.pipeline.error is not None:
+        # Генерация для этой загрузки завершилась ошибкой: запускаем ее заново
+        state.pipeline = start_pipeline(state.fingerprint, uploaded_file)
+    return state
 
 st.title("English exercise generator")
 
@@ -52,42 +219,56 @@ uploaded_file = st.file_uploader("Загрузите текстовый файл
 
 # Проверяем, был ли загружен файл
 if uploaded_file is not None:
-    # Читаем содержимое файла и преобразуем его в строку
-    text = uploaded_file.read().decode()
+    # Получаем состояние сессии, запускаем генерацию и ждем, пока будет готова первая страница упражнений
+    state = get_session_state(uploaded_file)
+    pipeline = state.pipeline
+    pipeline.wait_for(5)
+
+    # Получаем упражнения, готовые к текущему моменту (общий для всех сессий неизменяемый набор),
+    # и словарь, если он уже составлен
+    exercise_store = pipeline.exercise_store()
+    dictionary_df = pipeline.dictionary_df
+
+    # Отображаем изображение в шапке страницы (загружается один раз для всех сессий)
+    st.image(load_header_image(), use_column_width=True)
+
+    # Отображаем датафрейм со словарем на странице или сообщение, что словарь еще составляется
+    if dictionary_df is not None:
+        st.dataframe(dictionary_df, height=300, width=900)
+    else:
+        st.info("Словарь составляется...")
 
-    # Загружаем данные из текста
-    english_exercises_df, dictionary_df = creating_a_dictionary_and_exercises(text)
+    # Сообщаем, что генерация упражнений еще продолжается
+    if not pipeline.exercises_done:
+        st.sidebar.info(f"Генерация продолжается: готово {len(exercise_store)} упражнений")
 
-    # Отображаем изображение в шапке страницы
-    img_url = "https://climbingthedissertationmountain.files.wordpress.com/2018/01/cropped-vladislav-klapin-316711.jpg"
-    image_data = urlopen(img_url).read()
-    header_image = Image.open(BytesIO(image_data))
-    st.image(header_image, use_column_width=True)
+    # Отображаем время до первого упражнения и общее время генерации
+    if pipeline.timings["first_exercise"] is not None:
+        st.sidebar.caption(f"Первое упражнение: {pipeline.timings['first_exercise']:.1f} с")
+    if pipeline.timings["total"] is not None:
+        st.sidebar.caption(f"Общее время: {pipeline.timings['total']:.1f} с")
 
-    # Отображаем датафрейм со словарем на странице
-    st.dataframe(dictionary_df, height=300, width=900)
+    # Отображаем время и счетчики по этапам обработки в сворачиваемой панели
+    with st.sidebar.expander("Статистика обработки"):
+        st.json(pipeline.metrics.snapshot())
+        st.download_button("Скачать JSON", pipeline.metrics.to_json(), file_name="metrics.json",
+                           mime="application/json")
 
-    # Получаем список типов упражнений из датафрейма с упражнениями
-    exercise_types = english_exercises_df["exercise_type"].unique().tolist()
+    # Получаем список типов упражнений, подготовленный заранее
+    exercise_types = list(exercise_store.types)
 
     # Создаем виджет для выбора типов упражнений в боковой панели
     selected_types = st.sidebar.multiselect("Выберите типы упражнений", exercise_types)
 
-    # Фильтруем датафрейм с упражнениями по выбранным типам упражнений
-    if not selected_types:
-        filtered_df = english_exercises_df.copy()
-    else:
-        filtered_df = english_exercises_df[english_exercises_df["exercise_type"].isin(selected_types)]
-
-    # Получаем общее количество упражнений в отфильтрованном датафрейме
-    total_exercises = len(filtered_df)
+    # Получаем общее количество упражнений выбранных типов
+    total_exercises = exercise_store.count(selected_types)
 
-    # Получаем текущий индекс и текущий счет из состояния сессии (или задаем значения по умолчанию)
-    current_index = st.session_state.get("current_index", 0)
-    current_score = st.session_state.get("current_score", 0)
+    # Получаем текущий индекс и текущий счет из состояния сессии
+    current_index = state.current_index
+    current_score = state.score
 
     # Создаем виджет для отображения прогресса выполнения упражнений в боковой панели
-    progress_bar = st.sidebar.progress(current_score / total_exercises)
+    progress_bar = st.sidebar.progress(min(current_score / max(total_exercises, 1), 1.0))
 
     # Создаем пустой элемент для отображения текущего счета в боковой панели
     score_text = st.sidebar.empty()
@@ -95,75 +276,76 @@ if uploaded_file is not None:
     # Отображаем текущий счет в пустом элементе
     score_text.text(f"Решено {current_score} из {total_exercises} упражнений")
 
-    # Отображаем 5 упражнений на странице
-    correct_answers = 0
-    for i in range(5):
-
-        # Проверяем, есть ли еще упражнения для отображения
-        if current_index + i < total_exercises:
+    # Создаем пустой элемент для отображения времени перезапуска скрипта
+    rerun_text = st.sidebar.empty()
 
-            # Отображаем номер упражнения
-            st.markdown(f"**Упражнение {current_index + i + 1}**")
+    # Получаем 5 упражнений текущей страницы
+    page = exercise_store.page(current_index, 5, selected_types)
 
-            # Получаем тип упражнения из датафрейма
-            exercise_type = filtered_df.iloc[current_index + i]["exercise_type"]
+    # Отображаем упражнения на странице
+    correct_answers = 0
+    for i, exercise in enumerate(page):
 
-            # Отображаем тип упражнения
-            st.write(f"Тип упражнения: {exercise_type}")
+        # Отображаем номер упражнения
+        st.markdown(f"**Упражнение {current_index + i + 1}**")
 
-            # Получаем предложение для упражнения из датафрейма
-            exercise_sentence = filtered_df.iloc[current_index + i]["exercise_sentence"]
+        # Отображаем тип упражнения
+        st.write(f"Тип упражнения: {exercise.exercise_type}")
 
-            # Выделяем пропущенное слово красным цветом
-            highlighted_sentence = exercise_sentence.replace("**",
-                                                             "<span style='border: 2px solid red;'>",
-                                                             1).replace("**", "</span>", 1)
+        # Получаем предложение для упражнения
+        exercise_sentence = exercise.exercise_sentence
 
-            # Отображаем предложение для упражнения с выделенным пропущенным словом
-            st.markdown(f"{highlighted_sentence}", unsafe_allow_html=True)
+        # Выделяем пропущенное слово красным цветом
+        highlighted_sentence = exercise_sentence.replace("**",
+                                                         "<span style='border: 2px solid red;'>",
+                                                         1).replace("**", "</span>", 1)
 
-            # Получаем варианты ответов из датафрейма
-            options = filtered_df.iloc[current_index + i]["options"]
+        # Отображаем предложение для упражнения с выделенным пропущенным словом
+        st.markdown(f"{highlighted_sentence}", unsafe_allow_html=True)
 
-            # Добавляем пустой вариант ответа в начало списка
-            options.insert(0, "")
+        # Получаем варианты ответов и добавляем пустой вариант ответа в начало
+        # (создаем новый список: исходные варианты общие для всех сессий и не должны меняться)
+        options = [""] + list(exercise.options)
 
-            # Создаем выпадающий список с вариантами ответов
-            selectbox = st.selectbox(f"Выберите верный ответ", options, key=f"selectbox_{i}")
+        # Создаем выпадающий список с вариантами ответов
+        # (у каждого упражнения свой ключ, поэтому выбранный ответ сохраняется при переходе по страницам)
+        selectbox = st.selectbox(f"Выберите верный ответ", options, key=f"selectbox_{current_index + i}")
 
-            # Получаем правильный ответ из датафрейма
-            correct_answer = filtered_df.iloc[current_index + i]["correct_answer"]
+        # Получаем правильный ответ
+        correct_answer = exercise.correct_answer
 
-            # Проверяем, выбрал ли пользователь вариант ответа
-            if selectbox:
+        # Проверяем, выбрал ли пользователь вариант ответа
+        if selectbox:
 
-                # Проверяем, верный ли выбранный вариант ответа
-                if selectbox == correct_answer:
+            # Сохраняем ответ в состоянии сессии и проверяем, верный ли выбранный вариант ответа
+            if state.record_answer(exercise, selectbox):
 
-                    # Отображаем сообщение об успехе
-                    st.success("✅ Верно!")
+                # Отображаем сообщение об успехе
+                st.success("✅ Верно!")
 
-                    # Увеличиваем счет на 1
-                    current_score += 1
+                # Обновляем счет
+                current_score = state.score
 
-                    # Обновляем прогресс выполнения упражнений
-                    progress_bar.progress(current_score / total_exercises)
+                # Обновляем прогресс выполнения упражнений
+                progress_bar.progress(min(current_score / max(total_exercises, 1), 1.0))
 
-                    # Обновляем отображение текущего счета
-                    score_text.text(f"Решено {current_score} из {total_exercises} упражнений")
+                # Обновляем отображение текущего счета
+                score_text.text(f"Решено {current_score} из {total_exercises} упражнений")
 
-                    # Увеличиваем счетчик правильных ответов на 1
-                    correct_answers += 1
+                # Увеличиваем счетчик правильных ответов на 1
+                correct_answers += 1
 
-                else:
-                    # Отображаем сообщение об ошибке
-                    st.error("❌ Неверно!")
+            else:
+                # Обновляем счет (ответ мог быть верным при прошлом перезапуске)
+                current_score = state.score
+                progress_bar.progress(min(current_score / max(total_exercises, 1), 1.0))
+                score_text.text(f"Решено {current_score} из {total_exercises} упражнений")
 
-                    # Отображаем правильный ответ
-                    st.write(f"Правильный ответ: {correct_answer}")
+                # Отображаем сообщение об ошибке
+                st.error("❌ Неверно!")
 
-        else:
-            break
+                # Отображаем правильный ответ
+                st.write(f"Правильный ответ: {correct_answer}")
 
     # Проверяем, правильно ли решены все 5 упражнений на странице
     if correct_answers == 5:
@@ -175,18 +357,16 @@ if uploaded_file is not None:
 
         # Создаем кнопку для перехода к следующим 5 упражнениям
         if st.button("Следующие 5 упражнений"):
-            # Увеличиваем текущий индекс на 5
-            current_index += 5
-
-            # Сохраняем текущий индекс в состоянии сессии
-            st.session_state["current_index"] = current_index
-
-            # Сохраняем текущий счет в состоянии сессии
-            st.session_state["current_score"] = current_score
+            # Увеличиваем текущий индекс на 5 и сохраняем его в состоянии сессии
+            state.current_index = current_index + 5
 
             # Перезапускаем приложение
             st.experimental_rerun()
 
+    elif not pipeline.exercises_done:
+        # Сообщаем, что следующие упражнения еще генерируются
+        st.write("Следующие упражнения еще генерируются...")
+
     else:
         # Отображаем сообщение об окончании упражнений
         st.write("Поздравляем! Вы решили все упражнения!")
@@ -201,3 +381,16 @@ if uploaded_file is not None:
 
             # Перезапускаем приложение
             st.experimental_rerun()
+
+    # Отображаем время этого перезапуска и медиану последних перезапусков
+    rerun_seconds = time.perf_counter() - rerun_start
+    state.rerun_times.append(rerun_seconds)
+    metrics.add_time("streamlit.rerun", rerun_seconds)
+    rerun_text.caption(f"Перезапуск: {rerun_seconds * 1000:.0f} мс "
+                       f"(медиана {statistics.median(state.rerun_times) * 1000:.0f} мс "
+                       f"за последние {len(state.rerun_times)})")
+
+    # Пока генерация не закончена, периодически перезапускаем приложение, чтобы показать новые данные
+    if not pipeline.done:
+        time.sleep(1)
+        st.experimental_rerun()
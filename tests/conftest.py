@@ -0,0 +1,47 @@
+# Общие заменители внешних сервисов для тестов: локальный сервер Yandex Dictionary
+# и перевод без обращения к сети из benchmark.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import FakeDictionaryServer, FakeTranslateBackend
+from exercise_generator import CachedTranslator, DictionaryCreator, SQLiteCache, YandexDictionaryClient
+
+
+@pytest.fixture
+def dictionary_server():
+    server = FakeDictionaryServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_creator(tmp_path, dictionary_server):
+    # Создает DictionaryCreator с отдельными кэшами и возвращает его вместе с заменителем перевода
+    def make(name='cache', **kwargs):
+        backend = FakeTranslateBackend()
+        translator = CachedTranslator(backend, cache=SQLiteCache(str(tmp_path / f'{name}_translations.sqlite3')))
+        client = YandexDictionaryClient('test', base_url=dictionary_server.url, requests_per_second=None,
+                                        cache=SQLiteCache(str(tmp_path / f'{name}_dictionary.sqlite3')))
+        return DictionaryCreator('test', translator=translator, client=client, **kwargs), backend
+
+    return make
+
+
+@pytest.fixture(scope='session')
+def offline_models():
+    # Заменители spacy, nltk, word_forms и word2vec из benchmark.py для синтетических предложений
+    from benchmark import SyntheticVocabulary, build_keyed_vectors, install_offline_nlp
+    from exercise_generator import DistractorEngine, VerbFormService, models
+
+    vocabulary = SyntheticVocabulary(200)
+    saved = dict(models._models)
+    install_offline_nlp(vocabulary)
+    models.set('distractors', DistractorEngine(build_keyed_vectors(vocabulary)))
+    models.set('verb_forms', VerbFormService())
+    yield vocabulary
+    models._models.clear()
+    models._models.update(saved)
@@ -0,0 +1,48 @@
+import sqlite3
+
+from exercise_generator import SQLiteCache
+
+
+def scan(path):
+    # Количество записей и размер значений полным просмотром таблицы
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*), TOTAL(LENGTH(CAST(value AS BLOB))) FROM cache').fetchone()
+    finally:
+        connection.close()
+
+
+def test_running_totals_match_table(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path)
+    cache.set_many({f'key{i}': 'значение' * i for i in range(50)})
+    cache.set_many({f'key{i}': i for i in range(25)})
+    cache.set('новый', ['a', 'b'])
+
+    entries, total = scan(path)
+    assert len(cache) == entries == 51
+    assert cache.size == total
+
+    # Существующая база без таблицы счетчиков получает их при открытии
+    connection = sqlite3.connect(path)
+    connection.execute('DROP TABLE cache_stats')
+    connection.commit()
+    connection.close()
+    reopened = SQLiteCache(path)
+    assert (len(reopened), reopened.size) == (entries, total)
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path, max_entries=100, max_bytes=10000)
+    for i in range(20):
+        cache.set_many({f'key{i}_{j}': 'x' * 100 for j in range(5)})
+
+        # Первую запись постоянно читаем, поэтому она не удаляется
+        assert cache.get('key0_0') is not None
+
+    entries, total = scan(path)
+    assert total <= 10000
+    assert (len(cache), cache.size) == (entries, total)
+    assert cache.get('key0_1') is None
+    assert cache.get('key19_4') is not None
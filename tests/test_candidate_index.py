@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from benchmark import FakeTranslateBackend
+from exercise_generator import CachedTranslator, ExerciseGenerator, SQLiteCache
+
+EXERCISE_TYPES = {'translate': 'Выберите перевод слова', 'verb': 'Выберите форму глагола', 'article': 'Выберите артикль'}
+
+
+@pytest.fixture
+def index(offline_models, tmp_path):
+    translator = CachedTranslator(FakeTranslateBackend(), cache=SQLiteCache(str(tmp_path / 'generator.sqlite3')))
+    # Предложения без кандидатов получают None
+    sentences = offline_models.sentences(60) + ['Nothing.', 'Ok.']
+    return ExerciseGenerator(translator=translator).build_candidate_index(sentences)
+
+
+def check_exercise(index, number, exercise, kinds=EXERCISE_TYPES):
+    # Упражнение составлено по кандидату своего предложения и допустимого типа
+    sentence = index.sentences[number]
+    assert exercise.sentence == sentence
+    assert exercise.exercise_type in [EXERCISE_TYPES[kind] for kind in kinds]
+    assert exercise.correct_answer in exercise.options
+    if exercise.exercise_type == EXERCISE_TYPES['translate']:
+        assert exercise.exercise_sentence.replace('**', '') == sentence
+    else:
+        assert exercise.exercise_sentence.replace('___', exercise.correct_answer, 1) == sentence
+
+
+def test_offsets_cover_all_candidates(index):
+    for kind in index.KINDS:
+        offsets = index.offsets[kind]
+        assert len(offsets) == len(index) + 1
+        assert offsets[0] == 0 and offsets[-1] == index.count(kind) == len(index.spans[kind])
+        assert (offsets[1:] >= offsets[:-1]).all()
+    assert index.count('translate') > 0 and index.count('verb') > 0 and index.count('article') > 0
+
+
+def test_sample_stays_within_sentence_candidates(index):
+    exercises = index.sample(random.Random(0))
+
+    assert len(exercises) == len(index)
+    for number, exercise in enumerate(exercises):
+        has_candidates = any(index.offsets[kind][number] < index.offsets[kind][number + 1] for kind in index.KINDS)
+        assert (exercise is not None) == has_candidates
+        if exercise is not None:
+            check_exercise(index, number, exercise)
+    assert exercises[-2:] == [None, None]
+
+
+@pytest.mark.parametrize('kinds', [['verb'], ['article', 'translate']])
+def test_sample_respects_kinds(index, kinds):
+    exercises = index.sample(random.Random(1), kinds=kinds)
+
+    assert any(exercise is not None for exercise in exercises)
+    for number, exercise in enumerate(exercises):
+        if exercise is not None:
+            check_exercise(index, number, exercise, kinds)
+
+
+def test_sample_is_reproducible_for_seed(index):
+    first = [exercise and exercise.to_tuple() for exercise in index.sample(random.Random(42))]
+    second = [exercise and exercise.to_tuple() for exercise in index.sample(random.Random(42))]
+    other = [exercise and exercise.to_tuple() for exercise in index.sample(random.Random(43))]
+
+    assert first == second
+    assert first != other
+
+
+def test_variant_uses_only_its_sentence(index):
+    rng = random.Random(7)
+    for number in range(len(index)):
+        for _ in range(5):
+            exercise = index.variant(number, rng)
+            if exercise is not None:
+                check_exercise(index, number, exercise)
+
+    assert index.variant(len(index) - 1, rng) is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from benchmark import SyntheticVocabulary, build_keyed_vectors
+from exercise_generator import CompactVectors, DistractorEngine
+
+
+@pytest.fixture(scope='module')
+def model():
+    return build_keyed_vectors(SyntheticVocabulary(200))
+
+
+@pytest.fixture(scope='module')
+def keys(model):
+    return [key for key in model.index_to_key if key.endswith(('_NOUN', '_ADJ')) and '::' not in key]
+
+
+def neighbours(model, keys):
+    return DistractorEngine(model).most_similar_batch(keys)
+
+
+# Наименьшая средняя доля общих соседей с полной моделью и наибольшее отличие близости:
+# float32 совпадает с полной моделью, float16 почти совпадает, а int8 теряет точность
+@pytest.mark.parametrize('dtype, min_overlap, max_score_error', [('float32', 1.0, 1e-6), ('float16', 0.99, 2e-3),
+                                                                 ('int8', 0.95, 2e-2)])
+def test_neighbour_overlap_with_full_model(model, keys, dtype, min_overlap, max_score_error):
+    expected = neighbours(model, keys)
+    compact = CompactVectors.from_model(model, dtype=dtype)
+    result = neighbours(compact, keys)
+
+    assert set(result) == set(expected)
+    overlap = np.mean([len({word for word, score in result[key]} & {word for word, score in expected[key]}) / 3
+                       for key in keys])
+    assert overlap >= min_overlap
+
+    # Близость одних и тех же соседей почти не меняется
+    errors = [abs(score - dict(expected[key])[word]) for key in keys for word, score in result[key]
+              if word in dict(expected[key])]
+    assert max(errors) <= max_score_error
+
+
+def test_int8_is_lossy(model, keys):
+    expected = neighbours(model, keys)
+    result = neighbours(CompactVectors.from_model(model, dtype='int8'), keys)
+
+    assert any([word for word, score in result[key]] != [word for word, score in expected[key]] for key in keys)
+
+
+@pytest.mark.parametrize('dtype', CompactVectors.DTYPES)
+def test_save_load_keeps_neighbours(model, keys, dtype, tmp_path):
+    compact = CompactVectors.from_model(model, dtype=dtype)
+    path = str(tmp_path / dtype)
+    compact.save(path)
+    loaded = CompactVectors.load(path)
+
+    assert loaded.index_to_key == compact.index_to_key
+    assert loaded.nbytes == compact.nbytes
+    assert neighbours(loaded, keys) == neighbours(compact, keys)
+
+
+def test_subset_keeps_only_requested_parts_of_speech(model):
+    compact = CompactVectors.from_model(model, dtype='int8')
+
+    assert all(key.endswith(('_NOUN', '_ADJ')) and '::' not in key for key in compact.index_to_key)
+    assert compact.data.dtype == np.int8
+    assert compact.nbytes < CompactVectors.from_model(model, dtype='float32').nbytes / 3
+
+    with pytest.raises(ValueError):
+        CompactVectors.from_model(model, dtype='int4')
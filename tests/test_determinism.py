@@ -0,0 +1,46 @@
+import pytest
+
+from benchmark import FakeTranslateBackend
+from exercise_generator import CachedTranslator, ExerciseGenerator, ResultStore, SQLiteCache
+
+
+@pytest.fixture
+def make_generator(tmp_path):
+    def make(**kwargs):
+        translator = CachedTranslator(FakeTranslateBackend(), cache=SQLiteCache(str(tmp_path / 'generator.sqlite3')))
+        return ExerciseGenerator(translator=translator, seed=7, **kwargs)
+
+    return make
+
+
+def run(generator, sentences, **kwargs):
+    with generator:
+        return [exercise.to_tuple() for exercise in generator.iter_exercises(sentences, **kwargs)]
+
+
+def test_fixed_seed_does_not_depend_on_chunks_workers_or_store(offline_models, make_generator, tmp_path):
+    sentences = offline_models.sentences(150)
+    expected = run(make_generator(), sentences)
+    assert len(expected) > 0
+
+    for chunk_size in (7, 40, 1000):
+        assert run(make_generator(), sentences, chunk_size=chunk_size) == expected
+
+    # Модели заменителей есть только в этом процессе, поэтому процессы пула создаются через fork
+    assert run(make_generator(n_workers=2, shard_size=16, mp_context='fork'), sentences, chunk_size=50) == expected
+
+    # Часть предложений уже сохранена: сохраненные и новые упражнения совпадают с обычной генерацией
+    store = ResultStore(str(tmp_path / 'results.sqlite3'))
+    run(make_generator(), sentences[30:80], chunk_size=13, store=store)
+    assert run(make_generator(), sentences, chunk_size=40, store=store) == expected
+    assert run(make_generator(n_workers=2, shard_size=16, mp_context='fork'), sentences, chunk_size=25,
+               store=store) == expected
+
+
+def test_different_seeds_give_different_exercises(offline_models, make_generator):
+    sentences = offline_models.sentences(100)
+    translator = make_generator().translator
+
+    first = run(ExerciseGenerator(translator=translator, seed=1), sentences)
+    second = run(ExerciseGenerator(translator=translator, seed=2), sentences)
+    assert first != second
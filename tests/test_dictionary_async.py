@@ -0,0 +1,52 @@
+import asyncio
+
+import pandas as pd
+
+from benchmark import FakeDictionaryServer
+from exercise_generator import SQLiteCache, YandexDictionaryClient
+
+SENTENCES = ['The remarkable traveller crossed several mountains yesterday.',
+             'Several travellers described remarkable mountains and rivers.',
+             'Nothing happened.']
+
+
+def test_async_frame_matches_sync_frame(make_creator):
+    df = pd.DataFrame({'sentence': SENTENCES})
+    sync_creator, _ = make_creator('sync', lemmatize=False)
+    async_creator, _ = make_creator('async', lemmatize=False)
+
+    expected = sync_creator.create_dictionary_df(df)
+    result = asyncio.run(async_creator.create_dictionary_df_async(df))
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert len(result) == 12
+
+
+def test_async_lookup_translates_in_batches(make_creator, dictionary_server):
+    words = [f'word{i}' for i in range(250)]
+    creator, backend = make_creator()
+
+    result = asyncio.run(creator.lookup_dictionary_df_async(words, concurrency=4))
+
+    # Слова переводятся пачками по batch_size, а каждое слово запрашивается в словаре один раз
+    assert backend.calls == 3
+    assert backend.words == len(words)
+    assert dictionary_server.requests == len(words)
+    assert len(result) == len(words)
+
+
+def test_async_lookup_stays_within_connection_pool(make_creator, tmp_path):
+    server = FakeDictionaryServer(latency=0.01)
+    try:
+        creator, _ = make_creator()
+        creator.client = YandexDictionaryClient('test', base_url=server.url, requests_per_second=None,
+                                                cache=SQLiteCache(str(tmp_path / 'pool.sqlite3')))
+        words = [f'word{i}' for i in range(500)]
+
+        asyncio.run(creator.lookup_dictionary_df_async(words, concurrency=16))
+
+        # Пачки делят один пул запросов, поэтому одновременных запросов не больше, чем соединений клиента
+        assert server.requests == len(words)
+        assert server.peak_active_requests <= creator.client.max_workers
+    finally:
+        server.close()
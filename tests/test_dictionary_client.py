@@ -0,0 +1,99 @@
+import pytest
+
+from benchmark import FakeDictionaryServer
+from exercise_generator import SQLiteCache, YandexDictionaryClient
+
+
+@pytest.fixture
+def make_client(tmp_path):
+    # Создает клиент без ограничения частоты запросов и без пауз между повторами
+    def make(server, max_retries=3, cache_name='dictionary.sqlite3'):
+        return YandexDictionaryClient('test', base_url=server.url, requests_per_second=None,
+                                      max_retries=max_retries, backoff_factor=0,
+                                      cache=SQLiteCache(str(tmp_path / cache_name)))
+
+    return make
+
+
+@pytest.fixture
+def failing_server(request):
+    server = FakeDictionaryServer(errors=request.param)
+    yield server
+    server.close()
+
+
+@pytest.mark.parametrize('failing_server, errors', [([429], 1), ([500], 1), ([502, 503], 2), ([429, 504, 500], 3)],
+                         indirect=['failing_server'])
+def test_lookup_retries_rate_limit_and_server_errors(failing_server, errors, make_client):
+    client = make_client(failing_server)
+
+    assert client.lookup_many(['word']) == {'word': [{'text': 'word', 'ts': 'word-ts'}]}
+    assert failing_server.requests == errors + 1
+
+
+@pytest.mark.parametrize('failing_server', [[503] * 3], indirect=True)
+def test_lookup_gives_up_after_max_retries(failing_server, make_client):
+    client = make_client(failing_server, max_retries=2)
+
+    assert client.lookup_many(['word']) == {'word': None}
+    assert failing_server.requests == 3
+
+    # Неудачный ответ не кэшируется: следующий запрос уходит на сервер
+    assert client.lookup_many(['word']) == {'word': [{'text': 'word', 'ts': 'word-ts'}]}
+    assert failing_server.requests == 4
+
+
+@pytest.mark.parametrize('failing_server', [[404]], indirect=True)
+def test_lookup_does_not_retry_client_errors(failing_server, make_client):
+    client = make_client(failing_server)
+
+    assert client.lookup_many(['word']) == {'word': None}
+    assert failing_server.requests == 1
+
+
+def test_cached_words_are_not_requested_again(dictionary_server, make_client):
+    words = ['alpha', 'beta', 'gamma']
+    client = make_client(dictionary_server)
+
+    first = client.lookup_many(words)
+    assert dictionary_server.requests == len(words)
+
+    # Повторный поиск, в том числе новым клиентом с тем же кэшем, берет статьи из кэша
+    assert client.lookup_many(words + ['alpha']) == first
+    assert make_client(dictionary_server).lookup_many(words) == first
+    assert dictionary_server.requests == len(words)
+
+    # Запрашивается только новое слово
+    client.lookup_many(words + ['delta'])
+    assert dictionary_server.requests == len(words) + 1
+
+
+def test_invalid_json_response_is_treated_as_missing_entry(make_client, caplog):
+    server = FakeDictionaryServer(invalid_responses=1)
+    try:
+        client = make_client(server)
+
+        with caplog.at_level('WARNING', logger='exercise_generator'):
+            assert client.lookup_many(['word']) == {'word': None}
+        assert 'word' in caplog.text
+
+        # Некорректный ответ не кэшируется
+        assert client.lookup_many(['word']) == {'word': [{'text': 'word', 'ts': 'word-ts'}]}
+        assert server.requests == 2
+    finally:
+        server.close()
+
+
+def test_invalid_json_response_does_not_abort_dictionary(make_creator, make_client):
+    server = FakeDictionaryServer(invalid_responses=2)
+    try:
+        creator, _ = make_creator()
+        creator.client = make_client(server)
+
+        dictionary_df = creator.lookup_dictionary_df(['alpha', 'beta', 'gamma'])
+
+        # Слова без статей в словарь не попадают, остальные слова обрабатываются как обычно
+        assert len(dictionary_df) == 1
+        assert server.requests == 3
+    finally:
+        server.close()
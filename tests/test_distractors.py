@@ -0,0 +1,35 @@
+import numpy as np
+from gensim.models import KeyedVectors
+
+from exercise_generator import DistractorEngine
+
+
+def build_model():
+    keys = [f'n{i}_NOUN' for i in range(300)] + [f'a{i}_ADJ' for i in range(300)] + ['v_VERB', 'x::y_NOUN']
+    model = KeyedVectors(16)
+    model.add_vectors(keys, np.random.default_rng(0).standard_normal((len(keys), 16)).astype(np.float32))
+    return model
+
+
+def brute_force(model, key, topn):
+    # Похожие слова той же части речи полным перебором
+    pos = key.rsplit('_', 1)[-1]
+    candidates = [other for other in model.index_to_key
+                  if other.endswith(f'_{pos}') and '::' not in other and other != key]
+    vectors = model.vectors[[model.key_to_index[other] for other in candidates]]
+    query = model.vectors[model.key_to_index[key]]
+    scores = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+    return [candidates[i] for i in np.argsort(-scores)[:topn]]
+
+
+def test_blocked_search_matches_brute_force():
+    model = build_model()
+    keys = [f'n{i}_NOUN' for i in range(0, 300, 7)] + [f'a{i}_ADJ' for i in range(0, 300, 11)]
+
+    # Маленькие блоки: запросы и словарь делятся на несколько частей
+    engine = DistractorEngine(model, block_size=64, query_block_size=5)
+    result = engine.most_similar_batch(keys + ['v_VERB', 'missing_NOUN'])
+
+    assert set(result) == set(keys)
+    for key in keys:
+        assert [word for word, similarity in result[key]] == brute_force(model, key, 3)
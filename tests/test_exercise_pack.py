@@ -0,0 +1,55 @@
+import pickle
+
+import pandas as pd
+
+from exercise_generator import Exercise, ExercisePack, exercises_to_df
+
+EXERCISES = [
+    Exercise('The cat sleeps.', 'Выберите перевод', 'The ___ sleeps.', ['кошка', 'собака', 'мышь'], 'кошка'),
+    Exercise('She goes home.', 'Выберите форму глагола', 'She ___ home.', ['go', 'goes', 'went'], 'goes'),
+    Exercise('I saw an owl.', 'Выберите артикль', 'I saw ___ owl.', ['a', 'an', 'the'], 'an'),
+    Exercise('Ёжик видит «сову».', 'Выберите перевод', '___ видит «сову».', ['ёжик', 'кошка'], 'ёжик'),
+]
+
+
+def test_pack_round_trip(tmp_path):
+    pack = ExercisePack.from_exercises(EXERCISES)
+    path = str(tmp_path / 'bank.exercises.pack')
+    pack.save(path)
+
+    for loaded in (ExercisePack.load(path), ExercisePack.load(path, mmap=False), pickle.loads(pickle.dumps(pack))):
+        assert len(loaded) == len(EXERCISES)
+        assert list(loaded) == EXERCISES
+        assert loaded[2] == EXERCISES[2]
+        pd.testing.assert_frame_equal(loaded.to_df(), exercises_to_df(EXERCISES))
+
+    # Одинаковые строки хранятся один раз
+    assert len(pack.string_offsets) - 1 < sum(3 + len(exercise.options) for exercise in EXERCISES)
+
+
+def test_pack_from_df_matches_from_exercises():
+    pack = ExercisePack.from_df(exercises_to_df(EXERCISES))
+
+    assert list(pack) == EXERCISES
+
+
+def test_loaded_pack_is_pickled_by_path(tmp_path):
+    path = str(tmp_path / 'bank.exercises.pack')
+    ExercisePack.from_exercises(EXERCISES).save(path)
+
+    data = pickle.dumps(ExercisePack.load(path))
+
+    assert len(data) < 200
+    assert list(pickle.loads(data)) == EXERCISES
+
+
+def test_empty_pack(tmp_path):
+    pack = ExercisePack.from_exercises([])
+    path = str(tmp_path / 'empty.exercises.pack')
+    pack.save(path)
+    loaded = ExercisePack.load(path)
+
+    assert len(loaded) == 0
+    assert list(loaded) == []
+    assert loaded.to_df().empty
+    assert list(loaded.to_df().columns) == list(exercises_to_df([]).columns)
@@ -0,0 +1,38 @@
+import itertools
+
+import numpy as np
+
+from exercise_generator import Exercise, ExerciseStore
+
+TYPES = ['Выберите перевод', 'Выберите форму глагола', 'Выберите артикль']
+
+
+def make_exercises(count, types=TYPES, seed=0):
+    rng = np.random.default_rng(seed)
+    return [Exercise(f'Sentence {i}.', types[rng.integers(len(types))], f'Sentence ___ {i}.', [f'a{i}', f'b{i}'],
+                     f'a{i}') for i in range(count)]
+
+
+def test_extended_store_matches_full_build():
+    # Третий тип упражнений появляется только в последней части
+    exercises = make_exercises(300, TYPES[:2]) + make_exercises(200, TYPES, seed=1)
+
+    store = ExerciseStore([])
+    snapshots = []
+    for start in range(0, len(exercises), 70):
+        store = ExerciseStore(exercises[start:start + 70], base=store)
+        snapshots.append((store, start + len(exercises[start:start + 70])))
+    expected = ExerciseStore(exercises)
+
+    assert store.exercises == expected.exercises
+    assert store.types == expected.types
+    for size in range(len(TYPES) + 1):
+        for types in itertools.combinations(TYPES, size):
+            assert store.count(types) == expected.count(types)
+            assert store.page(40, 25, types) == expected.page(40, 25, types)
+
+    # Ранее полученные наборы не изменяются
+    for snapshot, count in snapshots:
+        assert len(snapshot) == count
+        assert snapshot.exercises == expected.exercises[:count]
+        assert snapshot.count([TYPES[0]]) == ExerciseStore(exercises[:count]).count([TYPES[0]])
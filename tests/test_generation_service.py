@@ -0,0 +1,102 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from benchmark import FakeTranslateBackend
+from exercise_generator import CachedTranslator, ExerciseGenerator, ExercisePipeline, GenerationClient, SQLiteCache
+from generation_service import GenerationRequestHandler, GenerationService, MicroBatcher
+
+
+@pytest.fixture
+def service(offline_models, make_creator, tmp_path):
+    # Сервис генерации на свободном порту с заменителями моделей и внешних сервисов
+    translator = CachedTranslator(FakeTranslateBackend(), cache=SQLiteCache(str(tmp_path / 'generator.sqlite3')))
+    creator, _ = make_creator()
+    batcher = MicroBatcher(ExerciseGenerator(translator=translator, seed=1), creator, max_wait=0.001)
+    service = GenerationService(batcher, creator, chunk_size=16, timeout=5)
+
+    handler = type('Handler', (GenerationRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service.url = f'http://127.0.0.1:{server.server_port}'
+    yield service
+    server.shutdown()
+    server.server_close()
+
+
+def run_pipeline(service, text):
+    return ExercisePipeline(text, 'test', client=GenerationClient(service.url)).start()
+
+
+def test_service_streams_exercises_and_dictionary(service, offline_models):
+    exercises_df, dictionary_df = run_pipeline(service, ' '.join(offline_models.sentences(40))).result(timeout=30)
+
+    assert len(exercises_df) > 0
+    assert len(dictionary_df) > 0
+
+
+def test_dictionary_error_is_sent_to_client(service, offline_models, monkeypatch):
+    def failing_lookup(words):
+        raise ValueError('dictionary is down')
+
+    monkeypatch.setattr(service.dictionary_creator.client, 'lookup_many', failing_lookup)
+
+    messages = list(service.generate({'text': ' '.join(offline_models.sentences(20))}))
+    assert messages[-2] == {'exercises_done': True}
+    assert 'dictionary is down' in messages[-1]['error']
+
+    pipeline = run_pipeline(service, ' '.join(offline_models.sentences(20)))
+    with pytest.raises(RuntimeError, match='dictionary is down'):
+        pipeline.result(timeout=30)
+    assert not pipeline._threads[0].is_alive()
+
+
+def test_dictionary_respects_request_timeout(service, offline_models, monkeypatch):
+    lookup_many = service.dictionary_creator.client.lookup_many
+
+    def slow_lookup(words):
+        time.sleep(2)
+        return lookup_many(words)
+
+    monkeypatch.setattr(service.dictionary_creator.client, 'lookup_many', slow_lookup)
+
+    start = time.perf_counter()
+    messages = list(service.generate({'text': ' '.join(offline_models.sentences(20)), 'timeout': 0.5}))
+    assert time.perf_counter() - start < 1.5
+    assert messages[-2] == {'exercises_done': True}
+    assert messages[-1] == {'error': 'превышено время обработки запроса'}
+
+
+def test_batch_error_does_not_stop_batcher(service, offline_models, monkeypatch):
+    extract_words = service.dictionary_creator.extract_words
+    calls = []
+
+    def failing_once(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError('bad chunk')
+        return extract_words(*args, **kwargs)
+
+    monkeypatch.setattr(service.dictionary_creator, 'extract_words', failing_once)
+
+    messages = list(service.generate({'text': ' '.join(offline_models.sentences(10))}))
+    assert 'bad chunk' in messages[-1]['error']
+
+    # Следующий запрос обрабатывается тем же потоком пакетов
+    messages = list(service.generate({'text': ' '.join(offline_models.sentences(10))}))
+    assert 'dictionary' in messages[-1]
+
+
+def test_pipeline_fails_when_stream_ends_without_dictionary():
+    class TruncatedClient:
+        def stream(self, text, min_word_length, max_entries):
+            yield {'exercises': []}
+            yield {'exercises_done': True}
+
+    pipeline = ExercisePipeline('Some text.', 'test', client=TruncatedClient()).start()
+    with pytest.raises(RuntimeError, match='без словаря'):
+        pipeline.result(timeout=5)
+    assert pipeline.exercises_done
@@ -0,0 +1,74 @@
+import io
+
+from benchmark import FakeTranslateBackend
+from exercise_generator import (CachedTranslator, ExerciseGenerator, ExercisePipeline, ResultStore, SQLiteCache,
+                                metrics, models)
+
+
+def test_pipeline_parses_each_sentence_once(offline_models, make_creator, tmp_path, monkeypatch):
+    sentences = offline_models.sentences(300)
+    nlp = models.get('nlp')
+    parsed = []
+
+    # Считаем предложения, которые проходят через nlp.pipe
+    original_pipe = nlp.pipe
+
+    def counting_pipe(texts, **kwargs):
+        for doc in original_pipe(texts, **kwargs):
+            parsed.append(doc.text)
+            yield doc
+
+    monkeypatch.setattr(nlp, 'pipe', counting_pipe)
+
+    creator, _ = make_creator()
+    translator = CachedTranslator(FakeTranslateBackend(), cache=SQLiteCache(str(tmp_path / 'generator.sqlite3')))
+    generator = ExerciseGenerator(translator=translator, seed=1)
+    exercises_df, dictionary_df = ExercisePipeline(' '.join(sentences), 'test', dictionary_creator=creator,
+                                                   exercise_generator=generator).start().result(timeout=60)
+
+    assert len(parsed) == len(sentences)
+    assert len(exercises_df) > 0
+    assert len(dictionary_df) > 0
+
+
+def test_pipeline_reuses_stored_result_for_file(offline_models, make_creator, tmp_path):
+    data = ' '.join(offline_models.sentences(50)).encode('utf-8')
+    store = ResultStore(str(tmp_path / 'results.sqlite3'))
+    creator, _ = make_creator()
+    translator = CachedTranslator(FakeTranslateBackend(), cache=SQLiteCache(str(tmp_path / 'generator.sqlite3')))
+    generator = ExerciseGenerator(translator=translator, seed=1)
+
+    first = ExercisePipeline(io.BytesIO(data), 'test', dictionary_creator=creator, exercise_generator=generator,
+                             store=store).start()
+    exercises_df, dictionary_df = first.result(timeout=60)
+
+    # Повторная загрузка того же файла берет результат из хранилища без запуска этапов
+    second = ExercisePipeline(io.BytesIO(data), 'test', dictionary_creator=creator, exercise_generator=generator,
+                              store=store).start()
+    stored_exercises, stored_dictionary = second.result(timeout=60)
+
+    assert second.key == first.key
+    assert second._threads == []
+    assert stored_exercises.equals(exercises_df)
+    assert stored_dictionary.equals(dictionary_df)
+
+
+def test_pipeline_collects_its_own_metrics(offline_models, make_creator, tmp_path):
+    translator = CachedTranslator(FakeTranslateBackend(), cache=SQLiteCache(str(tmp_path / 'generator.sqlite3')))
+    generator = ExerciseGenerator(translator=translator, seed=1)
+    metrics.reset()
+
+    pipelines = []
+    for count in (20, 40):
+        creator, _ = make_creator(f'cache{count}')
+        pipeline = ExercisePipeline(' '.join(offline_models.sentences(count)), 'test', dictionary_creator=creator,
+                                    exercise_generator=generator).start()
+        pipeline.result(timeout=60)
+        pipelines.append(pipeline)
+
+    # Каждая генерация считает только свои предложения, а общие значения процесса - все
+    first, second = (pipeline.metrics.snapshot()['counters'] for pipeline in pipelines)
+    assert first['sentences'] == 20
+    assert second['sentences'] == 40
+    assert metrics.snapshot()['counters']['sentences'] == 60
+    assert first['dictionary.requests'] > 0
@@ -0,0 +1,71 @@
+import pytest
+
+from exercise_generator import VerbFormIndex, VerbFormService, models
+
+
+@pytest.fixture
+def verbs(offline_models):
+    return offline_models.verbs[:50]
+
+
+def test_index_matches_get_word_forms(verbs):
+    get_word_forms = models.get('get_word_forms')
+    index = VerbFormIndex.build(verbs)
+
+    # В индексе есть начальные слова и все их формы, а наборы форм совпадают с get_word_forms
+    for verb in verbs:
+        forms = frozenset(get_word_forms(verb)['v'])
+        assert index.get(verb) == forms
+        for form in forms:
+            assert index.get(form) == frozenset(get_word_forms(form)['v'])
+    assert all(index.get(word) == frozenset(get_word_forms(word)['v']) for word in index.index)
+
+    # Одинаковые наборы форм хранятся один раз
+    assert len(index.groups) == len(set(index.groups)) <= len(verbs)
+    assert index.get('unknownword') is None
+
+
+def test_index_save_load_round_trip(verbs, tmp_path):
+    index = VerbFormIndex.build(verbs)
+    path = str(tmp_path / 'verb_forms' / 'index.json.gz')
+    index.save(path)
+    loaded = VerbFormIndex.load(path)
+
+    assert len(loaded) == len(index)
+    assert all(loaded.get(word) == index.get(word) for word in index.index)
+
+
+def test_service_with_index_matches_service_without_index(verbs, tmp_path):
+    path = str(tmp_path / 'index.json.gz')
+    VerbFormIndex.build(verbs).save(path)
+    indexed = VerbFormService.load(path)
+    direct = VerbFormService.load(str(tmp_path / 'missing.json.gz'))
+
+    assert indexed.index is not None and direct.index is None
+    for verb in verbs:
+        for form in direct.forms(verb):
+            assert indexed.forms(form) == direct.forms(form)
+
+    # Слова, которых нет в индексе, не являются формами глаголов
+    assert indexed.forms('table') == frozenset()
+
+
+def wordnet_get_word_forms():
+    # Настоящий get_word_forms нужен только этому тесту и требует данных WordNet
+    nltk = pytest.importorskip('nltk')
+    try:
+        nltk.data.find('corpora/wordnet')
+    except LookupError:
+        pytest.skip('нет данных WordNet')
+    return pytest.importorskip('word_forms.word_forms').get_word_forms
+
+
+def test_index_matches_wordnet_get_word_forms(monkeypatch):
+    get_word_forms = wordnet_get_word_forms()
+    monkeypatch.setitem(models._models, 'get_word_forms', get_word_forms)
+    words = ['run', 'go', 'be', 'take', 'write', 'study', 'swim', 'lie']
+
+    index = VerbFormIndex.build(words)
+
+    for word in index.index:
+        assert index.get(word) == frozenset(get_word_forms(word)['v'])